@@ -5,14 +5,151 @@ class Settings(BaseSettings):
     app_name: str = "DocuMind API"
     chroma_persist_directory: str = "./chroma_db"
     upload_directory: str = "./uploads"
-    max_file_size: int = 10485760  # 10MB
+    max_file_size: int = 104857600  # 100MB, uploads are streamed to disk
+    # Text uploads up to this size are kept in memory (and in the job
+    # queue) instead of being written to upload_directory; 0 disables
+    upload_memory_max_size: int = 1048576  # 1MB
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    ollama_base_url: str = "http://localhost:11434"
+    ollama_model: str = "llama3.2:3b"
+    # Generations beyond ollama_max_concurrency (match the server's
+    # OLLAMA_NUM_PARALLEL) wait up to ollama_queue_timeout seconds for a
+    # slot. keep_alive keeps the model loaded; health is cached and
+    # refreshed in the background every ollama_health_interval seconds
+    ollama_max_concurrency: int = 1
+    ollama_max_queue: int = 32
+    ollama_queue_timeout: float = 30.0
+    ollama_request_timeout: float = 120.0
+    ollama_keep_alive: str = "30m"
+    ollama_health_interval: float = 15.0
+    warmup_on_startup: bool = True
+    # Load the vector index during startup rather than on the first query
+    preload_vector_index: bool = True
+    
+    # Vector index backend: "chroma" (Chroma's HNSW), "numpy" (exact search
+    # over a memory-mapped float32 matrix, best for small corpora) or
+    # "ivfpq" (compressed approximate search for large ones). The local
+    # backends keep vectors in vector_index_directory
+    vector_index_backend: str = "chroma"
+    vector_index_directory: str = "./vector_index"
+    vector_index_persist_interval: float = 30.0
+    ivf_nlist: int = 1024
+    ivf_nprobe: int = 16
+    ivf_train_size: int = 50000
+    pq_subquantizers: int = 48
+    # "numpy" backend only: "int8" scans one-byte codes instead of float32
+    # rows. Both compressed modes re-rank the best top_k * rescore_factor
+    # candidates against full-precision vectors (0 disables rescoring)
+    vector_storage: str = "float32"
+    vector_rescore_factor: int = 4
+    
+    # Worker pools for CPU-bound stages; *_queue_size caps the work waiting
+    # for a free worker before requests are rejected with HTTP 429
+    search_pool_workers: int = 4
+    search_queue_size: int = 64
+    ingest_pool_workers: int = 2
+    ingest_queue_size: int = 16
+    parse_pool_workers: int = 2
+    parse_pool_type: str = "process"  # "process" or "thread"
+    
+    # Streaming ingestion: PDFs with at least pdf_parallel_min_pages pages are
+    # extracted in ranges of pdf_pages_per_task pages across the parse pool,
+    # and new chunks are embedded and stored ingest_embed_batch_size at a time
+    pdf_parallel_min_pages: int = 32
+    pdf_pages_per_task: int = 16
+    ingest_embed_batch_size: int = 128
+    
+    # Micro-batching of concurrent query embeddings
+    embedding_batching_enabled: bool = True
+    embedding_batch_window_ms: float = 5.0
+    embedding_max_batch_size: int = 32
+    
+    # Content-addressed embedding cache (LRU in memory, float32 rows on disk)
+    embedding_cache_enabled: bool = True
+    embedding_cache_directory: str = "./embedding_cache"
+    embedding_cache_memory_mb: int = 64
+    
+    # Semantic answer cache for /search/ask
+    answer_cache_enabled: bool = True
+    answer_cache_similarity: float = 0.95
+    answer_cache_ttl_seconds: float = 3600
+    answer_cache_max_entries: int = 1024
+    
+    # BM25 keyword index for sparse and hybrid search
+    lexical_index_enabled: bool = True
+    lexical_index_path: str = "./lexical_index/index.bin"
+    lexical_index_persist_interval: float = 30.0
+    hybrid_candidates: int = 50
+    hybrid_rrf_k: int = 60
+    
+    # Optional cross-encoder reranking: retrieval over-fetches
+    # rerank_candidates hits and the reranker keeps the best top_k. Requests
+    # that can't be reranked within rerank_budget_ms keep retrieval order
+    rerank_enabled: bool = False
+    rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_candidates: int = 20
+    rerank_batch_size: int = 16
+    rerank_budget_ms: float = 300
+    rerank_cache_size: int = 8192
+    
+    # LLM context for /search/ask: consecutive chunks of a document are
+    # merged, near-duplicates (cosine >= context_dedupe_similarity, 1 turns
+    # this off) dropped and the rest packed into context_max_tokens
+    context_max_tokens: int = 2048
+    context_dedupe_similarity: float = 0.95
+    
+    # /search/semantic/batch: most queries per request and the default
+    # latency budget for the whole batch
+    search_batch_max_queries: int = 64
+    search_batch_timeout_ms: float = 2000
+    
+    # Batch ingestion pipeline
+    batch_max_files: int = 10000
+    batch_max_archive_size: int = 536870912  # 512MB
+    batch_max_unpacked_size: int = 2147483648  # 2GB, across every archive in one upload
+    batch_queue_size: int = 8
+    batch_embed_size: int = 256
+    batch_store_size: int = 1000
+    batch_jobs_retained: int = 100
+    
+    # Durable background queue for single uploads
+    job_queue_path: str = "./jobs/jobs.db"
+    job_workers: int = 2
+    job_max_attempts: int = 3
+    job_retry_backoff_seconds: float = 2.0
+    # Finished jobs (including skipped duplicate uploads) are deleted after
+    # this many days; 0 keeps them forever
+    job_retention_days: float = 7.0
+    
+    # Secondary index of chunk document_id, filename, doc_type and
+    # upload_time: resolves search filters and document lookups without
+    # scanning Chroma metadata. Filters matching at most
+    # metadata_prefilter_max_candidates chunks are searched exactly over
+    # just those chunks
+    metadata_index_enabled: bool = True
+    metadata_index_path: str = "./metadata_index/index.json"
+    metadata_index_persist_interval: float = 30.0
+    metadata_prefilter_max_candidates: int = 20000
+    
+    # Registry of ingested documents: content hash plus chunking and
+    # embedding settings, so exact re-uploads skip ingestion entirely
+    document_registry_path: str = "./registry/documents.db"
+    
+    # Observability: GET /metrics serves Prometheus text. With
+    # trace_requests each request's stage timings are logged as one JSON
+    # line. GET /debug/profile samples the server's threads for a few
+    # seconds and is only served when profiler_enabled
+    log_level: str = "INFO"
+    trace_requests: bool = True
+    profiler_enabled: bool = False
+    profiler_interval_ms: float = 5.0
+    profiler_max_seconds: float = 60.0
     
     class Config:
         env_file = ".env"
 
 @lru_cache()
 def get_settings():
-    return Settings()
\ No newline at end of file
+    return Settings()
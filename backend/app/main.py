@@ -1,15 +1,37 @@
 
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routers import documents, search
 from app.config import get_settings
+from app.middleware import RequestMetricsMiddleware
+from app.services.metrics import METRICS, record_state
+from app.services.profiler import ProfilerBusyError, SamplingProfiler
+from app.services.registry import ServiceRegistry
 
 settings = get_settings()
 
+logging.basicConfig(level=settings.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+profiler = SamplingProfiler(interval=settings.profiler_interval_ms / 1000)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared services once per process instead of once per request
+    registry = ServiceRegistry(settings)
+    await registry.startup()
+    app.state.registry = registry
+    yield
+    await registry.shutdown()
+
 app = FastAPI(
     title=settings.app_name,
     description="Document ingestion and search API for technical documentation",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -20,6 +42,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware, trace_requests=settings.trace_requests)
 
 # Include routers
 app.include_router(documents.router)
@@ -35,7 +58,35 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        **app.state.registry.get_stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, stage and service metrics"""
+    record_state(app.state.registry.get_stats())
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(seconds: float = Query(5.0, gt=0)):
+    """Sample every thread for a few seconds; returns collapsed stacks for a flame graph"""
+    if not settings.profiler_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if seconds > settings.profiler_max_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be at most {settings.profiler_max_seconds:g}"
+        )
+    try:
+        profile = await run_in_threadpool(profiler.profile, seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        profile["collapsed"] + "\n",
+        headers={"X-Profile-Samples": str(profile["samples"])}
+    )
 
 
 # To run the application:
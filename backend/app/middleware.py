@@ -0,0 +1,58 @@
+import json
+import logging
+import time
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.services.metrics import HTTP_REQUEST_SECONDS, start_trace
+
+logger = logging.getLogger("app.requests")
+
+class RequestMetricsMiddleware:
+    """Times every HTTP request and collects its pipeline spans
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so streamed
+    responses are timed until their last byte and the trace context reaches
+    the endpoint. Requests are labelled by route template (e.g.
+    /documents/{document_id}), never by raw path, to keep the label set
+    small; unmatched paths share one label.
+    """
+
+    def __init__(self, app: ASGIApp, trace_requests: bool = True):
+        self.app = app
+        self.trace_requests = trace_requests
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint(scope)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with start_trace(endpoint) as trace:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                seconds = time.perf_counter() - start
+                HTTP_REQUEST_SECONDS.observe(seconds, method=scope["method"], endpoint=endpoint, status=str(status))
+                if self.trace_requests and trace.spans:
+                    logger.info("Request trace: %s", json.dumps({
+                        "method": scope["method"],
+                        "status": status,
+                        **trace.to_dict()
+                    }))
+
+    @staticmethod
+    def _endpoint(scope: Scope) -> str:
+        for route in scope["app"].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        return "unmatched"
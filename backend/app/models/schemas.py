@@ -0,0 +1,108 @@
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional, Any, Literal
+from datetime import datetime
+from enum import Enum
+
+class DocumentType(str, Enum):
+    MARKDOWN = "markdown"
+    TXT = "txt"
+    PDF = "pdf"
+    PYTHON = "python"
+    JAVASCRIPT = "javascript"
+    TYPESCRIPT = "typescript"
+    JAVA = "java"
+    OTHER = "other"
+
+class DocumentUploadResponse(BaseModel):
+    id: str
+    filename: str
+    file_type: DocumentType
+    size: int
+    chunks_created: int
+    upload_time: datetime
+    message: str
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    chunks_unchanged: int = 0
+    peak_buffered_chars: Optional[int] = None
+    content_sha256: Optional[str] = None
+    duplicate: bool = False
+
+class DocumentRecord(BaseModel):
+    document_id: str
+    document_key: str
+    filename: str
+    doc_type: DocumentType
+    file_size: int
+    content_sha256: Optional[str] = None
+    chunk_size: int
+    chunk_overlap: int
+    embedding_model: str
+    chunk_count: int
+    created_at: float
+    updated_at: float
+
+class DocumentListResponse(BaseModel):
+    documents: List[DocumentRecord]
+    total: int
+    limit: int
+    offset: int
+
+class IngestionJobResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: str
+    size: int
+    document_key: Optional[str] = None
+    content_sha256: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[DocumentUploadResponse] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 5
+    filters: Optional[Dict[str, Any]] = None
+    mode: Literal["dense", "sparse", "hybrid"] = "dense"
+    include_text: bool = True
+    rerank: Optional[bool] = None
+
+class SearchResponse(BaseModel):
+    results: List[Dict[str, Any]]
+    query: str
+    total_results: int
+
+class BatchSearchQuery(BaseModel):
+    query: str
+    top_k: int = Field(5, ge=1, le=100)
+    filters: Optional[Dict[str, Any]] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchSearchQuery]
+    include_text: bool = True
+    # None uses SEARCH_BATCH_TIMEOUT_MS
+    timeout_ms: Optional[float] = Field(None, gt=0)
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]
+    total_queries: int
+    elapsed_ms: float
+
+class QuestionRequest(BaseModel):
+    query: str
+    top_k: int = 5
+    conversation_history: Optional[List[Dict[str, str]]] = None
+    rerank: Optional[bool] = None
+
+class QuestionResponse(BaseModel):
+    answer: str
+    sources: List[Dict[str, Any]]
+    query: str
+    num_sources: int = 0
+    cached: bool = False
+    prompt_tokens: Optional[int] = None
+    estimated_prompt_tokens: Optional[int] = None
+    context: Optional[Dict[str, Any]] = None
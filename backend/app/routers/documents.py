@@ -1,86 +1,297 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from typing import List
 import os
-import aiofiles
+import shutil
 from pathlib import Path
 import uuid
 
 from app.services.document_service import DocumentIngestionService
-from app.models.schemas import DocumentUploadResponse
+from app.services.registry import ServiceRegistry, get_registry
+from app.services.file_processor import FileProcessor
+from app.services.ingestion_pipeline import (
+    IngestionPipeline,
+    collect_batch_files,
+    is_archive,
+    unpack_archive
+)
+from app.services.job_queue import JobQueue
+from app.services.uploads import UploadFormError, UploadTooLargeError, receive_upload
+from app.models.schemas import DocumentListResponse, DocumentRecord, IngestionJobResponse
 from app.config import get_settings, Settings
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 # Dependency to get document service
-def get_document_service():
-    return DocumentIngestionService()
+def get_document_service(registry: ServiceRegistry = Depends(get_registry)):
+    return registry.document_service
 
-@router.post("/upload", response_model=DocumentUploadResponse)
+def get_job_queue(registry: ServiceRegistry = Depends(get_registry)):
+    return registry.job_queue
+
+def get_ingestion_pipeline(registry: ServiceRegistry = Depends(get_registry)):
+    return registry.ingestion_pipeline
+
+def _save_upload(file: UploadFile, destination: Path):
+    with open(destination, "wb") as f:
+        shutil.copyfileobj(file.file, f, 1024 * 1024)
+
+# The upload body is parsed by hand (see receive_upload), so describe it for the docs
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "document_key": {"type": "string"}
+                    }
+                }
+            }
+        }
+    }
+}
+
+@router.post("/upload", response_model=IngestionJobResponse, status_code=202, openapi_extra=UPLOAD_FORM)
 async def upload_document(
-    file: UploadFile = File(...),
+    request: Request,
+    response: Response,
     settings: Settings = Depends(get_settings),
+    job_queue: JobQueue = Depends(get_job_queue),
     doc_service: DocumentIngestionService = Depends(get_document_service)
 ):
     """
-    Upload and ingest a document
+    Upload a document for ingestion
     
     Supported formats: .md, .txt, .pdf, .py, .js, .ts, .java, etc.
-    """
     
-    # Validate file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
+    The file is saved and queued, and the response (202) carries a job ID;
+    poll GET /documents/jobs/{job_id} for the ingestion result.
     
-    if file_size > settings.max_file_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File size exceeds maximum allowed size of {settings.max_file_size / 1024 / 1024}MB"
-        )
+    Documents are identified by document_key (e.g. a repository path),
+    falling back to the filename. Re-uploading a document with the same key
+    only embeds the chunks that changed.
+    
+    The file is streamed to disk as it arrives (small text files stay in
+    memory), with the size limit and SHA-256 checked on the fly. An exact
+    copy of an ingested document (same bytes, chunking and embedding model)
+    isn't queued: the response (200) is an already completed job whose
+    result carries the existing document ID.
+    """
     
-    # Create upload directory if it doesn't exist
-    upload_dir = Path(settings.upload_directory)
+    # Queued uploads live here until their job finishes
+    upload_dir = Path(settings.upload_directory) / "jobs"
     upload_dir.mkdir(parents=True, exist_ok=True)
     
-    # Generate unique filename to avoid collisions
-    file_extension = Path(file.filename).suffix
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
+    job_id = str(uuid.uuid4())
+    try:
+        upload = await receive_upload(
+            request,
+            upload_dir,
+            job_id,
+            max_size=settings.max_file_size,
+            memory_max_size=settings.upload_memory_max_size,
+            memory_extensions=FileProcessor.TEXT_EXTENSIONS
+        )
+    except (UploadTooLargeError, UploadFormError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    document_key = upload.fields.get("document_key")
+    duplicate = doc_service.find_duplicate(upload.sha256, upload.filename, document_key)
+    if duplicate is not None:
+        if upload.path and os.path.exists(upload.path):
+            os.remove(upload.path)
+        response.status_code = 200
+        return job_queue.record_completed(
+            job_id=job_id,
+            filename=upload.filename,
+            file_size=upload.size,
+            result=doc_service.duplicate_response(duplicate, upload.size).model_dump_json(),
+            document_key=document_key,
+            content_sha256=upload.sha256
+        )
     
     try:
-        # Save uploaded file
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
-        # Ingest document
-        result = await doc_service.ingest_document(
-            file_path=str(file_path),
-            filename=file.filename,
-            file_size=file_size
+        return job_queue.enqueue(
+            file_path=upload.path,
+            filename=upload.filename,
+            file_size=upload.size,
+            document_key=document_key,
+            job_id=job_id,
+            content=upload.content,
+            content_sha256=upload.sha256
         )
         
-        # Clean up uploaded file after processing
-        os.remove(file_path)
-        
-        return result
-        
-    except ValueError as e:
+    except Exception as e:
         # Clean up file on error
-        if file_path.exists():
-            os.remove(file_path)
-        raise HTTPException(status_code=400, detail=str(e))
+        if upload.path and os.path.exists(upload.path):
+            os.remove(upload.path)
+        raise HTTPException(status_code=500, detail=f"Error queueing document: {str(e)}")
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_job_status(
+    job_id: str,
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """Status of a queued upload, including the ingestion result once completed"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/upload/batch", status_code=202)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    settings: Settings = Depends(get_settings),
+    pipeline: IngestionPipeline = Depends(get_ingestion_pipeline)
+):
+    """
+    Upload many documents, or zip/tar archives of them, in one request
     
+    Files are ingested in the background by the pipelined ingestion engine.
+    Files inside archives are keyed by their path within the archive, so
+    re-uploading an updated archive only re-embeds what changed. Other
+    files are keyed by their name; a name that appears twice is rejected. Poll
+    GET /documents/upload/batch/{job_id} for progress.
+    """
+    work_dir = Path(settings.upload_directory) / f"batch-{uuid.uuid4()}"
+    files_dir = work_dir / "files"
+    files_dir.mkdir(parents=True, exist_ok=True)
+    
+    # What archives in this upload may still unpack, so many small archives can't exceed the limits either
+    files_left = settings.batch_max_files
+    bytes_left = settings.batch_max_unpacked_size
+    try:
+        for file in files:
+            file.file.seek(0, 2)
+            file_size = file.file.tell()
+            file.file.seek(0)
+            name = Path(file.filename).name
+            
+            if is_archive(name):
+                if file_size > settings.batch_max_archive_size:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Archive {name} exceeds maximum allowed size of {settings.batch_max_archive_size / 1024 / 1024}MB"
+                    )
+                archive_path = work_dir / name
+                await run_in_threadpool(_save_upload, file, archive_path)
+                unpacked_files, unpacked_bytes = await run_in_threadpool(
+                    unpack_archive, str(archive_path), files_dir, settings.max_file_size, files_left, bytes_left
+                )
+                files_left -= unpacked_files
+                bytes_left -= unpacked_bytes
+                os.remove(archive_path)
+            else:
+                if file_size > settings.max_file_size:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"File {name} exceeds maximum allowed size of {settings.max_file_size / 1024 / 1024}MB"
+                    )
+                # Files are keyed by name, so two with the same name would be one document
+                if (files_dir / name).exists():
+                    raise HTTPException(status_code=400, detail=f"{name} appears more than once in the upload")
+                await run_in_threadpool(_save_upload, file, files_dir / name)
+        
+        batch_files = collect_batch_files(files_dir, FileProcessor.SUPPORTED_EXTENSIONS)
+        if not batch_files:
+            raise HTTPException(status_code=400, detail="No supported files found in upload")
+        if len(batch_files) > settings.batch_max_files:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch contains {len(batch_files)} files, the maximum is {settings.batch_max_files}"
+            )
+        
+    except HTTPException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
     except Exception as e:
-        # Clean up file on error
-        if file_path.exists():
-            os.remove(file_path)
-        raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=f"Error reading upload: {str(e)}")
+    
+    job = pipeline.submit(batch_files, work_directory=str(work_dir))
+    return job.to_dict()
+
+
+@router.get("/upload/batch/{job_id}")
+async def get_batch_status(
+    job_id: str,
+    pipeline: IngestionPipeline = Depends(get_ingestion_pipeline)
+):
+    """Progress and throughput of a batch ingestion job"""
+    job = pipeline.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job.to_dict()
 
 
 @router.get("/stats")
 async def get_stats(doc_service: DocumentIngestionService = Depends(get_document_service)):
     """Get statistics about indexed documents"""
     stats = doc_service.vectorstore.get_collection_stats()
+    stats["embedding_cache"] = doc_service.embedding_service.get_cache_stats()
+    if doc_service.vectorstore.metadata_index is not None:
+        stats["documents"] = doc_service.vectorstore.metadata_index.summary()
+    return stats
+
+
+@router.get("", response_model=DocumentListResponse)
+async def list_documents(
+    limit: int = 100,
+    offset: int = 0,
+    doc_service: DocumentIngestionService = Depends(get_document_service)
+):
+    """Ingested documents, most recently updated first"""
+    limit = max(1, min(limit, 1000))
+    offset = max(offset, 0)
+    return DocumentListResponse(
+        documents=doc_service.registry.list(limit=limit, offset=offset),
+        total=doc_service.registry.count(),
+        limit=limit,
+        offset=offset
+    )
+
+
+@router.get("/{document_id}", response_model=DocumentRecord)
+async def get_document(
+    document_id: str,
+    doc_service: DocumentIngestionService = Depends(get_document_service)
+):
+    """Registry entry of one document"""
+    document = doc_service.registry.get(document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+
+@router.get("/{document_id}/stats")
+async def get_document_stats(
+    document_id: str,
+    doc_service: DocumentIngestionService = Depends(get_document_service)
+):
+    """Chunk count, filenames and upload times of one document's stored chunks"""
+    metadata_index = doc_service.vectorstore.metadata_index
+    if metadata_index is None:
+        raise HTTPException(status_code=404, detail="Metadata index is disabled")
+    stats = metadata_index.document_stats(document_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Document not found")
     return stats
+
+
+@router.delete("/{document_id}")
+async def delete_document(
+    document_id: str,
+    doc_service: DocumentIngestionService = Depends(get_document_service)
+):
+    """Delete a document's chunks from the index and its registry entry"""
+    if doc_service.registry.get(document_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not await doc_service.delete_document(document_id):
+        raise HTTPException(status_code=500, detail="Error deleting document")
+    return {"document_id": document_id, "deleted": True}
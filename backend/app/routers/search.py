@@ -1,19 +1,42 @@
+import asyncio
+import json
+import time
+from typing import Dict, List
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from app.services.search_service import SearchService
-from app.services.vectorstore import VectorStoreService
-from app.services.embedding import EmbeddingService
-from app.services.ollama_service import OllamaService
-from app.models.schemas import SearchRequest, SearchResponse, QuestionRequest, QuestionResponse
+from app.services.registry import ServiceRegistry, get_registry
+from app.services.executor import ExecutorBusyError
+from app.models.schemas import (
+    SearchRequest, SearchResponse, BatchSearchRequest, BatchSearchResponse,
+    QuestionRequest, QuestionResponse
+)
 from app.config import get_settings, Settings
 
 router = APIRouter(prefix="/search", tags=["search"])
 
-def get_search_service():
-    settings = get_settings()
-    vectorstore = VectorStoreService(settings.chroma_persist_directory)
-    embedding_service = EmbeddingService(settings.embedding_model)
-    ollama_service = OllamaService()
-    return SearchService(vectorstore, embedding_service, ollama_service)
+def get_search_service(registry: ServiceRegistry = Depends(get_registry)):
+    return registry.search_service
+
+def format_results(results: List[Dict], include_text: bool) -> List[Dict]:
+    """Response entries for search hits"""
+    formatted_results = []
+    for r in results:
+        formatted = {
+            "filename": r["filename"],
+            "chunk_index": r["chunk_index"],
+            "doc_type": r["doc_type"],
+            "relevance_score": SearchService.relevance_score(r),
+            **r["location"]
+        }
+        if "rerank_score" in r:
+            formatted["rerank_score"] = r["rerank_score"]
+        # Clients that only render locations can skip the chunk text
+        if include_text:
+            formatted["text"] = r["text"]
+            formatted["text_preview"] = SearchService.text_preview(r)
+        formatted_results.append(formatted)
+    return formatted_results
 
 @router.post("/semantic", response_model=SearchResponse)
 async def semantic_search(
@@ -28,20 +51,12 @@ async def semantic_search(
         results = await search_service.search(
             query=request.query,
             top_k=request.top_k,
-            filters=request.filters
+            filters=request.filters,
+            mode=request.mode,
+            rerank=request.rerank
         )
         
-        formatted_results = [
-            {
-                "text": r["text"],
-                "filename": r["filename"],
-                "chunk_index": r["chunk_index"],
-                "doc_type": r["doc_type"],
-                "relevance_score": 1 - r["distance"],
-                "text_preview": r["text"][:200] + "..."
-            }
-            for r in results
-        ]
+        formatted_results = format_results(results, request.include_text)
         
         return SearchResponse(
             results=formatted_results,
@@ -49,10 +64,64 @@ async def semantic_search(
             total_results=len(formatted_results)
         )
         
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
 
+@router.post("/semantic/batch", response_model=BatchSearchResponse)
+async def semantic_search_batch(
+    request: BatchSearchRequest,
+    settings: Settings = Depends(get_settings),
+    search_service: SearchService = Depends(get_search_service)
+):
+    """
+    Semantic search for many queries in one request
+    Queries are embedded together and searched with one vector query per
+    distinct filter; the whole batch shares one latency budget
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(request.queries) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries. Maximum is {settings.search_batch_max_queries}"
+        )
+    
+    timeout_ms = settings.search_batch_timeout_ms if request.timeout_ms is None else request.timeout_ms
+    start = time.perf_counter()
+    try:
+        batch_results = await search_service.search_batch(
+            [q.model_dump() for q in request.queries],
+            timeout=timeout_ms / 1000
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Batch search exceeded its {timeout_ms:.0f}ms budget")
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
+    
+    responses = []
+    for q, results in zip(request.queries, batch_results):
+        formatted_results = format_results(results, request.include_text)
+        responses.append(SearchResponse(
+            results=formatted_results,
+            query=q.query,
+            total_results=len(formatted_results)
+        ))
+    return BatchSearchResponse(
+        results=responses,
+        total_queries=len(responses),
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 1)
+    )
+
+
 @router.post("/ask", response_model=QuestionResponse)
 async def ask_question(
     request: QuestionRequest,
@@ -74,17 +143,66 @@ async def ask_question(
         result = await search_service.ask_question(
             query=request.query,
             top_k=request.top_k,
-            conversation_history=request.conversation_history
+            conversation_history=request.conversation_history,
+            rerank=request.rerank
         )
         
         return QuestionResponse(**result)
         
     except HTTPException:
         raise
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
 
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/ask/stream")
+async def ask_question_stream(
+    request: QuestionRequest,
+    search_service: SearchService = Depends(get_search_service)
+):
+    """
+    Ask a question and stream the answer as Server-Sent Events
+    Sends a "sources" event first, then "token" events as Ollama generates,
+    then a "done" event with time-to-first-token and tokens/sec
+    """
+    ollama_available = await search_service.ollama_service.check_health()
+    if not ollama_available:
+        raise HTTPException(
+            status_code=503,
+            detail="Ollama service is not available. Make sure Ollama is running with 'ollama serve' and the model is pulled."
+        )
+    
+    async def event_stream():
+        try:
+            async for event, data in search_service.ask_question_stream(
+                query=request.query,
+                top_k=request.top_k,
+                conversation_history=request.conversation_history,
+                rerank=request.rerank
+            ):
+                yield format_sse(event, data)
+        except ExecutorBusyError as e:
+            yield format_sse("error", {"status": 429, "detail": str(e)})
+        except ValueError as e:
+            yield format_sse("error", {"status": 400, "detail": str(e)})
+        except Exception as e:
+            yield format_sse("error", {"status": 500, "detail": f"Error processing question: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/health")
 async def check_search_health(search_service: SearchService = Depends(get_search_service)):
     """Check if search services are healthy"""
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+import numpy as np
+
+@dataclass
+class CachedAnswer:
+    embedding: np.ndarray
+    chunk_ids: FrozenSet[str]
+    result: Dict
+    created_at: float
+
+class SemanticAnswerCache:
+    """Caches LLM answers by query embedding and retrieved chunk set
+
+    A lookup hits when a cached query's embedding has cosine similarity of
+    at least similarity_threshold with the new query *and* retrieval
+    returned exactly the same chunks, so the model would have seen the same
+    context. Entries expire after ttl_seconds, the least recently used are
+    evicted past max_entries, and entries are dropped as soon as any of
+    their source chunks is rewritten or deleted.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1024):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # Invalidation arrives from executor threads, lookups from the event loop
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._by_chunk_set: Dict[FrozenSet[str], Set[int]] = {}
+        self._by_chunk: Dict[str, Set[int]] = {}
+        self._next_id = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: Iterable[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, query_embedding: np.ndarray, chunk_ids: List[str]) -> Optional[Dict]:
+        """Return a cached result for a similar query over the same chunks"""
+        key = frozenset(chunk_ids)
+        query = self._normalize(query_embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            best_id, best_score = None, self.similarity_threshold
+            for entry_id in list(self._by_chunk_set.get(key, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(entry.embedding, query))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id].result
+
+    def store(self, query_embedding: np.ndarray, chunk_ids: List[str], result: Dict):
+        entry = CachedAnswer(
+            embedding=self._normalize(query_embedding),
+            chunk_ids=frozenset(chunk_ids),
+            result=result,
+            created_at=time.monotonic()
+        )
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_chunk_set.setdefault(entry.chunk_ids, set()).add(entry_id)
+            for chunk_id in entry.chunk_ids:
+                self._by_chunk.setdefault(chunk_id, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_chunks(self, chunk_ids: Iterable[str]):
+        """Drop every answer that cited one of these chunks"""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                for entry_id in list(self._by_chunk.get(chunk_id, ())):
+                    self._remove(entry_id)
+                    self.invalidations += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        siblings = self._by_chunk_set.get(entry.chunk_ids)
+        if siblings is not None:
+            siblings.discard(entry_id)
+            if not siblings:
+                del self._by_chunk_set[entry.chunk_ids]
+        for chunk_id in entry.chunk_ids:
+            referencing = self._by_chunk.get(chunk_id)
+            if referencing is not None:
+                referencing.discard(entry_id)
+                if not referencing:
+                    del self._by_chunk[chunk_id]
+
+    def get_stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
+        }
@@ -1,14 +1,162 @@
 from langchain.text_splitter import (
     RecursiveCharacterTextSplitter,
     Language,
-    MarkdownTextSplitter
+    MarkdownTextSplitter,
+    TextSplitter
 )
-from typing import List
+import bisect
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from app.models.schemas import DocumentType
 
+# Metadata keys describing where a chunk sits in its source document
+LOCATION_FIELDS = ("start_byte", "end_byte", "start_line", "end_line", "page_start", "page_end", "section")
+
+@dataclass
+class TextChunk:
+    """A chunk and where it came from
+
+    start/end are character offsets in the whole document, start_byte/
+    end_byte the matching UTF-8 byte offsets and lines are 1-based and
+    inclusive. For PDFs these refer to the extracted text, and page_start/
+    page_end give the 1-based pages the chunk spans. section is the
+    Markdown heading path or code symbol path in effect where the chunk
+    starts.
+    """
+    text: str
+    start: int
+    end: int
+    start_byte: int = 0
+    end_byte: int = 0
+    start_line: int = 1
+    end_line: int = 1
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    section: Optional[str] = None
+
+    def location(self) -> Dict:
+        """Location fields for chunk metadata (absent values left out)"""
+        values = {field: getattr(self, field) for field in LOCATION_FIELDS}
+        return {field: value for field, value in values.items() if value is not None}
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+CODE_SYMBOL = re.compile(
+    r"^(\s*)(?:export\s+)?(?:default\s+)?"
+    r"(?:(?:public|private|protected|static|abstract|final|async)\s+)*"
+    r"(?:class|def|function|interface|enum)\s+([A-Za-z_$][\w$]*)"
+)
+CODE_NON_STATEMENT = ("@", "#", "//", "/*", "*")
+
+class SectionTracker:
+    """Follows the heading / symbol nesting of a document as text streams in
+
+    Markdown headings give paths like "Install > Linux"; class and function
+    definitions in code give paths like "Handler.handle", with nesting taken
+    from indentation. Only the change points are kept, so looking up the
+    section for an offset is a binary search.
+    """
+
+    def __init__(self, doc_type: DocumentType):
+        self.markdown = doc_type == DocumentType.MARKDOWN
+        self._stack: List[Tuple[int, str]] = []
+        self._in_fence = False
+        self._partial = ""
+        self._partial_offset = 0
+        self._offsets: List[int] = []
+        self._paths: List[Optional[str]] = []
+
+    def feed(self, text: str, offset: int):
+        """Scan text that starts at the given offset in the document"""
+        if not self._partial:
+            self._partial_offset = offset
+        data = self._partial + text
+        line_start = 0
+        while True:
+            end = data.find("\n", line_start)
+            if end < 0:
+                break
+            self._line(data[line_start:end], self._partial_offset + line_start)
+            line_start = end + 1
+        self._partial = data[line_start:]
+        self._partial_offset += line_start
+
+    def finish(self):
+        if self._partial:
+            self._line(self._partial, self._partial_offset)
+            self._partial = ""
+
+    def _line(self, line: str, offset: int):
+        before = len(self._stack)
+        changed = self._markdown_line(line) if self.markdown else self._code_line(line)
+        if changed or len(self._stack) != before:
+            self._offsets.append(offset)
+            self._paths.append(self._path())
+
+    def _markdown_line(self, line: str) -> bool:
+        if line.lstrip().startswith("```"):
+            self._in_fence = not self._in_fence
+            return False
+        match = None if self._in_fence else MARKDOWN_HEADING.match(line)
+        if match is None:
+            return False
+        level = len(match.group(1))
+        while self._stack and self._stack[-1][0] >= level:
+            self._stack.pop()
+        self._stack.append((level, match.group(2)))
+        return True
+
+    def _code_line(self, line: str) -> bool:
+        stripped = line.strip()
+        if not stripped or stripped.startswith(CODE_NON_STATEMENT):
+            return False
+        indent = len(line) - len(line.lstrip())
+        # A statement at or left of a definition's indent ends its body
+        while self._stack and self._stack[-1][0] >= indent:
+            self._stack.pop()
+        match = CODE_SYMBOL.match(line)
+        if match is None:
+            return False
+        self._stack.append((indent, match.group(2)))
+        return True
+
+    def _path(self) -> Optional[str]:
+        if not self._stack:
+            return None
+        separator = " > " if self.markdown else "."
+        return separator.join(name for _, name in self._stack)
+
+    def section_at(self, offset: int) -> Optional[str]:
+        index = bisect.bisect_right(self._offsets, offset) - 1
+        return self._paths[index] if index >= 0 else None
+
+    def prune(self, offset: int):
+        """Forget change points no chunk at or after offset can need"""
+        keep = bisect.bisect_right(self._offsets, offset) - 1
+        if keep > 0:
+            del self._offsets[:keep]
+            del self._paths[:keep]
+
+def locate_chunks(text: str, chunks: List[str]) -> List[int]:
+    """Start offset of each chunk in text
+
+    Splitters emit chunks in order, so each one is searched for after the
+    start of the previous one (chunks overlap, so not after its end).
+    """
+    starts = []
+    cursor = 0
+    for chunk in chunks:
+        start = text.find(chunk, cursor)
+        if start < 0:
+            start = cursor
+        starts.append(start)
+        cursor = start + 1
+    return starts
+
 class DocumentChunker:
     """Handles intelligent document chunking based on type"""
-    
+
     # Language mapping for code files
     LANGUAGE_MAP = {
         DocumentType.PYTHON: Language.PYTHON,
@@ -16,36 +164,185 @@ class DocumentChunker:
         DocumentType.TYPESCRIPT: Language.TS,
         DocumentType.JAVA: Language.JAVA,
     }
-    
+
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-    
-    def chunk_document(self, text: str, doc_type: DocumentType) -> List[str]:
-        """Chunk document based on type"""
-        
+        self._splitters: Dict[DocumentType, TextSplitter] = {}
+
+    def _get_splitter(self, doc_type: DocumentType) -> TextSplitter:
+        """Splitter for a document type, built once and reused"""
+        splitter = self._splitters.get(doc_type)
+        if splitter is None:
+            splitter = self._build_splitter(doc_type)
+            self._splitters[doc_type] = splitter
+        return splitter
+
+    def _build_splitter(self, doc_type: DocumentType) -> TextSplitter:
+
         # Markdown files
         if doc_type == DocumentType.MARKDOWN:
-            splitter = MarkdownTextSplitter(
+            return MarkdownTextSplitter(
                 chunk_size=self.chunk_size,
                 chunk_overlap=self.chunk_overlap
             )
-            return splitter.split_text(text)
-        
+
         # Code files with language-specific splitting
         if doc_type in self.LANGUAGE_MAP:
-            splitter = RecursiveCharacterTextSplitter.from_language(
+            return RecursiveCharacterTextSplitter.from_language(
                 language=self.LANGUAGE_MAP[doc_type],
                 chunk_size=self.chunk_size,
                 chunk_overlap=self.chunk_overlap
             )
-            return splitter.split_text(text)
-        
+
         # Default text splitting
-        splitter = RecursiveCharacterTextSplitter(
+        return RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
             chunk_overlap=self.chunk_overlap,
             separators=["\n\n", "\n", ". ", " ", ""]
         )
-        return splitter.split_text(text)
 
+    def chunk_document(self, text: str, doc_type: DocumentType) -> List[str]:
+        """Chunk document based on type"""
+        return self._get_splitter(doc_type).split_text(text)
+
+    def stream_chunker(self, doc_type: DocumentType) -> "StreamingChunker":
+        """A chunker that accepts the document in blocks as they are extracted
+
+        For PDFs each block must be one page.
+        """
+        sections = None
+        if doc_type == DocumentType.MARKDOWN or doc_type in self.LANGUAGE_MAP:
+            sections = SectionTracker(doc_type)
+        return StreamingChunker(
+            self._get_splitter(doc_type),
+            self.chunk_size,
+            sections=sections,
+            track_pages=doc_type == DocumentType.PDF
+        )
+
+    def chunk_stream(self, blocks: Iterable[str], doc_type: DocumentType) -> Iterator[TextChunk]:
+        """Chunk a document supplied as an iterable of text blocks, with offsets"""
+        stream = self.stream_chunker(doc_type)
+        for block in blocks:
+            yield from stream.feed(block)
+        yield from stream.finish()
+
+
+class StreamingChunker:
+    """Incrementally chunks text that arrives in blocks (e.g. PDF pages)
+
+    Text is buffered until it spans several chunks, then split. Every chunk
+    but the last is final; the last may continue in the next block, so
+    splitting resumes from its start. Only a few chunks' worth of text is
+    ever held, however large the document. Chunks carry their location in
+    the whole stream (see TextChunk).
+    """
+
+    def __init__(
+        self,
+        splitter: TextSplitter,
+        chunk_size: int,
+        window_chunks: int = 8,
+        sections: Optional[SectionTracker] = None,
+        track_pages: bool = False
+    ):
+        self.splitter = splitter
+        self.window = chunk_size * window_chunks
+        self.sections = sections
+        self.track_pages = track_pages
+        self._parts: List[str] = []
+        self._length = 0
+        # Position of the start of the buffer in the whole stream
+        self._offset = 0
+        self._offset_bytes = 0
+        self._offset_lines = 0
+        # Stream offset at which each block (page) starts
+        self._block_starts: List[int] = []
+
+    @property
+    def buffered_chars(self) -> int:
+        return self._length
+
+    def _page_at(self, offset: int) -> Optional[int]:
+        if not self.track_pages:
+            return None
+        return max(bisect.bisect_right(self._block_starts, offset), 1)
+
+    def _split(self, text: str) -> List[TextChunk]:
+        chunks = self.splitter.split_text(text)
+        results = []
+        cursor = 0
+        byte = self._offset_bytes
+        line = self._offset_lines + 1
+        for chunk, start in zip(chunks, locate_chunks(text, chunks)):
+            # Advance byte and line counters over the text since the last chunk
+            byte += len(text[cursor:start].encode("utf-8"))
+            line += text.count("\n", cursor, start)
+            cursor = start
+            absolute = self._offset + start
+            results.append(TextChunk(
+                text=chunk,
+                start=absolute,
+                end=absolute + len(chunk),
+                start_byte=byte,
+                end_byte=byte + len(chunk.encode("utf-8")),
+                start_line=line,
+                end_line=line + chunk.count("\n"),
+                page_start=self._page_at(absolute),
+                page_end=self._page_at(absolute + max(len(chunk) - 1, 0)),
+                section=self.sections.section_at(absolute) if self.sections else None
+            ))
+        return results
+
+    def _advance(self, text: str, count: int):
+        """Drop the first count characters of the buffered text"""
+        consumed = text[:count]
+        self._offset += count
+        self._offset_bytes += len(consumed.encode("utf-8"))
+        self._offset_lines += consumed.count("\n")
+
+    def feed(self, block: str) -> List[TextChunk]:
+        """Add a block and return the chunks that are now complete"""
+        block_offset = self._offset + self._length
+        if self.track_pages:
+            self._block_starts.append(block_offset)
+        if self.sections is not None:
+            self.sections.feed(block, block_offset)
+        self._parts.append(block)
+        self._length += len(block)
+        if self._length < self.window:
+            return []
+
+        text = "".join(self._parts)
+        chunks = self._split(text)
+        if len(chunks) < 2:
+            self._parts = [text]
+            return []
+
+        # Carry the last, possibly incomplete, chunk over into the next split
+        tail_start = chunks[-1].start - self._offset
+        rest = text[tail_start:]
+        self._parts = [rest]
+        self._length = len(rest)
+        self._advance(text, tail_start)
+        if self.sections is not None:
+            self.sections.prune(self._offset)
+        return chunks[:-1]
+
+    def finish(self) -> List[TextChunk]:
+        """Flush whatever text is left once the last block has been fed"""
+        if self.sections is not None:
+            self.sections.finish()
+        text = "".join(self._parts)
+        chunks = self._split(text) if text.strip() else []
+        self._advance(text, len(text))
+        self._parts = []
+        self._length = 0
+        return chunks
+
+
+@lru_cache(maxsize=None)
+def get_chunker(chunk_size: int, chunk_overlap: int) -> DocumentChunker:
+    """Shared chunker per configuration, so its splitters are reused across calls"""
+    return DocumentChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
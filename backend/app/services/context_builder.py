@@ -0,0 +1,173 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+_TOKEN_PIECE = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """Fast estimate of an LLM's token count for text
+
+    Counts words and punctuation marks, with long words counted as several
+    subword tokens. Within about 10-15% of BPE tokenizers on English prose
+    and code, and much cheaper than running one.
+    """
+    return sum(1 + len(piece) // 8 for piece in _TOKEN_PIECE.findall(text))
+
+def _overlap(previous: str, following: str, max_overlap: int) -> int:
+    """Length of the longest suffix of previous that is a prefix of following"""
+    for size in range(min(max_overlap, len(previous), len(following)), 0, -1):
+        if previous.endswith(following[:size]):
+            return size
+    return 0
+
+@dataclass
+class ContextBlock:
+    """One contiguous piece of a document in the prompt"""
+    filename: str
+    document_id: Optional[str]
+    first_index: int
+    last_index: int
+    text: str
+    rank: int
+    end_byte: Optional[int]
+    results: List[Dict] = field(default_factory=list)
+
+    def as_chunk(self) -> Dict:
+        """The shape OllamaService.build_messages expects"""
+        label = str(self.first_index) if self.first_index == self.last_index else f"{self.first_index}-{self.last_index}"
+        return {"filename": self.filename, "chunk_index": label, "text": self.text}
+
+@dataclass
+class PackedContext:
+    chunks: List[Dict]
+    sources: List[Dict]
+    tokens: int
+    stats: Dict
+
+class ContextBuilder:
+    """Turns ranked search results into a compact, token-budgeted LLM context
+
+    1. Near-duplicates (cosine similarity >= dedupe_similarity with a
+       better-ranked result, e.g. the same text uploaded twice) are dropped.
+    2. Results that are consecutive chunks of the same document are merged
+       into one block, with the chunk_overlap they share included once.
+    3. Blocks are packed best-rank first until max_tokens (estimated) is
+       reached; a block that doesn't fit is skipped, except that the best
+       one is truncated rather than sending no context at all.
+    """
+
+    def __init__(self, max_tokens: int = 2048, dedupe_similarity: float = 0.95, chunk_overlap: int = 200):
+        self.max_tokens = max_tokens
+        self.dedupe_similarity = dedupe_similarity
+        self.chunk_overlap = chunk_overlap
+
+    def deduplicate(self, results: List[Dict], embeddings: Dict[str, np.ndarray]) -> List[Dict]:
+        """Drop results too similar to a better-ranked one"""
+        kept, kept_vectors = [], []
+        seen_texts = set()
+        for result in results:
+            if result["text"] in seen_texts:
+                continue
+            vector = embeddings.get(result["chunk_id"])
+            if vector is not None:
+                vector = vector / (np.linalg.norm(vector) or 1.0)
+                if kept_vectors and float(np.max(np.stack(kept_vectors) @ vector)) >= self.dedupe_similarity:
+                    continue
+                kept_vectors.append(vector)
+            seen_texts.add(result["text"])
+            kept.append(result)
+        return kept
+
+    def merge(self, results: List[Dict]) -> List[ContextBlock]:
+        """Merge consecutive chunks of a document into blocks, ordered by best rank"""
+        def position(item):
+            rank, result = item
+            return result["metadata"].get("document_id") or result["filename"], result["chunk_index"]
+        ranked = sorted(enumerate(results), key=position)
+
+        blocks: List[ContextBlock] = []
+        for rank, result in ranked:
+            metadata = result["metadata"]
+            document_id = metadata.get("document_id")
+            previous = blocks[-1] if blocks else None
+            if (
+                previous is not None
+                and previous.document_id == document_id
+                and previous.filename == result["filename"]
+                and result["chunk_index"] == previous.last_index + 1
+            ):
+                previous.text += self._continuation(previous, result)
+                previous.last_index = result["chunk_index"]
+                previous.end_byte = metadata.get("end_byte")
+                previous.rank = min(previous.rank, rank)
+                previous.results.append(result)
+                continue
+            blocks.append(ContextBlock(
+                filename=result["filename"],
+                document_id=document_id,
+                first_index=result["chunk_index"],
+                last_index=result["chunk_index"],
+                text=result["text"],
+                rank=rank,
+                end_byte=metadata.get("end_byte"),
+                results=[result]
+            ))
+
+        blocks.sort(key=lambda block: block.rank)
+        return blocks
+
+    def _continuation(self, block: ContextBlock, result: Dict) -> str:
+        """The part of result's text that block doesn't already end with"""
+        text = result["text"]
+        start_byte = result["metadata"].get("start_byte")
+        if block.end_byte is not None and start_byte is not None:
+            # Byte offsets say exactly how much of the chunk is overlap
+            shared = block.end_byte - start_byte
+            if shared <= 0:
+                return "\n" + text
+            return text.encode("utf-8")[shared:].decode("utf-8", errors="ignore")
+        shared = _overlap(block.text, text, self.chunk_overlap)
+        return text[shared:] if shared else "\n" + text
+
+    def pack(self, blocks: List[ContextBlock]) -> Tuple[List[ContextBlock], int, int, bool]:
+        """Best-ranked blocks that fit max_tokens, their token total, blocks skipped, truncation"""
+        packed, total, skipped, truncated = [], 0, 0, False
+        for block in blocks:
+            tokens = estimate_tokens(block.text)
+            if total + tokens <= self.max_tokens:
+                packed.append(block)
+                total += tokens
+            elif not packed:
+                # Keep the head of the best block rather than sending no context
+                while tokens > self.max_tokens and block.text:
+                    block.text = block.text[:int(len(block.text) * self.max_tokens / tokens * 0.95)]
+                    tokens = estimate_tokens(block.text)
+                packed.append(block)
+                total += tokens
+                truncated = True
+            else:
+                skipped += 1
+        return packed, total, skipped, truncated
+
+    def build(self, results: List[Dict], embeddings: Optional[Dict[str, np.ndarray]] = None) -> PackedContext:
+        """Deduplicate, merge and pack ranked results"""
+        unique = self.deduplicate(results, embeddings or {})
+        blocks = self.merge(unique)
+        packed, tokens, skipped, truncated = self.pack(blocks)
+        included = {result["chunk_id"] for block in packed for result in block.results}
+        return PackedContext(
+            chunks=[block.as_chunk() for block in packed],
+            sources=[result for result in unique if result["chunk_id"] in included],
+            tokens=tokens,
+            stats={
+                "chunks_retrieved": len(results),
+                "duplicates_dropped": len(results) - len(unique),
+                "chunks_merged": len(unique) - len(blocks),
+                "blocks": len(packed),
+                "blocks_over_budget": skipped,
+                "truncated": truncated,
+                "context_tokens": tokens,
+                "max_tokens": self.max_tokens
+            }
+        )
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    document_key TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    doc_type TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    content_sha256 TEXT,
+    chunk_size INTEGER NOT NULL,
+    chunk_overlap INTEGER NOT NULL,
+    embedding_model TEXT NOT NULL,
+    chunk_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_updated ON documents (updated_at);
+"""
+
+class DocumentRegistry:
+    """One row per ingested document, backed by SQLite
+
+    Records what each document was built from: the SHA-256 of the uploaded
+    bytes and the chunking and embedding settings. An upload whose content
+    and settings match the document it is registered as is already
+    searchable, so it can skip extraction, embedding and the vector store
+    entirely. Document listing and lookups are served from here rather than
+    by scanning chunk metadata.
+    """
+
+    def __init__(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        self.duplicate_hits = 0
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def upsert(
+        self,
+        document_id: str,
+        document_key: str,
+        filename: str,
+        doc_type: str,
+        file_size: int,
+        content_sha256: Optional[str],
+        chunk_size: int,
+        chunk_overlap: int,
+        embedding_model: str,
+        chunk_count: int
+    ):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (document_id, document_key, filename, doc_type, file_size, content_sha256, "
+                "chunk_size, chunk_overlap, embedding_model, chunk_count, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (document_id) DO UPDATE SET document_key = excluded.document_key, "
+                "filename = excluded.filename, doc_type = excluded.doc_type, file_size = excluded.file_size, "
+                "content_sha256 = excluded.content_sha256, chunk_size = excluded.chunk_size, "
+                "chunk_overlap = excluded.chunk_overlap, embedding_model = excluded.embedding_model, "
+                "chunk_count = excluded.chunk_count, updated_at = excluded.updated_at",
+                (document_id, document_key, filename, doc_type, file_size, content_sha256,
+                 chunk_size, chunk_overlap, embedding_model, chunk_count, now, now)
+            )
+
+    def backfill(self, documents: Dict[str, Dict], chunk_size: int, chunk_overlap: int, embedding_model: str) -> int:
+        """Register documents stored before the registry existed
+
+        Their content hash is unknown, so they are listed and can be deleted
+        but aren't matched as duplicates until they are uploaded again.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO documents (document_id, document_key, filename, doc_type, file_size, "
+                "content_sha256, chunk_size, chunk_overlap, embedding_model, chunk_count, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 0, NULL, ?, ?, ?, ?, ?, ?)",
+                [
+                    (document_id, summary["filename"], summary["filename"], summary["doc_type"],
+                     chunk_size, chunk_overlap, embedding_model, summary["chunk_count"], now, now)
+                    for document_id, summary in documents.items()
+                ]
+            )
+            self._conn.execute("COMMIT")
+        return len(documents)
+
+    def delete(self, document_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM documents WHERE document_id = ?", (document_id,)).rowcount > 0
+
+    def list(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """Documents, most recently updated first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM documents ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def get_stats(self) -> Dict:
+        return {"documents": self.count(), "duplicate_uploads_skipped": self.duplicate_hits}
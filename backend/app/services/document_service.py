@@ -1,80 +1,474 @@
-import os
+import asyncio
+import hashlib
+import logging
+import time
 import uuid
-from typing import List
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime
 from app.services.file_processor import FileProcessor
-from app.services.chunking import DocumentChunker
+from app.services.chunking import LOCATION_FIELDS, StreamingChunker, TextChunk, get_chunker
 from app.services.embedding import EmbeddingService
 from app.services.vectorstore import VectorStoreService
+from app.services.executor import ExecutorPools
+from app.services.parsing import chunk_text, extract_and_chunk_timed, file_sha256, read_pdf_pages_timed
+from app.services.metrics import INGESTED_CHUNKS, INGESTED_DOCUMENTS, StageTimer, observe_stage
+from app.services.document_registry import DocumentRegistry
 from app.models.schemas import DocumentUploadResponse, DocumentType
 from app.config import get_settings
 
+# Namespace for deriving stable document IDs from document keys
+DOCUMENT_NAMESPACE = uuid.UUID("6f1b7a3e-4a55-4f0e-9c55-2d3c1f0b9a61")
+
+logger = logging.getLogger(__name__)
+
+def document_id_for(document_key: str) -> str:
+    """Stable document ID for a filename or client-supplied path"""
+    return str(uuid.uuid5(DOCUMENT_NAMESPACE, document_key))
+
+class ChunkIdAssigner:
+    """Content-derived chunk IDs, assigned in document order as chunks arrive
+
+    Repeated identical chunks get an occurrence suffix.
+    """
+    
+    def __init__(self, document_id: str):
+        self.document_id = document_id
+        self._occurrences: Dict[str, int] = {}
+    
+    def next_id(self, chunk: str) -> str:
+        digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+        count = self._occurrences.get(digest, 0)
+        self._occurrences[digest] = count + 1
+        return f"{self.document_id}_{digest}" if count == 0 else f"{self.document_id}_{digest}_{count}"
+
+def make_chunk_ids(document_id: str, chunks: List[str]) -> List[str]:
+    """Content-derived chunk IDs for a fully chunked document"""
+    assigner = ChunkIdAssigner(document_id)
+    return [assigner.next_id(chunk) for chunk in chunks]
+
+def relabel_metadata(metadata: Dict, position: int, filename: str, chunk: TextChunk) -> Optional[Dict]:
+    """Metadata for a stored chunk whose content is unchanged, or None if it is still accurate
+    
+    The same text can move within the document, shifting its index, lines
+    and offsets, or the file can be renamed.
+    """
+    updated = {key: value for key, value in metadata.items() if key not in LOCATION_FIELDS}
+    updated.update(chunk.location(), chunk_index=position, filename=filename)
+    return updated if updated != metadata else None
+
+@dataclass
+class ChunkDiff:
+    """How a document's new chunks differ from the stored ones"""
+    document_id: str
+    chunk_ids: List[str]
+    new_positions: List[int]
+    removed_ids: List[str]
+    relabeled: Dict[str, Dict]
+    unchanged: int
+
+class ChunkSync:
+    """Diffs a document's chunks against the stored ones as they are produced
+    
+    Streaming counterpart of plan_chunk_diff: chunks are accepted in
+    document order, new ones queue up until they are taken for embedding,
+    and whatever stored chunk was never seen is removed at the end.
+    """
+    
+    def __init__(self, document_id: str, filename: str, existing: Dict[str, Dict]):
+        self.filename = filename
+        self.existing = existing
+        self.assigner = ChunkIdAssigner(document_id)
+        self.seen = set()
+        self.position = 0
+        self.added = 0
+        self.unchanged = 0
+        self.relabeled: Dict[str, Dict] = {}
+        self._pending: List[Tuple[TextChunk, str, int]] = []
+    
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+    
+    def accept(self, chunks: List[TextChunk]):
+        for chunk in chunks:
+            chunk_id = self.assigner.next_id(chunk.text)
+            position = self.position
+            self.position += 1
+            self.seen.add(chunk_id)
+            metadata = self.existing.get(chunk_id)
+            if metadata is None:
+                self._pending.append((chunk, chunk_id, position))
+                self.added += 1
+                continue
+            self.unchanged += 1
+            updated = relabel_metadata(metadata, position, self.filename, chunk)
+            if updated is not None:
+                self.relabeled[chunk_id] = updated
+    
+    def take_pending(self, limit: int) -> Tuple[List[TextChunk], List[str], List[int]]:
+        """Up to limit queued new chunks, with their IDs and positions"""
+        pending, self._pending = self._pending[:limit], self._pending[limit:]
+        if not pending:
+            return [], [], []
+        chunks, chunk_ids, positions = zip(*pending)
+        return list(chunks), list(chunk_ids), list(positions)
+    
+    def removed_ids(self) -> List[str]:
+        return [chunk_id for chunk_id in self.existing if chunk_id not in self.seen]
+
 class DocumentIngestionService:
     """Orchestrates the document ingestion pipeline"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        embedding_service: Optional[EmbeddingService] = None,
+        vectorstore: Optional[VectorStoreService] = None,
+        executors: Optional[ExecutorPools] = None,
+        registry: Optional[DocumentRegistry] = None
+    ):
         settings = get_settings()
         self.file_processor = FileProcessor()
-        self.chunker = DocumentChunker(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap
+        self.chunker = get_chunker(settings.chunk_size, settings.chunk_overlap)
+        # Shared instances are injected by the service registry; fall back to
+        # private ones so the service can still be used standalone
+        self.embedding_service = embedding_service or EmbeddingService(settings.embedding_model)
+        self.vectorstore = vectorstore or VectorStoreService(settings.chroma_persist_directory)
+        self.executors = executors or ExecutorPools(settings)
+        # Without a registry every upload goes through the full pipeline
+        self.registry = registry
+        self.embedding_model = self.embedding_service.model_name
+        self.pdf_parallel_min_pages = settings.pdf_parallel_min_pages
+        self.pdf_pages_per_task = settings.pdf_pages_per_task
+        self.embed_batch_size = settings.ingest_embed_batch_size
+        self._document_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+    
+    def _lock_for(self, document_id: str) -> asyncio.Lock:
+        """Serialize concurrent uploads of the same document so their diffs don't race"""
+        lock = self._document_locks.get(document_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._document_locks[document_id] = lock
+        return lock
+    
+    def find_duplicate(
+        self,
+        content_sha256: Optional[str],
+        filename: str,
+        document_key: Optional[str] = None
+    ) -> Optional[Dict]:
+        """The registered document an upload is an exact copy of, if any
+        
+        A match needs the same document key and filename, bytes, chunking
+        settings and embedding model. An upload for a document that is
+        registered with other content is an update rather than a copy, as is
+        a rename of the same document. The same bytes under another key are
+        a document of their own, ingested normally, so deleting or updating
+        one copy never takes the other's chunks with it.
+        """
+        if self.registry is None or content_sha256 is None:
+            return None
+        current = self.registry.get(document_id_for(document_key or filename))
+        if current is None:
+            return None
+        if current["filename"] != filename or current["content_sha256"] != content_sha256:
+            return None
+        if (
+            current["chunk_size"] != self.chunker.chunk_size
+            or current["chunk_overlap"] != self.chunker.chunk_overlap
+            or current["embedding_model"] != self.embedding_model
+        ):
+            return None
+        return current
+    
+    def duplicate_response(self, document: Dict, file_size: int) -> DocumentUploadResponse:
+        """Result for an upload that matched a registered document"""
+        self.registry.duplicate_hits += 1
+        INGESTED_DOCUMENTS.inc(doc_type=document["doc_type"], outcome="duplicate")
+        return DocumentUploadResponse(
+            id=document["document_id"],
+            filename=document["filename"],
+            file_type=DocumentType(document["doc_type"]),
+            size=file_size,
+            chunks_created=document["chunk_count"],
+            upload_time=datetime.fromtimestamp(document["updated_at"]),
+            message=f"{document['filename']} is already ingested with identical content; nothing to process",
+            chunks_unchanged=document["chunk_count"],
+            content_sha256=document["content_sha256"],
+            duplicate=True
+        )
+    
+    def register_document(
+        self,
+        document_id: str,
+        document_key: str,
+        filename: str,
+        file_type: DocumentType,
+        file_size: int,
+        content_sha256: Optional[str],
+        chunk_count: int
+    ):
+        """Record a freshly ingested document and what it was built from"""
+        if self.registry is None:
+            return
+        self.registry.upsert(
+            document_id=document_id,
+            document_key=document_key,
+            filename=filename,
+            doc_type=file_type.value,
+            file_size=file_size,
+            content_sha256=content_sha256,
+            chunk_size=self.chunker.chunk_size,
+            chunk_overlap=self.chunker.chunk_overlap,
+            embedding_model=self.embedding_model,
+            chunk_count=chunk_count
         )
-        self.embedding_service = EmbeddingService(settings.embedding_model)
-        self.vectorstore = VectorStoreService(settings.chroma_persist_directory)
+    
+    async def delete_document(self, document_id: str) -> bool:
+        """Remove a document's chunks and its registry entry"""
+        async with self._lock_for(document_id):
+            deleted = await self.executors.ingest.run(self.vectorstore.delete_document, document_id)
+            if not deleted:
+                return False
+            if self.registry is not None:
+                self.registry.delete(document_id)
+        return True
+    
+    def plan_chunk_diff(
+        self,
+        document_id: str,
+        chunks: List[TextChunk],
+        filename: str
+    ) -> ChunkDiff:
+        """Compare freshly chunked text against the chunks already stored"""
+        chunk_ids = make_chunk_ids(document_id, [chunk.text for chunk in chunks])
+        existing = self.vectorstore.get_document_chunk_metadata(document_id)
+        wanted = set(chunk_ids)
+        
+        new_positions = []
+        relabeled = {}
+        for position, chunk_id in enumerate(chunk_ids):
+            metadata = existing.get(chunk_id)
+            if metadata is None:
+                new_positions.append(position)
+                continue
+            updated = relabel_metadata(metadata, position, filename, chunks[position])
+            if updated is not None:
+                relabeled[chunk_id] = updated
+        
+        return ChunkDiff(
+            document_id=document_id,
+            chunk_ids=chunk_ids,
+            new_positions=new_positions,
+            removed_ids=[chunk_id for chunk_id in existing if chunk_id not in wanted],
+            relabeled=relabeled,
+            unchanged=len(chunk_ids) - len(new_positions)
+        )
+    
+    async def _pdf_page_batches(self, file_path: str, timer: StageTimer) -> AsyncIterator[List[str]]:
+        """Yield PDF page text in order, a range of pages at a time
+        
+        Large PDFs are split into ranges that are extracted concurrently in
+        the parse pool; only a pool's worth of ranges is in flight at once,
+        so memory stays bounded however long the document is.
+        """
+        page_count = await self.executors.parse.run(FileProcessor.count_pdf_pages, file_path)
+        if page_count >= self.pdf_parallel_min_pages:
+            step = self.pdf_pages_per_task
+        else:
+            step = max(page_count, 1)
+        
+        in_flight: "deque[asyncio.Task]" = deque()
+        try:
+            for start in range(0, page_count, step):
+                in_flight.append(asyncio.ensure_future(self.executors.parse.run(
+                    read_pdf_pages_timed, file_path, start, min(start + step, page_count)
+                )))
+                if len(in_flight) > self.executors.parse.max_workers:
+                    pages, seconds = await in_flight.popleft()
+                    timer.add("extract", seconds)
+                    yield pages
+            while in_flight:
+                pages, seconds = await in_flight.popleft()
+                timer.add("extract", seconds)
+                yield pages
+        finally:
+            for task in in_flight:
+                task.cancel()
+    
+    @staticmethod
+    def _feed_chunker(stream: StreamingChunker, blocks: List[str]) -> List[TextChunk]:
+        chunks = []
+        for block in blocks:
+            chunks.extend(stream.feed(block))
+        return chunks
+    
+    async def _store_pending(
+        self,
+        sync: ChunkSync,
+        document_id: str,
+        filename: str,
+        file_type: DocumentType,
+        timer: StageTimer
+    ):
+        """Embed and store the next batch of new chunks"""
+        chunks, chunk_ids, positions = sync.take_pending(self.embed_batch_size)
+        if not chunks:
+            return
+        texts = [chunk.text for chunk in chunks]
+        with timer.time("embed"):
+            embeddings = await self.executors.ingest.run(
+                self.embedding_service.generate_embeddings, texts
+            )
+        with timer.time("store"):
+            await self.executors.ingest.run(
+                self.vectorstore.add_chunks,
+                chunks=texts,
+                embeddings=embeddings,
+                document_id=document_id,
+                filename=filename,
+                doc_type=file_type.value,
+                chunk_ids=chunk_ids,
+                chunk_indices=positions,
+                locations=[chunk.location() for chunk in chunks]
+            )
     
     async def ingest_document(
         self,
         file_path: str,
         filename: str,
-        file_size: int
+        file_size: int,
+        document_key: Optional[str] = None,
+        content: Optional[bytes] = None,
+        content_sha256: Optional[str] = None
     ) -> DocumentUploadResponse:
-        """Complete document ingestion pipeline"""
+        """Complete document ingestion pipeline
         
-        # Generate unique document ID
-        document_id = str(uuid.uuid4())
+        Documents are identified by document_key (defaulting to the filename),
+        so uploading a new version only embeds and stores the chunks that
+        changed and removes the ones that disappeared. PDFs are extracted
+        page by page and chunked as they go, so embedding starts before the
+        last page has been parsed. Small text documents can be passed as
+        content instead of a file_path. An exact copy of a registered
+        document (see find_duplicate) is not processed at all.
+        """
+        
+        # Stable document ID derived from the document key
+        document_id = document_id_for(document_key or filename)
         
         # Step 1: Detect file type
         file_type = self.file_processor.detect_file_type(filename)
+        logger.info("Processing file: %s", filename)
+        started = time.perf_counter()
+        timer = StageTimer()
         
-        # Step 2: Extract text content
-        print(f"Processing file: {filename}")
-        text_content = await self.file_processor.process_file(file_path, file_type)
-        
-        if not text_content or len(text_content.strip()) == 0:
-            raise ValueError("No text content could be extracted from the file")
-        
-        # Step 3: Chunk the document
-        print(f"Chunking document into {self.chunker.chunk_size} character chunks...")
-        chunks = self.chunker.chunk_document(text_content, file_type)
+        if content_sha256 is None and self.registry is not None:
+            with timer.time("hash"):
+                if content is not None:
+                    content_sha256 = hashlib.sha256(content).hexdigest()
+                else:
+                    content_sha256 = await self.executors.ingest.run(file_sha256, file_path)
         
-        if not chunks:
-            raise ValueError("Failed to create chunks from document")
-        
-        print(f"Created {len(chunks)} chunks")
+        async with self._lock_for(document_id):
+            # An earlier job may have ingested the same bytes while this one waited
+            duplicate = self.find_duplicate(content_sha256, filename, document_key)
+            if duplicate is not None:
+                logger.info("Skipping %s: identical to registered document %s", filename, duplicate["document_id"])
+                return self.duplicate_response(duplicate, file_size)
+            
+            # Step 2: Load what is already stored, to diff against
+            with timer.time("diff"):
+                existing = await self.executors.ingest.run(
+                    self.vectorstore.get_document_chunk_metadata, document_id
+                )
+            sync = ChunkSync(document_id, filename, existing)
+            # Only PDFs are streamed; other types are read whole, so there is no buffer to measure
+            peak_buffered_chars = None
+            
+            # Steps 3-5: Extract, chunk, and embed + store new chunks in batches
+            if content is not None:
+                with timer.time("chunk"):
+                    chunks = await self.executors.ingest.run(
+                        chunk_text,
+                        content.decode("utf-8", errors="ignore"),
+                        file_type,
+                        self.chunker.chunk_size,
+                        self.chunker.chunk_overlap
+                    )
+                sync.accept(chunks)
+            elif file_type == DocumentType.PDF:
+                stream = self.chunker.stream_chunker(file_type)
+                peak_buffered_chars = 0
+                async for pages in self._pdf_page_batches(file_path, timer):
+                    peak_buffered_chars = max(
+                        peak_buffered_chars, stream.buffered_chars + sum(len(page) for page in pages)
+                    )
+                    with timer.time("chunk"):
+                        sync.accept(await self.executors.ingest.run(self._feed_chunker, stream, pages))
+                    while sync.pending_count >= self.embed_batch_size:
+                        await self._store_pending(sync, document_id, filename, file_type, timer)
+                sync.accept(stream.finish())
+                if sync.position == 0:
+                    raise ValueError("No text content could be extracted from the file")
+            else:
+                chunks, extract_seconds, chunk_seconds = await self.executors.parse.run(
+                    extract_and_chunk_timed,
+                    file_path,
+                    file_type,
+                    self.chunker.chunk_size,
+                    self.chunker.chunk_overlap
+                )
+                timer.add("extract", extract_seconds)
+                timer.add("chunk", chunk_seconds)
+                sync.accept(chunks)
+            
+            while sync.pending_count:
+                await self._store_pending(sync, document_id, filename, file_type, timer)
+            
+            # Step 6: Fix up moved chunks and drop the ones that disappeared
+            with timer.time("store"):
+                if sync.relabeled:
+                    await self.executors.ingest.run(
+                        self.vectorstore.update_chunk_metadata,
+                        list(sync.relabeled.keys()),
+                        list(sync.relabeled.values())
+                    )
+                
+                removed_ids = sync.removed_ids()
+                if removed_ids:
+                    await self.executors.ingest.run(self.vectorstore.delete_chunks, removed_ids)
+            
+            self.register_document(
+                document_id, document_key or filename, filename, file_type, file_size, content_sha256, sync.position
+            )
         
-        # Step 4: Generate embeddings
-        print("Generating embeddings...")
-        embeddings = self.embedding_service.generate_embeddings(chunks)
-        
-        # Step 5: Store in vector database
-        print("Storing in vector database...")
-        chunks_stored = self.vectorstore.add_chunks(
-            chunks=chunks,
-            embeddings=embeddings,
-            document_id=document_id,
-            filename=filename,
-            doc_type=file_type.value
+        timer.observe(file_type.value)
+        observe_stage("ingest", time.perf_counter() - started, file_type.value)
+        INGESTED_DOCUMENTS.inc(doc_type=file_type.value, outcome="ingested")
+        INGESTED_CHUNKS.inc(sync.added, doc_type=file_type.value, outcome="embedded")
+        INGESTED_CHUNKS.inc(sync.unchanged, doc_type=file_type.value, outcome="unchanged")
+        logger.info(
+            "Successfully ingested document: %s (%d new, %d removed, %d unchanged chunks)",
+            filename, sync.added, len(removed_ids), sync.unchanged
         )
         
-        print(f"Successfully ingested document: {filename}")
-        
         return DocumentUploadResponse(
             id=document_id,
             filename=filename,
             file_type=file_type,
             size=file_size,
-            chunks_created=chunks_stored,
+            chunks_created=sync.position,
             upload_time=datetime.now(),
-            message=f"Document successfully processed into {chunks_stored} searchable chunks"
+            message=(
+                f"Document successfully processed into {sync.position} searchable chunks "
+                f"({sync.added} added, {len(removed_ids)} removed, "
+                f"{sync.unchanged} unchanged)"
+            ),
+            chunks_added=sync.added,
+            chunks_removed=len(removed_ids),
+            chunks_unchanged=sync.unchanged,
+            peak_buffered_chars=peak_buffered_chars,
+            content_sha256=content_sha256
         )
-
@@ -1,22 +1,89 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+import hashlib
+import logging
+import re
+from typing import Dict, List, Optional
 import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# EMBEDDING_MODEL value selecting HashingEmbedder instead of a real model
+HASHING_MODEL = "hashing"
+
+class HashingEmbedder:
+    """Tiny deterministic stand-in for a sentence-transformers model
+
+    Hashes lowercased words and word bigrams into a fixed number of signed
+    buckets and L2-normalizes the counts. Texts sharing words get similar
+    vectors, which is enough for benchmarks and CPU-only test runs; it
+    needs no model download, and the same text always gets the same vector
+    in every process.
+    """
+
+    TOKEN_PATTERN = re.compile(r"\w+")
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _bucket(self, feature: str):
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        return digest % self.dimension, 1.0 if digest >> 63 else -1.0
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = self.TOKEN_PATTERN.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                index, sign = self._bucket(feature)
+                embeddings[row, index] += sign
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
 
 class EmbeddingService:
     """Handles text embedding generation"""
     
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        print(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        print("Embedding model loaded successfully")
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        cache: Optional[EmbeddingCache] = None
+    ):
+        logger.info("Loading embedding model: %s", model_name)
+        self.model_name = model_name
+        if model_name == HASHING_MODEL:
+            self.model = HashingEmbedder()
+        else:
+            # Imported here so hashing runs don't pay for loading torch
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(model_name)
+        self.cache = cache
+        logger.info("Embedding model loaded successfully")
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for list of texts"""
-        embeddings = self.model.encode(texts, show_progress_bar=True)
-        return embeddings.tolist()
+    def generate_embeddings(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        """Generate embeddings for list of texts, as a float32 (len(texts), dimension) array"""
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if self.cache is None:
+            embeddings = self.model.encode(texts, show_progress_bar=show_progress_bar)
+            return np.asarray(embeddings, dtype=np.float32)
+        
+        # Only encode texts the cache hasn't seen, once each
+        cached = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        if missing:
+            computed = self.model.encode(missing, show_progress_bar=show_progress_bar)
+            self.cache.put_many(missing, computed)
+            by_text = dict(zip(missing, computed))
+            cached = [vector if vector is not None else by_text[text] for text, vector in zip(texts, cached)]
+        
+        return np.stack(cached).astype(np.float32, copy=False)
     
-    def generate_embedding(self, text: str) -> List[float]:
+    def generate_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for single text"""
-        embedding = self.model.encode([text])[0]
-        return embedding.tolist()
-
+        return self.generate_embeddings([text], show_progress_bar=False)[0]
+    
+    def get_cache_stats(self) -> Optional[Dict]:
+        """Hit/miss counters of the embedding cache, if enabled"""
+        return self.cache.get_stats() if self.cache is not None else None
@@ -0,0 +1,129 @@
+import asyncio
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.services.embedding import EmbeddingService
+from app.services.executor import BoundedExecutor, ExecutorBusyError
+
+class EmbeddingBatcher:
+    """Coalesces concurrent query embeddings into batched encode calls
+
+    Callers await embed(); the first queued query opens a collection window
+    of window_ms, and the batch is dispatched when the window closes or
+    max_batch_size queries have arrived, whichever comes first. Batches run
+    one at a time, so queries that arrive while a batch is encoding are
+    picked up together by the next one.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        executor: BoundedExecutor,
+        window_ms: float = 5.0,
+        max_batch_size: int = 32,
+        max_queue: int = 256
+    ):
+        self.embedding_service = embedding_service
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.batches = 0
+        self.queries = 0
+        self.batch_size_counts: Dict[int, int] = {}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # Fail anything still waiting so callers don't hang on shutdown
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher stopped"))
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Queue a query for the next batch and wait for its embedding"""
+        if self._queue.qsize() >= self.max_queue:
+            raise ExecutorBusyError("The query embedding queue is full, try again later")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued without waiting
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._process(batch)
+
+    async def _process(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        # Drop callers that gave up (e.g. client disconnected) while queued
+        batch = [item for item in batch if not item[1].done()]
+        if not batch:
+            return
+
+        dispatched = time.perf_counter()
+        for _, _, enqueued in batch:
+            wait = dispatched - enqueued
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        self.batches += 1
+        self.queries += len(batch)
+        self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+
+        try:
+            embeddings = await self.executor.run(
+                self.embedding_service.generate_embeddings,
+                [text for text, _, _ in batch],
+                show_progress_bar=False
+            )
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+    def get_stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "avg_queue_wait_ms": round(self.total_wait / self.queries * 1000, 3) if self.queries else 0.0,
+            "max_queue_wait_ms": round(self.max_wait * 1000, 3),
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
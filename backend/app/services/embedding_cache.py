@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry bookkeeping cost (key bytes, OrderedDict node, array header)
+ENTRY_OVERHEAD_BYTES = 160
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an in-memory LRU and an on-disk tier
+
+    Entries are keyed by sha256(model name + text). The disk tier lives in a
+    per-model directory as two append-only files: keys.bin holds the 32-byte
+    digests and vectors.f32 the matching float32 rows, memory-mapped on
+    load; the vector dimension is kept in a small "dimension" file. Every
+    new embedding is written through to disk, so evicting from the LRU
+    never loses it.
+    """
+
+    KEY_SIZE = 32
+
+    def __init__(self, model_name: str, cache_directory: str, max_memory_bytes: int = 64 * 1024 * 1024):
+        self.model_name = model_name
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = Path(cache_directory) / re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keys_path = self.directory / "keys.bin"
+        self.vectors_path = self.directory / "vectors.f32"
+        self.dimension_path = self.directory / "dimension"
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_rows: Dict[bytes, int] = {}
+        self._dimension: Optional[int] = None
+        self._mmap: Optional[np.memmap] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._load()
+
+    def _load(self):
+        """Rebuild the key -> row index from disk"""
+        if not self.dimension_path.exists():
+            return
+        self._dimension = int(self.dimension_path.read_text())
+
+        keys = self.keys_path.read_bytes() if self.keys_path.exists() else b""
+        vector_bytes = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        # A crash between the two appends can leave the files out of step;
+        # keep only the rows that are complete in both
+        rows = min(len(keys) // self.KEY_SIZE, vector_bytes // 4 // self._dimension)
+        if rows == 0:
+            self.keys_path.unlink(missing_ok=True)
+            self.vectors_path.unlink(missing_ok=True)
+            return
+
+        for row in range(rows):
+            self._disk_rows[keys[row * self.KEY_SIZE:(row + 1) * self.KEY_SIZE]] = row
+        self._truncate(rows)
+        self._remap()
+        logger.info("Loaded %d cached embeddings for %s", len(self._disk_rows), self.model_name)
+
+    def _truncate(self, rows: int):
+        with open(self.keys_path, "r+b") as f:
+            f.truncate(rows * self.KEY_SIZE)
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(rows * self._dimension * 4)
+
+    def _remap(self):
+        rows = self.vectors_path.stat().st_size // 4 // self._dimension
+        self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dimension))
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings, returning None for texts that aren't cached"""
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                elif key in self._disk_rows:
+                    row = self._disk_rows[key]
+                    if self._mmap is None or row >= self._mmap.shape[0]:
+                        self._remap()
+                    vector = np.array(self._mmap[row])
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Store freshly computed embeddings in both tiers"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._dimension is None:
+                self._dimension = vectors.shape[1]
+                self.dimension_path.write_text(str(self._dimension))
+
+            new_keys = []
+            new_rows = []
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                # Copy so the cache doesn't pin the caller's whole batch array
+                vector = vector.copy()
+                self._remember(key, vector)
+                if key not in self._disk_rows:
+                    self._disk_rows[key] = len(self._disk_rows)
+                    new_keys.append(key)
+                    new_rows.append(vector)
+
+            if new_keys:
+                # Vectors first: on a crash the loader trims to the shorter file
+                with open(self.vectors_path, "ab") as f:
+                    f.write(np.stack(new_rows).astype(np.float32).tobytes())
+                with open(self.keys_path, "ab") as f:
+                    f.write(b"".join(new_keys))
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes + ENTRY_OVERHEAD_BYTES
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def get_stats(self) -> Dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk_rows),
+            "disk_bytes": os.path.getsize(self.vectors_path) if self.vectors_path.exists() else 0
+        }
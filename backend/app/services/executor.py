@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict
+from app.config import Settings
+
+class ExecutorBusyError(Exception):
+    """Raised when a pool already has its maximum amount of queued work"""
+
+class BoundedExecutor:
+    """Runs blocking callables on a worker pool with a cap on queued work"""
+
+    def __init__(self, name: str, pool: Executor, max_workers: int, max_queue: int):
+        self.name = name
+        self.pool = pool
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run fn in the pool, rejecting immediately when the queue is full"""
+        # Everything beyond the workers that are busy counts as queued
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorBusyError(f"The {self.name} queue is full, try again later")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.pending,
+            "queued": max(0, self.pending - self.max_workers),
+            "rejected": self.rejected
+        }
+
+
+class ExecutorPools:
+    """The pools that keep CPU-bound work off the event loop
+
+    Search and ingestion get separate pools so a burst of uploads can only
+    saturate its own workers and never delays query embedding.
+    """
+
+    def __init__(self, settings: Settings):
+        self.search = BoundedExecutor(
+            "search",
+            ThreadPoolExecutor(settings.search_pool_workers, thread_name_prefix="search"),
+            settings.search_pool_workers,
+            settings.search_queue_size
+        )
+        self.ingest = BoundedExecutor(
+            "ingest",
+            ThreadPoolExecutor(settings.ingest_pool_workers, thread_name_prefix="ingest"),
+            settings.ingest_pool_workers,
+            settings.ingest_queue_size
+        )
+
+        # PDF parsing and chunking are pure Python and hold the GIL, so they
+        # scale across processes. Spawn avoids forking a process that has
+        # torch threads running.
+        if settings.parse_pool_type == "process":
+            parse_pool = ProcessPoolExecutor(
+                settings.parse_pool_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            parse_pool = ThreadPoolExecutor(settings.parse_pool_workers, thread_name_prefix="parse")
+        self.parse = BoundedExecutor(
+            "parse",
+            parse_pool,
+            settings.parse_pool_workers,
+            settings.ingest_queue_size
+        )
+
+    def shutdown(self):
+        for executor in (self.search, self.ingest, self.parse):
+            executor.shutdown()
+
+    def get_stats(self) -> Dict:
+        return {
+            "search": self.search.get_stats(),
+            "ingest": self.ingest.get_stats(),
+            "parse": self.parse.get_stats()
+        }
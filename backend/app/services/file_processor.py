@@ -1,7 +1,7 @@
 import os
 import mimetypes
 from pathlib import Path
-from typing import Tuple
+from typing import Iterator, List, Optional, Tuple
 import aiofiles
 from pypdf import PdfReader
 from app.models.schemas import DocumentType
@@ -28,6 +28,9 @@ class FileProcessor:
         '.json': DocumentType.OTHER,
     }
     
+    # Plain-text formats, which can be chunked straight from memory
+    TEXT_EXTENSIONS = tuple(ext for ext, doc_type in SUPPORTED_EXTENSIONS.items() if doc_type != DocumentType.PDF)
+    
     @staticmethod
     def detect_file_type(filename: str) -> DocumentType:
         """Detect document type from filename"""
@@ -40,14 +43,46 @@ class FileProcessor:
         async with aiofiles.open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
             return await f.read()
     
+    @staticmethod
+    def read_text_file_sync(file_path: str) -> str:
+        """Read text-based files from a worker thread or process"""
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    
+    @staticmethod
+    def iter_text_blocks(file_path: str, block_size: int = 1 << 20) -> Iterator[str]:
+        """Yield a text file in blocks of block_size characters
+        
+        Line endings are left untranslated so chunk byte offsets match the file.
+        """
+        with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    return
+                yield block
+    
     @staticmethod
     def read_pdf_file(file_path: str) -> str:
         """Read PDF files"""
+        return "".join(FileProcessor.iter_pdf_pages(file_path))
+    
+    @staticmethod
+    def iter_pdf_pages(file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+        """Yield the text of each page in [start, end), one page at a time"""
         reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n\n"
-        return text
+        pages = reader.pages
+        for index in range(start, len(pages) if end is None else min(end, len(pages))):
+            yield (pages[index].extract_text() or "") + "\n\n"
+    
+    @staticmethod
+    def read_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+        """Text of a range of pages (a unit of work for the parse pool)"""
+        return list(FileProcessor.iter_pdf_pages(file_path, start, end))
+    
+    @staticmethod
+    def count_pdf_pages(file_path: str) -> int:
+        return len(PdfReader(file_path).pages)
     
     @staticmethod
     async def process_file(file_path: str, file_type: DocumentType) -> str:
@@ -0,0 +1,478 @@
+import asyncio
+import logging
+import numpy as np
+import shutil
+import tarfile
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.services.document_service import DocumentIngestionService, document_id_for
+from app.services.parsing import extract_and_chunk_timed, file_sha256
+from app.services.metrics import INGESTED_CHUNKS, INGESTED_DOCUMENTS, observe_stage, span, start_trace
+from app.services.vectorstore import build_chunk_metadata
+from app.services.executor import ExecutorBusyError
+from app.config import Settings
+from app.models.schemas import DocumentType
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BatchFile:
+    """One file of a batch, already saved to disk"""
+    path: str
+    filename: str
+    document_key: str
+    file_size: int = 0
+    content_sha256: Optional[str] = None
+
+@dataclass
+class IngestionJob:
+    """Progress of a batch ingestion job"""
+    id: str
+    files_total: int
+    status: str = "queued"
+    files_done: int = 0
+    files_failed: int = 0
+    files_duplicate: int = 0
+    chunks_total: int = 0
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    chunks_unchanged: int = 0
+    chunks_stored: int = 0
+    errors: List[Dict] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "files_failed": self.files_failed,
+            "files_duplicate": self.files_duplicate,
+            "chunks_total": self.chunks_total,
+            "chunks_added": self.chunks_added,
+            "chunks_removed": self.chunks_removed,
+            "chunks_unchanged": self.chunks_unchanged,
+            "chunks_stored": self.chunks_stored,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_second": round(self.files_done / elapsed, 2) if elapsed > 0 else 0.0,
+            "chunks_per_second": round(self.chunks_stored / elapsed, 2) if elapsed > 0 else 0.0,
+            "errors": self.errors[:50]
+        }
+
+@dataclass
+class PendingChunk:
+    """A new chunk waiting to be embedded and stored"""
+    document_id: str
+    chunk_id: str
+    text: str
+    metadata: Dict
+    embedding: Optional[np.ndarray] = None
+
+@dataclass
+class PlannedDocument:
+    """A document whose new chunks are in flight; its lock is held until they are stored"""
+    batch_file: BatchFile
+    file_type: DocumentType
+    chunk_count: int
+    removed_ids: List[str]
+    lock: asyncio.Lock
+    remaining: int = 0
+
+# Marks the end of a stage's output
+_DONE = None
+
+class IngestionPipeline:
+    """Pipelined bulk ingestion: extract -> diff -> embed -> store
+
+    Stages run concurrently and are connected by bounded queues, so a slow
+    stage applies backpressure upstream instead of buffering the whole
+    batch. Extraction fans out over the parse pool; embedding and storage
+    work on large batches that cut across documents.
+    """
+
+    def __init__(self, document_service: DocumentIngestionService, settings: Settings):
+        self.document_service = document_service
+        self.executors = document_service.executors
+        self.embedding_service = document_service.embedding_service
+        self.vectorstore = document_service.vectorstore
+        self.settings = settings
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._tasks = set()
+
+    def submit(self, files: List[BatchFile], work_directory: Optional[str] = None) -> IngestionJob:
+        """Start a job in the background and return it immediately"""
+        # A document key may only appear once per job; the last copy wins
+        files = list({batch_file.document_key: batch_file for batch_file in files}.values())
+        job = IngestionJob(id=str(uuid.uuid4()), files_total=len(files))
+        self.jobs[job.id] = job
+        # Only the most recent jobs are kept for polling
+        while len(self.jobs) > self.settings.batch_jobs_retained:
+            self.jobs.popitem(last=False)
+
+        task = asyncio.create_task(self._run(job, files, work_directory))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    async def stop(self):
+        """Cancel running jobs and wait until their stages have unwound"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: IngestionJob, files: List[BatchFile], work_directory: Optional[str]):
+        # Stage timings of batch jobs go to the metrics only, not a per-job trace
+        with start_trace("batch_ingest", record_spans=False):
+            await self._run_stages(job, files, work_directory)
+
+    async def _run_stages(self, job: IngestionJob, files: List[BatchFile], work_directory: Optional[str]):
+        job.status = "running"
+        job.started_at = time.time()
+        queue_size = self.settings.batch_queue_size
+        files_queue: asyncio.Queue = asyncio.Queue()
+        parsed_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size * self.settings.batch_embed_size)
+        store_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Documents with chunks still waiting to be stored
+        documents: Dict[str, PlannedDocument] = {}
+
+        for batch_file in files:
+            files_queue.put_nowait(batch_file)
+        extract_workers = self.settings.parse_pool_workers
+        for _ in range(extract_workers):
+            files_queue.put_nowait(_DONE)
+
+        stages = [
+            *[asyncio.create_task(self._extract(job, files_queue, parsed_queue)) for _ in range(extract_workers)],
+            asyncio.create_task(self._plan(job, parsed_queue, embed_queue, documents, extract_workers)),
+            asyncio.create_task(self._embed(embed_queue, store_queue)),
+            asyncio.create_task(self._store(job, store_queue, documents))
+        ]
+        try:
+            await asyncio.gather(*stages)
+            job.status = "completed" if job.files_failed == 0 else "completed_with_errors"
+        except Exception as e:
+            # A failed stage would leave its neighbours blocked on full or empty queues
+            for stage in stages:
+                stage.cancel()
+            job.status = "failed"
+            job.errors.append({"file": None, "error": str(e)})
+        except asyncio.CancelledError:
+            # Shutdown: the stages must not outlive the executors and stores they use
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            job.status = "cancelled"
+            raise
+        finally:
+            # Documents cut off by a failure keep their old chunks
+            for planned in documents.values():
+                planned.lock.release()
+            documents.clear()
+            job.finished_at = time.time()
+            if work_directory is not None:
+                shutil.rmtree(work_directory, ignore_errors=True)
+            logger.info("Batch job %s %s: %s files/s", job.id, job.status, job.to_dict()["files_per_second"])
+
+    def _fail(self, job: IngestionJob, filename: str, error: Exception):
+        job.files_failed += 1
+        job.errors.append({"file": filename, "error": str(error)})
+
+    async def _extract(self, job: IngestionJob, files_queue: asyncio.Queue, parsed_queue: asyncio.Queue):
+        """Stage 1: read and chunk files in the parse pool"""
+        while True:
+            batch_file = files_queue.get_nowait()
+            if batch_file is _DONE:
+                await parsed_queue.put(_DONE)
+                return
+
+            file_type = self.document_service.file_processor.detect_file_type(batch_file.filename)
+            try:
+                batch_file.file_size = Path(batch_file.path).stat().st_size
+                if self.document_service.registry is not None:
+                    batch_file.content_sha256 = await self._run_parse(file_sha256, batch_file.path)
+                    duplicate = self.document_service.find_duplicate(
+                        batch_file.content_sha256, batch_file.filename, batch_file.document_key
+                    )
+                    if duplicate is not None:
+                        # Already stored exactly as this file would produce it
+                        self.document_service.registry.duplicate_hits += 1
+                        INGESTED_DOCUMENTS.inc(doc_type=duplicate["doc_type"], outcome="duplicate")
+                        job.files_duplicate += 1
+                        job.files_done += 1
+                        job.chunks_total += duplicate["chunk_count"]
+                        job.chunks_unchanged += duplicate["chunk_count"]
+                        continue
+                chunks, extract_seconds, chunk_seconds = await self._run_parse(
+                    extract_and_chunk_timed,
+                    batch_file.path,
+                    file_type,
+                    self.document_service.chunker.chunk_size,
+                    self.document_service.chunker.chunk_overlap
+                )
+                observe_stage("extract", extract_seconds, file_type.value)
+                observe_stage("chunk", chunk_seconds, file_type.value)
+            except Exception as e:
+                self._fail(job, batch_file.filename, e)
+                continue
+
+            await parsed_queue.put((batch_file, file_type, chunks))
+
+    async def _plan(
+        self,
+        job: IngestionJob,
+        parsed_queue: asyncio.Queue,
+        embed_queue: asyncio.Queue,
+        documents: Dict[str, PlannedDocument],
+        producers: int
+    ):
+        """Stage 2: diff each document against the store and queue its new chunks
+
+        The document's lock is taken here and released by _finish once its
+        last new chunk is stored, so a concurrent upload of the same document
+        can't interleave, and the chunks that disappeared are only deleted
+        after their replacements are in place.
+        """
+        finished = 0
+        while finished < producers:
+            item = await parsed_queue.get()
+            if item is _DONE:
+                finished += 1
+                continue
+
+            batch_file, file_type, chunks = item
+            document_id = document_id_for(batch_file.document_key)
+            lock = self.document_service._lock_for(document_id)
+            await lock.acquire()
+            # Tracked from here so a failed job releases the lock
+            planned = documents[document_id] = PlannedDocument(batch_file, file_type, len(chunks), [], lock)
+            try:
+                diff = await self._run_ingest(
+                    self.document_service.plan_chunk_diff, document_id, chunks, batch_file.filename
+                )
+                if diff.relabeled:
+                    await self._run_ingest(
+                        self.vectorstore.update_chunk_metadata,
+                        list(diff.relabeled.keys()),
+                        list(diff.relabeled.values())
+                    )
+            except Exception as e:
+                documents.pop(document_id).lock.release()
+                self._fail(job, batch_file.filename, e)
+                continue
+
+            job.chunks_total += len(chunks)
+            job.chunks_added += len(diff.new_positions)
+            job.chunks_removed += len(diff.removed_ids)
+            job.chunks_unchanged += diff.unchanged
+            INGESTED_CHUNKS.inc(len(diff.new_positions), doc_type=file_type.value, outcome="embedded")
+            INGESTED_CHUNKS.inc(diff.unchanged, doc_type=file_type.value, outcome="unchanged")
+            planned.removed_ids = diff.removed_ids
+            if not diff.new_positions:
+                await self._finish(job, document_id, documents.pop(document_id))
+                continue
+
+            planned.remaining = len(diff.new_positions)
+            for position in diff.new_positions:
+                chunk = chunks[position]
+                await embed_queue.put(PendingChunk(
+                    document_id=document_id,
+                    chunk_id=diff.chunk_ids[position],
+                    text=chunk.text,
+                    metadata=build_chunk_metadata(
+                        document_id, batch_file.filename, file_type.value, position, chunk.text, chunk.location()
+                    )
+                ))
+
+        await embed_queue.put(_DONE)
+
+    async def _next_batch(self, queue: asyncio.Queue, size: int) -> Tuple[List, bool]:
+        """Collect up to size items, returning early once the queue runs dry"""
+        batch = [await queue.get()]
+        while len(batch) < size and not queue.empty():
+            batch.append(queue.get_nowait())
+        done = batch[-1] is _DONE
+        return [item for item in batch if item is not _DONE], done
+
+    async def _embed(self, embed_queue: asyncio.Queue, store_queue: asyncio.Queue):
+        """Stage 3: embed chunks in large cross-document batches"""
+        while True:
+            batch, done = await self._next_batch(embed_queue, self.settings.batch_embed_size)
+            if batch:
+                with span("embed"):
+                    embeddings = await self._run_ingest(
+                        self.embedding_service.generate_embeddings,
+                        [pending.text for pending in batch]
+                    )
+                for pending, embedding in zip(batch, embeddings):
+                    pending.embedding = embedding
+                await store_queue.put(batch)
+            if done:
+                await store_queue.put(_DONE)
+                return
+
+    async def _store(
+        self,
+        job: IngestionJob,
+        store_queue: asyncio.Queue,
+        documents: Dict[str, PlannedDocument]
+    ):
+        """Stage 4: write embedded chunks with batched upserts"""
+        buffer: List[PendingChunk] = []
+        while True:
+            batch = await store_queue.get()
+            done = batch is _DONE
+            if not done:
+                buffer.extend(batch)
+
+            if buffer and (done or len(buffer) >= self.settings.batch_store_size or store_queue.empty()):
+                with span("store"):
+                    await self._run_ingest(
+                        self.vectorstore.upsert_chunks,
+                        [pending.chunk_id for pending in buffer],
+                        [pending.text for pending in buffer],
+                        np.stack([pending.embedding for pending in buffer]),
+                        [pending.metadata for pending in buffer]
+                    )
+                job.chunks_stored += len(buffer)
+                for pending in buffer:
+                    planned = documents[pending.document_id]
+                    planned.remaining -= 1
+                    if planned.remaining == 0:
+                        await self._finish(job, pending.document_id, documents.pop(pending.document_id))
+                buffer = []
+
+            if done:
+                return
+
+    async def _finish(self, job: IngestionJob, document_id: str, planned: PlannedDocument):
+        """Drop the chunks that disappeared, register the document and release its lock"""
+        try:
+            if planned.removed_ids:
+                await self._run_ingest(self.vectorstore.delete_chunks, planned.removed_ids)
+            INGESTED_DOCUMENTS.inc(doc_type=planned.file_type.value, outcome="ingested")
+            self.document_service.register_document(
+                document_id,
+                planned.batch_file.document_key,
+                planned.batch_file.filename,
+                planned.file_type,
+                planned.batch_file.file_size,
+                planned.batch_file.content_sha256,
+                planned.chunk_count
+            )
+        except Exception as e:
+            self._fail(job, planned.batch_file.filename, e)
+            return
+        finally:
+            planned.lock.release()
+        job.files_done += 1
+
+    async def _run_parse(self, fn, *args):
+        """Run on the parse pool; it is shared with interactive uploads, so wait rather than fail"""
+        while True:
+            try:
+                return await self.executors.parse.run(fn, *args)
+            except ExecutorBusyError:
+                await asyncio.sleep(0.05)
+
+    async def _run_ingest(self, fn, *args, **kwargs):
+        """Run on the ingest pool, waiting for room instead of failing the job"""
+        while True:
+            try:
+                return await self.executors.ingest.run(fn, *args, **kwargs)
+            except ExecutorBusyError:
+                await asyncio.sleep(0.05)
+
+    def get_stats(self) -> Dict:
+        return {
+            "jobs_tracked": len(self.jobs),
+            "jobs_running": sum(1 for job in self.jobs.values() if job.status == "running")
+        }
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+def unpack_archive(
+    archive_path: str,
+    destination: Path,
+    max_member_size: int,
+    max_files: int,
+    max_total_size: int
+) -> Tuple[int, int]:
+    """Extract regular files from a zip/tar archive, refusing paths that escape destination
+
+    Paths are document keys, so one that is already taken (by another
+    member or another file of the upload) is an error rather than replaced.
+    More than max_files files or max_total_size uncompressed bytes is an
+    error too, raised before the member over the limit is written. Returns
+    the number of files and bytes extracted.
+    """
+    destination = destination.resolve()
+    name = Path(archive_path).name
+    files = 0
+    total_size = 0
+
+    def target_for(member_name: str, size: int) -> Optional[Path]:
+        nonlocal files, total_size
+        target = (destination / member_name).resolve()
+        if destination not in target.parents:
+            return None
+        if target.exists():
+            raise ValueError(f"{target.relative_to(destination).as_posix()} appears more than once in the upload")
+        files += 1
+        total_size += size
+        if files > max_files:
+            raise ValueError(f"Archive {name} contains more than {max_files} files")
+        if total_size > max_total_size:
+            raise ValueError(f"Archive {name} unpacks to more than {max_total_size / 1024 / 1024}MB")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return target
+
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or member.file_size > max_member_size:
+                    continue
+                # Reads stop at file_size, so the declared size bounds what is written
+                target = target_for(member.filename, member.file_size)
+                if target is not None:
+                    with archive.open(member) as src, open(target, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+        return files, total_size
+
+    with tarfile.open(archive_path) as archive:
+        for member in archive:
+            if not member.isfile() or member.size > max_member_size:
+                continue
+            target = target_for(member.name, member.size)
+            if target is not None:
+                with archive.extractfile(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+    return files, total_size
+
+def collect_batch_files(directory: Path, supported_extensions: Iterable[str]) -> List[BatchFile]:
+    """Every supported file under a directory, keyed by its relative path"""
+    files = []
+    for path in sorted(directory.rglob("*")):
+        if path.is_file() and path.suffix.lower() in supported_extensions:
+            relative = path.relative_to(directory).as_posix()
+            files.append(BatchFile(path=str(path), filename=relative, document_key=relative))
+    return files
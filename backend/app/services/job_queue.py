@@ -0,0 +1,325 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.services.document_service import DocumentIngestionService
+from app.services.executor import ExecutorBusyError
+from app.services.metrics import observe_stage, start_trace
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    document_key TEXT,
+    content BLOB,
+    content_sha256 TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, available_at, created_at);
+"""
+
+# Columns added after the first release, for existing job databases
+MIGRATIONS = {
+    "content": "ALTER TABLE jobs ADD COLUMN content BLOB",
+    "content_sha256": "ALTER TABLE jobs ADD COLUMN content_sha256 TEXT",
+}
+
+class JobQueue:
+    """Durable background ingestion queue backed by SQLite
+
+    Uploads are recorded as jobs and processed by a small pool of worker
+    tasks inside the app. Jobs that were running when the process stopped
+    are put back in the queue on startup. Transient failures are retried
+    with exponential backoff up to max_attempts; documents that can't be
+    parsed (ValueError) fail immediately.
+
+    Small text uploads are stored in the job row itself instead of a file.
+    Uploading the same content for the same document while an earlier job
+    for it is still queued or running returns that job.
+
+    Finished jobs are deleted once they are older than retention_days
+    (0 keeps them forever), on start and every sweep_interval seconds.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        document_service: DocumentIngestionService,
+        workers: int = 2,
+        max_attempts: int = 3,
+        retry_backoff_seconds: float = 2.0,
+        poll_interval: float = 1.0,
+        retention_days: float = 7.0,
+        sweep_interval: float = 3600.0,
+        trace_jobs: bool = True
+    ):
+        self.document_service = document_service
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self.sweep_interval = sweep_interval
+        self.trace_jobs = trace_jobs
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self._conn.execute(statement)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_content ON jobs (content_sha256, status)"
+        )
+        self._lock = threading.Lock()
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+        # Recent per-job timings for the metrics endpoint
+        self._processing_seconds = deque(maxlen=1000)
+        self._queue_wait_seconds = deque(maxlen=1000)
+        self.retried = 0
+        self.swept = 0
+
+    async def start(self):
+        with self._lock:
+            recovered = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', available_at = ? WHERE status = 'running'",
+                (time.time(),)
+            ).rowcount
+        if recovered:
+            logger.info("Re-queued %d ingestion jobs interrupted by a restart", recovered)
+
+        self.sweep()
+
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.retention_days > 0:
+            self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._conn.close()
+
+    def sweep(self) -> int:
+        """Delete completed and failed jobs that finished more than retention_days ago"""
+        if self.retention_days <= 0:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?",
+                (cutoff,)
+            ).rowcount
+        if deleted:
+            self.swept += deleted
+            logger.info("Deleted %d ingestion jobs finished more than %g days ago", deleted, self.retention_days)
+        return deleted
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def enqueue(
+        self,
+        file_path: str,
+        filename: str,
+        file_size: int,
+        document_key: Optional[str] = None,
+        job_id: Optional[str] = None,
+        content: Optional[bytes] = None,
+        content_sha256: Optional[str] = None
+    ) -> Dict:
+        """Record a job for an upload that is on disk at file_path, or held in content"""
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            duplicate = None
+            if content_sha256 is not None:
+                duplicate = self._conn.execute(
+                    "SELECT id FROM jobs WHERE content_sha256 = ? AND status IN ('queued', 'running') "
+                    "AND COALESCE(document_key, filename) = ? LIMIT 1",
+                    (content_sha256, document_key or filename)
+                ).fetchone()
+            if duplicate is None:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, file_path, filename, file_size, document_key, content, "
+                    "content_sha256, created_at, available_at) VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, file_path or "", filename, file_size, document_key, content, content_sha256, now, now)
+                )
+        if duplicate is not None:
+            # Same bytes for the same document are already on their way in
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+            return self.get(duplicate["id"])
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self.get(job_id)
+
+    def record_completed(
+        self,
+        job_id: str,
+        filename: str,
+        file_size: int,
+        result: str,
+        document_key: Optional[str] = None,
+        content_sha256: Optional[str] = None
+    ) -> Dict:
+        """Record a job that needed no processing, so it can be polled like any other"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, file_path, filename, file_size, document_key, content_sha256, "
+                "result, created_at, available_at, started_at, finished_at) "
+                "VALUES (?, 'completed', '', ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, filename, file_size, document_key, content_sha256, result, now, now, now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "filename": row["filename"],
+            "size": row["file_size"],
+            "document_key": row["document_key"],
+            "content_sha256": row["content_sha256"],
+            "attempts": row["attempts"],
+            "error": row["error"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"]
+        }
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """Atomically move the oldest due job to running"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (now, row["id"])
+            )
+        return row
+
+    async def _worker(self):
+        while True:
+            row = self._claim_next()
+            if row is None:
+                # Sleep until a new job arrives or a retry becomes due
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(row)
+
+    async def _process(self, row: sqlite3.Row):
+        started = time.time()
+        self._queue_wait_seconds.append(started - row["created_at"])
+        attempts = row["attempts"] + 1
+        try:
+            with start_trace("ingest_job") as trace:
+                observe_stage("queue_wait", started - row["created_at"])
+                result = await self.document_service.ingest_document(
+                    file_path=row["file_path"],
+                    filename=row["filename"],
+                    file_size=row["file_size"],
+                    document_key=row["document_key"],
+                    content=row["content"],
+                    content_sha256=row["content_sha256"]
+                )
+        except ExecutorBusyError:
+            # Not the job's fault: put it back without using up an attempt
+            self._requeue(row["id"], attempts - 1, None, self.retry_backoff_seconds)
+            return
+        except ValueError as e:
+            self._finish(row, "failed", error=str(e))
+            return
+        except Exception as e:
+            if attempts < self.max_attempts:
+                self.retried += 1
+                self._requeue(row["id"], attempts, str(e), self.retry_backoff_seconds * 2 ** (attempts - 1))
+            else:
+                self._finish(row, "failed", error=str(e))
+            return
+
+        self._processing_seconds.append(time.time() - started)
+        if self.trace_jobs:
+            logger.info("Ingestion job trace: %s", json.dumps({"job_id": row["id"], **trace.to_dict()}))
+        self._finish(row, "completed", result=result.model_dump_json())
+
+    def _requeue(self, job_id: str, attempts: int, error: Optional[str], delay: float):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = ?, error = ?, available_at = ? WHERE id = ?",
+                (attempts, error, time.time() + delay, job_id)
+            )
+
+    def _finish(self, row: sqlite3.Row, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, content = NULL WHERE id = ?",
+                (status, result, error, time.time(), row["id"])
+            )
+        # The upload is only kept until its job reaches a final state
+        if row["file_path"] and os.path.exists(row["file_path"]):
+            os.remove(row["file_path"])
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        processing = sorted(self._processing_seconds)
+        waits = sorted(self._queue_wait_seconds)
+        return {
+            "queue_depth": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "retries": self.retried,
+            "swept": self.swept,
+            "workers": self.workers,
+            "avg_processing_seconds": round(sum(processing) / len(processing), 3) if processing else None,
+            "p95_processing_seconds": round(processing[int(0.95 * (len(processing) - 1))], 3) if processing else None,
+            "avg_queue_wait_seconds": round(sum(waits) / len(waits), 3) if waits else None
+        }
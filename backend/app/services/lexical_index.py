@@ -0,0 +1,277 @@
+import heapq
+import logging
+import math
+import os
+import re
+import struct
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+
+FILE_MAGIC = b"DMLX"
+FILE_VERSION = 1
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms, keeping identifiers whole and also indexing their parts
+
+    "getDocumentChunks" and "max_file_size" are indexed as the full
+    identifier plus each camelCase / snake_case component, so both exact
+    identifier lookups and natural-language queries match.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text):
+        lowered = token.lower()
+        terms.append(lowered)
+        parts = [part for piece in token.split("_") for part in CAMEL_BOUNDARY.split(piece) if part]
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts)
+    return terms
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+class LexicalIndex:
+    """In-process BM25 inverted index over chunk text
+
+    Postings map each term to {doc number: term frequency}; a forward map
+    of doc number -> terms makes deletes incremental. On disk the index is
+    a single file with delta + varint encoded postings, rewritten
+    atomically at most every persist_interval seconds and on shutdown. A
+    marker file exists next to it whenever it holds changes newer than the
+    file, so after a crash the index is rebuilt even if its chunk count
+    happens to match.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, persist_interval: float = 30.0):
+        self.path = Path(path)
+        self.dirty_path = self.path.with_name(self.path.name + ".dirty")
+        self.k1 = k1
+        self.b = b
+        self.persist_interval = persist_interval
+        # Set by load() when the last process exited with unsaved changes
+        self.unclean = False
+
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_terms: Dict[int, List[str]] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._doc_ids: Dict[int, str] = {}
+        self._doc_numbers: Dict[str, int] = {}
+        self._next_doc = 0
+        self._total_length = 0
+        self._dirty = False
+        self._marked = False
+        self._last_save = time.monotonic()
+
+    @property
+    def doc_count(self) -> int:
+        return len(self._doc_ids)
+
+    def mark_dirty(self):
+        """Record on disk that the saved index is about to fall behind
+
+        Called before every change, including by the vector store before it
+        writes the collection, so a crash in between is detected too.
+        """
+        with self._lock:
+            if not self._marked:
+                self.dirty_path.parent.mkdir(parents=True, exist_ok=True)
+                self.dirty_path.touch()
+                self._marked = True
+
+    def add(self, chunk_ids: List[str], texts: List[str]):
+        """Index chunks, replacing any existing entry with the same ID"""
+        self.mark_dirty()
+        with self._lock:
+            for chunk_id, text in zip(chunk_ids, texts):
+                self._remove(chunk_id)
+                doc = self._next_doc
+                self._next_doc += 1
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[doc] = tf
+                length = sum(counts.values())
+                self._doc_terms[doc] = list(counts.keys())
+                self._doc_lengths[doc] = length
+                self._doc_ids[doc] = chunk_id
+                self._doc_numbers[chunk_id] = doc
+                self._total_length += length
+            self._dirty = True
+        self.maybe_save()
+
+    def remove(self, chunk_ids: Iterable[str]):
+        self.mark_dirty()
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+            self._dirty = True
+        self.maybe_save()
+
+    def _remove(self, chunk_id: str):
+        doc = self._doc_numbers.pop(chunk_id, None)
+        if doc is None:
+            return
+        for term in self._doc_terms.pop(doc):
+            postings = self._postings[term]
+            del postings[doc]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc)
+        del self._doc_ids[doc]
+
+    def clear(self):
+        self.mark_dirty()
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def _reset(self):
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_lengths.clear()
+        self._doc_ids.clear()
+        self._doc_numbers.clear()
+        self._next_doc = 0
+        self._total_length = 0
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """BM25 top-k as (chunk ID, score), best first"""
+        with self._lock:
+            n_docs = len(self._doc_ids)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc] / avg_length)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [(self._doc_ids[doc], score) for doc, score in best]
+
+    def maybe_save(self):
+        if self._dirty and time.monotonic() - self._last_save >= self.persist_interval:
+            self.save()
+
+    def save(self):
+        """Write the index to disk (doc numbers are compacted on the way out)"""
+        with self._lock:
+            renumber = {doc: i for i, doc in enumerate(sorted(self._doc_ids))}
+            out = bytearray(FILE_MAGIC)
+            out += struct.pack("<B", FILE_VERSION)
+
+            _write_varint(out, len(renumber))
+            for doc in sorted(self._doc_ids):
+                encoded = self._doc_ids[doc].encode("utf-8")
+                _write_varint(out, len(encoded))
+                out += encoded
+                _write_varint(out, self._doc_lengths[doc])
+
+            _write_varint(out, len(self._postings))
+            for term, postings in self._postings.items():
+                encoded = term.encode("utf-8")
+                _write_varint(out, len(encoded))
+                out += encoded
+                _write_varint(out, len(postings))
+                previous = 0
+                for doc in sorted(postings, key=renumber.__getitem__):
+                    number = renumber[doc]
+                    _write_varint(out, number - previous)
+                    _write_varint(out, postings[doc])
+                    previous = number
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(out)
+            os.replace(tmp_path, self.path)
+            self.dirty_path.unlink(missing_ok=True)
+            self._marked = False
+            self.unclean = False
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+    def load(self) -> bool:
+        """Load the index from disk; returns False if there is nothing usable"""
+        if self.dirty_path.exists():
+            logger.warning("Lexical index was not saved on the last shutdown; it will be rebuilt")
+            self.unclean = True
+            return False
+        if not self.path.exists():
+            return False
+        data = self.path.read_bytes()
+        if data[:4] != FILE_MAGIC or data[4] != FILE_VERSION:
+            logger.warning("Ignoring lexical index with unknown format: %s", self.path)
+            return False
+
+        with self._lock:
+            # Not clear(): replacing the contents with the saved file leaves them unchanged from it
+            self._reset()
+            pos = 5
+            n_docs, pos = _read_varint(data, pos)
+            for doc in range(n_docs):
+                length, pos = _read_varint(data, pos)
+                chunk_id = data[pos:pos + length].decode("utf-8")
+                pos += length
+                doc_length, pos = _read_varint(data, pos)
+                self._doc_ids[doc] = chunk_id
+                self._doc_numbers[chunk_id] = doc
+                self._doc_lengths[doc] = doc_length
+                self._doc_terms[doc] = []
+                self._total_length += doc_length
+
+            n_terms, pos = _read_varint(data, pos)
+            for _ in range(n_terms):
+                length, pos = _read_varint(data, pos)
+                term = data[pos:pos + length].decode("utf-8")
+                pos += length
+                count, pos = _read_varint(data, pos)
+                postings = {}
+                doc = 0
+                for _ in range(count):
+                    delta, pos = _read_varint(data, pos)
+                    tf, pos = _read_varint(data, pos)
+                    doc += delta
+                    postings[doc] = tf
+                    self._doc_terms[doc].append(term)
+                self._postings[term] = postings
+
+            self._next_doc = n_docs
+            self._dirty = False
+        return True
+
+    def get_stats(self) -> Dict:
+        return {
+            "documents": len(self._doc_ids),
+            "terms": len(self._postings),
+            "disk_bytes": self.path.stat().st_size if self.path.exists() else 0
+        }
@@ -0,0 +1,332 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Metadata fields the index can answer filters on
+KEYWORD_FIELDS = ("document_id", "filename", "doc_type")
+INDEXED_FIELDS = KEYWORD_FIELDS + ("upload_time",)
+
+FILE_VERSION = 1
+
+# Sorts after every chunk ID, for bisecting past all entries with one timestamp
+_LAST_ID = "\uffff"
+
+# Comparisons on upload_time, which Chroma can't evaluate on the stored ISO strings
+TIME_RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+def has_time_range(where: Optional[Dict]) -> bool:
+    """Whether a where filter compares upload_time with a range operator anywhere"""
+    if not where:
+        return False
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            if any(has_time_range(part) for part in condition):
+                return True
+        elif key == "upload_time" and isinstance(condition, dict):
+            if any(operator in TIME_RANGE_OPERATORS for operator in condition):
+                return True
+    return False
+
+def to_timestamp(value) -> float:
+    """Epoch seconds for an upload_time: an ISO string as stored in chunk metadata, or a number"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
+
+
+class MetadataIndex:
+    """In-process secondary index over chunk metadata
+
+    Maps document_id, filename and doc_type values to the set of chunk IDs
+    carrying them, and keeps upload times sorted for range filters, so a
+    Chroma-style where filter on these fields resolves to its matching chunk
+    IDs in time proportional to the matches instead of a scan over every
+    chunk's metadata. Filters on other fields or with other operators are
+    not resolved (resolve returns None) and fall back to Chroma.
+
+    The index is rewritten atomically at most every persist_interval
+    seconds and on shutdown, and rebuilt from the collection on startup if
+    it has drifted. A marker file exists next to it whenever it holds
+    changes newer than the file, so after a crash the index is rebuilt
+    even if its chunk count happens to match.
+    """
+
+    def __init__(self, path: str, persist_interval: float = 30.0):
+        self.path = Path(path)
+        self.dirty_path = self.path.with_name(self.path.name + ".dirty")
+        self.persist_interval = persist_interval
+        # Set by load() when the last process exited with unsaved changes
+        self.unclean = False
+
+        self._lock = threading.RLock()
+        # chunk ID -> (document_id, filename, doc_type, upload timestamp)
+        self._chunks: Dict[str, Tuple[str, str, str, float]] = {}
+        self._postings: Dict[str, Dict[str, Set[str]]] = {field: {} for field in KEYWORD_FIELDS}
+        # (upload timestamp, chunk ID), sorted lazily after changes
+        self._times: List[Tuple[float, str]] = []
+        self._times_sorted = True
+        self._dirty = False
+        self._marked = False
+        self._last_save = time.monotonic()
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self._chunks)
+
+    def mark_dirty(self):
+        """Record on disk that the saved index is about to fall behind
+
+        Called before every change, including by the vector store before it
+        writes the collection, so a crash in between is detected too.
+        """
+        with self._lock:
+            if not self._marked:
+                self.dirty_path.parent.mkdir(parents=True, exist_ok=True)
+                self.dirty_path.touch()
+                self._marked = True
+
+    def add(self, chunk_ids: List[str], metadatas: List[Dict]):
+        """Index chunks, replacing any existing entry with the same ID"""
+        self.mark_dirty()
+        with self._lock:
+            for chunk_id, metadata in zip(chunk_ids, metadatas):
+                self._remove(chunk_id)
+                entry = (
+                    metadata["document_id"],
+                    metadata["filename"],
+                    metadata["doc_type"],
+                    to_timestamp(metadata["upload_time"])
+                )
+                self._insert(chunk_id, entry)
+            self._dirty = True
+        self.maybe_save()
+
+    def remove(self, chunk_ids: Iterable[str]):
+        self.mark_dirty()
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+            self._dirty = True
+        self.maybe_save()
+
+    def _insert(self, chunk_id: str, entry: Tuple[str, str, str, float]):
+        self._chunks[chunk_id] = entry
+        for field, value in zip(KEYWORD_FIELDS, entry):
+            self._postings[field].setdefault(value, set()).add(chunk_id)
+        self._times.append((entry[3], chunk_id))
+        self._times_sorted = False
+
+    def _remove(self, chunk_id: str):
+        entry = self._chunks.pop(chunk_id, None)
+        if entry is None:
+            return
+        for field, value in zip(KEYWORD_FIELDS, entry):
+            postings = self._postings[field][value]
+            postings.discard(chunk_id)
+            if not postings:
+                del self._postings[field][value]
+        # Stale time entries are dropped lazily, when the list is next sorted
+        self._times_sorted = False
+
+    def clear(self):
+        self.mark_dirty()
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def _reset(self):
+        self._chunks.clear()
+        for postings in self._postings.values():
+            postings.clear()
+        self._times = []
+        self._times_sorted = True
+
+    def _sorted_times(self) -> List[Tuple[float, str]]:
+        if not self._times_sorted:
+            self._times = sorted({
+                (timestamp, chunk_id) for timestamp, chunk_id in self._times
+                if chunk_id in self._chunks and self._chunks[chunk_id][3] == timestamp
+            })
+            self._times_sorted = True
+        return self._times
+
+    def resolve(self, where: Optional[Dict]) -> Optional[Set[str]]:
+        """Chunk IDs matching a where filter, or None if the index can't answer it
+
+        Supports $and / $or and, on the indexed fields, $eq, $ne, $in and
+        $nin; upload_time also supports $gt, $gte, $lt and $lte.
+        """
+        if not where:
+            return None
+        with self._lock:
+            try:
+                matches = self._resolve(where)
+            except (TypeError, ValueError):
+                return None
+            # A copy, so later writes don't change the set under the caller
+            return set(matches) if matches is not None else None
+
+    def _resolve(self, where: Dict) -> Optional[Set[str]]:
+        if len(where) > 1:
+            # Several fields in one dict are an implicit $and
+            return self._resolve({"$and": [{key: value} for key, value in where.items()]})
+
+        (key, condition), = where.items()
+        if key in ("$and", "$or"):
+            parts = [self._resolve(part) for part in condition]
+            if not parts or any(part is None for part in parts):
+                return None
+            if key == "$and":
+                parts.sort(key=len)
+                return set.intersection(*parts) if len(parts) > 1 else parts[0]
+            return set.union(*parts) if len(parts) > 1 else parts[0]
+
+        if key not in INDEXED_FIELDS:
+            return None
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        matches = [self._match(key, operator, operand) for operator, operand in condition.items()]
+        if not matches or any(match is None for match in matches):
+            return None
+        return set.intersection(*matches) if len(matches) > 1 else matches[0]
+
+    def _match(self, field: str, operator: str, operand) -> Optional[Set[str]]:
+        if field == "upload_time":
+            return self._match_time(operator, operand)
+        postings = self._postings[field]
+        if operator == "$eq":
+            return postings.get(operand, set())
+        if operator == "$in":
+            return set().union(*(postings.get(value, set()) for value in operand))
+        if operator in ("$ne", "$nin"):
+            excluded = [operand] if operator == "$ne" else operand
+            return set(self._chunks).difference(*(postings.get(value, set()) for value in excluded))
+        return None
+
+    def _match_time(self, operator: str, operand) -> Optional[Set[str]]:
+        times = self._sorted_times()
+        if operator == "$in":
+            return set().union(*(self._match_time("$eq", value) for value in operand))
+        timestamp = to_timestamp(operand)
+        bounds = {
+            "$eq": (bisect.bisect_left(times, (timestamp,)), bisect.bisect_right(times, (timestamp, _LAST_ID))),
+            "$gt": (bisect.bisect_right(times, (timestamp, _LAST_ID)), len(times)),
+            "$gte": (bisect.bisect_left(times, (timestamp,)), len(times)),
+            "$lt": (0, bisect.bisect_left(times, (timestamp,))),
+            "$lte": (0, bisect.bisect_right(times, (timestamp, _LAST_ID))),
+        }
+        if operator not in bounds:
+            return None
+        start, end = bounds[operator]
+        return {chunk_id for _, chunk_id in times[start:end]}
+
+    def document_chunk_ids(self, document_id: str) -> List[str]:
+        with self._lock:
+            return list(self._postings["document_id"].get(document_id, ()))
+
+    def document_stats(self, document_id: str) -> Optional[Dict]:
+        """Chunk count, names and upload times of one document, from its own chunks only"""
+        with self._lock:
+            chunk_ids = self._postings["document_id"].get(document_id)
+            if not chunk_ids:
+                return None
+            entries = [self._chunks[chunk_id] for chunk_id in chunk_ids]
+        timestamps = [entry[3] for entry in entries]
+        return {
+            "document_id": document_id,
+            "chunks": len(entries),
+            "filenames": sorted({entry[1] for entry in entries}),
+            "doc_type": entries[0][2],
+            "first_upload_time": datetime.fromtimestamp(min(timestamps)).isoformat(),
+            "last_upload_time": datetime.fromtimestamp(max(timestamps)).isoformat()
+        }
+
+    def summary(self) -> Dict:
+        """Document and chunk counts per doc_type, without touching individual chunks"""
+        with self._lock:
+            documents_by_type: Dict[str, int] = {}
+            for document_id, chunk_ids in self._postings["document_id"].items():
+                doc_type = self._chunks[next(iter(chunk_ids))][2]
+                documents_by_type[doc_type] = documents_by_type.get(doc_type, 0) + 1
+            return {
+                "documents": len(self._postings["document_id"]),
+                "chunks": len(self._chunks),
+                "documents_by_type": documents_by_type,
+                "chunks_by_type": {
+                    doc_type: len(chunk_ids) for doc_type, chunk_ids in self._postings["doc_type"].items()
+                }
+            }
+
+    def maybe_save(self):
+        if self._dirty and time.monotonic() - self._last_save >= self.persist_interval:
+            self.save()
+
+    def save(self):
+        """Write the index to disk, with repeated strings stored once"""
+        with self._lock:
+            values: Dict[str, int] = {}
+            columns = {field: [] for field in KEYWORD_FIELDS}
+            for entry in self._chunks.values():
+                for field, value in zip(KEYWORD_FIELDS, entry):
+                    columns[field].append(values.setdefault(value, len(values)))
+            data = {
+                "version": FILE_VERSION,
+                "values": list(values),
+                "ids": list(self._chunks),
+                "upload_time": [entry[3] for entry in self._chunks.values()],
+                **columns
+            }
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self.dirty_path.unlink(missing_ok=True)
+            self._marked = False
+            self.unclean = False
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+    def load(self) -> bool:
+        """Load the index from disk; returns False if there is nothing usable"""
+        if self.dirty_path.exists():
+            logger.warning("Metadata index was not saved on the last shutdown; it will be rebuilt")
+            self.unclean = True
+            return False
+        if not self.path.exists():
+            return False
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get("version") != FILE_VERSION:
+            logger.warning("Ignoring metadata index with unknown format: %s", self.path)
+            return False
+
+        with self._lock:
+            # Not clear(): replacing the contents with the saved file leaves them unchanged from it
+            self._reset()
+            values = data["values"]
+            for i, chunk_id in enumerate(data["ids"]):
+                self._insert(chunk_id, (
+                    values[data["document_id"][i]],
+                    values[data["filename"][i]],
+                    values[data["doc_type"][i]],
+                    data["upload_time"][i]
+                ))
+            self._dirty = False
+        return True
+
+    def get_stats(self) -> Dict:
+        return {
+            "chunks": len(self._chunks),
+            "documents": len(self._postings["document_id"]),
+            "disk_bytes": self.path.stat().st_size if self.path.exists() else 0
+        }
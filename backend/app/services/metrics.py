@@ -0,0 +1,282 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans range from sub-millisecond lookups to minute-long PDF ingests
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram in the Prometheus text format"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, with one overflow slot; sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][slot] += 1
+            series[1][0] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The process's metrics, rendered for a Prometheus scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = METRICS.histogram(
+    "documind_http_request_duration_seconds",
+    "HTTP request latency, until the last byte of the response was sent",
+    ("method", "endpoint", "status")
+)
+STAGE_SECONDS = METRICS.histogram(
+    "documind_stage_duration_seconds",
+    "Time spent in one pipeline stage of a request or background job",
+    ("stage", "endpoint", "doc_type")
+)
+INGESTED_CHUNKS = METRICS.counter(
+    "documind_ingested_chunks_total",
+    "Chunks of ingested documents, by whether they had to be embedded",
+    ("doc_type", "outcome")
+)
+INGESTED_DOCUMENTS = METRICS.counter(
+    "documind_ingested_documents_total",
+    "Documents ingested, or skipped as exact copies of registered ones",
+    ("doc_type", "outcome")
+)
+LLM_TOKENS = METRICS.counter(
+    "documind_llm_tokens_total",
+    "Tokens the LLM evaluated in prompts and generated in answers",
+    ("kind",)
+)
+SERVICE_STATE = METRICS.gauge(
+    "documind_service_state",
+    "Point-in-time queue depths and in-flight work, sampled on scrape",
+    ("component", "field")
+)
+
+
+@dataclass
+class Trace:
+    """Timing spans recorded for one request or background job
+
+    With record_spans off only the endpoint label is kept, for long jobs
+    whose spans would pile up.
+    """
+    endpoint: str
+    record_spans: bool = True
+    spans: List[Dict] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    def to_dict(self) -> Dict:
+        return {
+            "endpoint": self.endpoint,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "spans": self.spans
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("documind_trace", default=None)
+
+@contextmanager
+def start_trace(endpoint: str, record_spans: bool = True) -> Iterator[Trace]:
+    """Collect the spans of everything run in this context (and tasks started from it)"""
+    trace = Trace(endpoint, record_spans)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def observe_stage(stage: str, seconds: float, doc_type: str = "", **attributes):
+    """Record one stage's duration in the stage histogram and the current trace"""
+    trace = _current_trace.get()
+    STAGE_SECONDS.observe(
+        seconds, stage=stage, endpoint=trace.endpoint if trace is not None else "background", doc_type=doc_type
+    )
+    if trace is not None and trace.record_spans:
+        entry = {"stage": stage, "ms": round(seconds * 1000, 3)}
+        if doc_type:
+            entry["doc_type"] = doc_type
+        entry.update(attributes)
+        trace.spans.append(entry)
+
+@contextmanager
+def span(stage: str, doc_type: str = "", **attributes):
+    """Time the enclosed block as one stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, doc_type, **attributes)
+
+
+class StageTimer:
+    """Adds up a stage's time over the many batches of one document
+
+    Streaming ingestion extracts, embeds and stores a document in
+    interleaved batches; each stage is observed once, with its total, when
+    the document is done.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def observe(self, doc_type: str = ""):
+        for stage, seconds in self.seconds.items():
+            observe_stage(stage, seconds, doc_type)
+
+def record_state(stats: Dict, component: str = ""):
+    """Set the service state gauge from every number in a (nested) stats dict"""
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            record_state(value, f"{component}.{key}" if component else key)
+        elif isinstance(value, (int, float)):
+            SERVICE_STATE.set(float(value), component=component or "app", field=key)
@@ -1,22 +1,141 @@
+import asyncio
+import time
 import httpx
-from typing import List, Dict, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Optional
 import json
+from app.services.executor import ExecutorBusyError
+from app.services.metrics import LLM_TOKENS, observe_stage
+
+class OllamaBusyError(ExecutorBusyError):
+    """Every generation slot stayed taken for too long, or too many requests are waiting"""
 
 class OllamaService:
-    """Handles interaction with Ollama for LLM responses"""
+    """Handles interaction with Ollama for LLM responses
+    
+    One pooled HTTP client is shared by all requests. At most max_concurrency
+    generations run at once (set it to the server's OLLAMA_NUM_PARALLEL, since
+    extra requests would only queue inside Ollama); up to max_queue more wait
+    for a slot for at most queue_timeout seconds before OllamaBusyError.
+    Every request passes keep_alive so the model stays loaded between
+    questions. Health is cached and, once start() ran, refreshed in the
+    background every health_interval seconds.
+    """
     
-    def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3.2:3b"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        model: str = "llama3.2:3b",
+        max_concurrency: int = 1,
+        max_queue: int = 32,
+        queue_timeout: float = 30.0,
+        request_timeout: float = 120.0,
+        keep_alive: str = "30m",
+        health_interval: float = 15.0
+    ):
         self.base_url = base_url
         self.model = model
-        self.client = httpx.AsyncClient(timeout=120.0)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.keep_alive = keep_alive
+        self.health_interval = health_interval
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(request_timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=max_concurrency + 4,
+                max_keepalive_connections=max_concurrency + 2,
+                keepalive_expiry=60.0
+            )
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._health_task: Optional[asyncio.Task] = None
+        self.healthy: Optional[bool] = None
+        self.health_checked_at: Optional[float] = None
+        
+        # Metrics
+        self.in_flight = 0
+        self.waiting = 0
+        self.generations = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.total_queue_wait = 0.0
+        self.health_checks = 0
     
-    async def generate_response(
+    async def start(self):
+        """Check health once and keep refreshing it in the background"""
+        await self.refresh_health()
+        self._health_task = asyncio.create_task(self._health_loop())
+    
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.refresh_health()
+    
+    @asynccontextmanager
+    async def _generation_slot(self):
+        """Wait (bounded) for one of the max_concurrency generation slots"""
+        start = time.perf_counter()
+        if not self._slots.locked():
+            # A slot is free; taking it doesn't wait, so it doesn't count as queued
+            await self._slots.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise OllamaBusyError("Too many questions are waiting for the LLM, try again later")
+            
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.queue_timeouts += 1
+                raise OllamaBusyError(f"No LLM slot became free within {self.queue_timeout:.0f}s, try again later")
+            finally:
+                self.waiting -= 1
+        queue_wait = time.perf_counter() - start
+        self.total_queue_wait += queue_wait
+        observe_stage("llm_queue_wait", queue_wait)
+        
+        self.in_flight += 1
+        self.generations += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+    
+    @staticmethod
+    def _observe_generation(result: Dict, request_seconds: float, first_token_seconds: Optional[float] = None):
+        """Record prompt evaluation and generation time, and token counts, of one answer
+
+        Ollama's own prompt_eval_duration / eval_duration (nanoseconds) are
+        used when reported; otherwise a stream is split at its first token,
+        and a non-streamed answer counts as generation throughout.
+        """
+        prompt_ns, eval_ns = result.get("prompt_eval_duration"), result.get("eval_duration")
+        if prompt_ns is not None and eval_ns is not None:
+            prompt_seconds, generation_seconds = prompt_ns / 1e9, eval_ns / 1e9
+        elif first_token_seconds is not None:
+            prompt_seconds, generation_seconds = first_token_seconds, request_seconds - first_token_seconds
+        else:
+            prompt_seconds, generation_seconds = None, request_seconds
+        if prompt_seconds is not None:
+            observe_stage("llm_prompt_eval", prompt_seconds, tokens=result.get("prompt_eval_count"))
+        observe_stage("llm_generation", generation_seconds, tokens=result.get("eval_count"))
+        LLM_TOKENS.inc(result.get("prompt_eval_count") or 0, kind="prompt")
+        LLM_TOKENS.inc(result.get("eval_count") or 0, kind="generated")
+    
+    def _mark(self, healthy: bool):
+        self.healthy = healthy
+        self.health_checked_at = time.monotonic()
+    
+    def build_messages(
         self,
         query: str,
         context_chunks: List[Dict],
         conversation_history: Optional[List[Dict]] = None
-    ) -> str:
-        """Generate response using Ollama with context"""
+    ) -> List[Dict]:
+        """Build the chat messages for a question and its retrieved context"""
         
         # Build context from retrieved chunks
         context_text = "\n\n".join([
@@ -47,38 +166,168 @@ Include citations to specific files and sections."""
             messages.extend(conversation_history)
         
         messages.append({"role": "user", "content": user_prompt})
+        return messages
+    
+    async def generate_response(
+        self,
+        query: str,
+        context_chunks: List[Dict],
+        conversation_history: Optional[List[Dict]] = None
+    ) -> Dict:
+        """Generate response using Ollama with context
+        
+        Returns {"answer": str} plus Ollama's prompt_eval_count and
+        eval_count token counts (None if the server didn't report them).
+        """
+        
+        messages = self.build_messages(query, context_chunks, conversation_history)
         
         # Call Ollama API
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/api/chat",
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
+        async with self._generation_slot():
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(
+                    f"{self.base_url}/api/chat",
+                    json={
+                        "model": self.model,
+                        "messages": messages,
+                        "stream": False,
+                        "keep_alive": self.keep_alive,
+                        "options": {
+                            "temperature": 0.7,
+                            "top_p": 0.9,
+                        }
                     }
-                }
-            )
+                )
+            except httpx.TransportError as e:
+                self._mark(False)
+                raise Exception(f"Error calling Ollama: {str(e)}")
             
+            if response.status_code != 200:
+                raise Exception(f"Error calling Ollama: Ollama API error: {response.status_code}")
+            self._mark(True)
+            result = response.json()
+            self._observe_generation(result, time.perf_counter() - start)
+            return {
+                "answer": result["message"]["content"],
+                "prompt_eval_count": result.get("prompt_eval_count"),
+                "eval_count": result.get("eval_count")
+            }
+    
+    async def stream_response(
+        self,
+        query: str,
+        context_chunks: List[Dict],
+        conversation_history: Optional[List[Dict]] = None
+    ) -> AsyncIterator[Dict]:
+        """Stream a response from Ollama's NDJSON chat stream
+        
+        Yields {"token": str} for each piece of generated text, then one final
+        {"done": True, ...} carrying Ollama's prompt/eval token counts. A
+        stream that ends without that message raises. The generation slot is
+        held until the stream ends.
+        """
+        
+        messages = self.build_messages(query, context_chunks, conversation_history)
+        
+        async with self._generation_slot():
+            start = time.perf_counter()
+            first_token_seconds = None
+            try:
+                async with self.client.stream(
+                    "POST",
+                    f"{self.base_url}/api/chat",
+                    json={
+                        "model": self.model,
+                        "messages": messages,
+                        "stream": True,
+                        "keep_alive": self.keep_alive,
+                        "options": {
+                            "temperature": 0.7,
+                            "top_p": 0.9,
+                        }
+                    }
+                ) as response:
+                    if response.status_code != 200:
+                        raise Exception(f"Ollama API error: {response.status_code}")
+                    self._mark(True)
+                    
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        message = json.loads(line)
+                        if "error" in message:
+                            raise Exception(f"Ollama API error: {message['error']}")
+                        
+                        token = message.get("message", {}).get("content", "")
+                        if token:
+                            if first_token_seconds is None:
+                                first_token_seconds = time.perf_counter() - start
+                            yield {"token": token}
+                        
+                        if message.get("done"):
+                            self._observe_generation(message, time.perf_counter() - start, first_token_seconds)
+                            yield {
+                                "done": True,
+                                "prompt_eval_count": message.get("prompt_eval_count"),
+                                "eval_count": message.get("eval_count"),
+                                "eval_duration_ns": message.get("eval_duration")
+                            }
+                            return
+                    
+                    raise Exception("Ollama API error: the stream ended before the answer was done")
+            except httpx.TransportError as e:
+                self._mark(False)
+                raise Exception(f"Error calling Ollama: {str(e)}")
+            except (httpx.HTTPError, json.JSONDecodeError) as e:
+                raise Exception(f"Error calling Ollama: {str(e)}")
+    
+    async def refresh_health(self) -> bool:
+        """Ask Ollama whether it is up and has the model, and cache the answer"""
+        self.health_checks += 1
+        try:
+            response = await self.client.get(f"{self.base_url}/api/tags", timeout=5.0)
             if response.status_code == 200:
-                result = response.json()
-                return result["message"]["content"]
+                names = [model.get("name", "") for model in response.json().get("models", [])]
+                self._mark(any(self.model in name for name in names))
             else:
-                raise Exception(f"Ollama API error: {response.status_code}")
-                
-        except Exception as e:
-            raise Exception(f"Error calling Ollama: {str(e)}")
+                self._mark(False)
+        except Exception:
+            self._mark(False)
+        return self.healthy
     
     async def check_health(self) -> bool:
-        """Check if Ollama is running and model is available"""
-        try:
-            response = await self.client.get(f"{self.base_url}/api/tags")
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                return any(self.model in model.get("name", "") for model in models)
-            return False
-        except:
-            return False
+        """Check if Ollama is running and model is available
+        
+        Answers from the cached state; only refreshes inline when the cache is
+        older than health_interval (e.g. start() was never called).
+        """
+        if self.health_checked_at is None or time.monotonic() - self.health_checked_at > self.health_interval:
+            return await self.refresh_health()
+        return self.healthy
+    
+    def get_stats(self) -> Dict:
+        return {
+            "model": self.model,
+            "healthy": self.healthy,
+            "health_age_seconds": round(time.monotonic() - self.health_checked_at, 1) if self.health_checked_at else None,
+            "health_checks": self.health_checks,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "generations": self.generations,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "avg_queue_wait_ms": round(self.total_queue_wait / self.generations * 1000, 2) if self.generations else 0.0
+        }
+    
+    async def close(self):
+        """Stop the health refresher and close the pooled HTTP client"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await self.client.aclose()
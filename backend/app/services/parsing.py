@@ -0,0 +1,92 @@
+import hashlib
+import time
+from typing import Iterator, List, Tuple
+from app.services.file_processor import FileProcessor
+from app.services.chunking import TextChunk, get_chunker
+from app.models.schemas import DocumentType
+
+# Kept free of the embedding/vector store imports so spawned parse workers
+# start quickly and don't load torch.
+
+def extract_and_chunk(
+    file_path: str,
+    file_type: DocumentType,
+    chunk_size: int,
+    chunk_overlap: int
+) -> List[TextChunk]:
+    """Extract text from a file and split it into located chunks (runs in the parse pool)
+    
+    The file is read and chunked block by block, so the full text is never
+    held in memory alongside its chunks.
+    """
+    return extract_and_chunk_timed(file_path, file_type, chunk_size, chunk_overlap)[0]
+
+def extract_and_chunk_timed(
+    file_path: str,
+    file_type: DocumentType,
+    chunk_size: int,
+    chunk_overlap: int
+) -> Tuple[List[TextChunk], float, float]:
+    """extract_and_chunk, plus the seconds spent extracting and chunking
+    
+    Extraction and chunking interleave block by block; the time spent
+    pulling the next block out of the file counts as extraction and the
+    rest as chunking.
+    """
+    if file_type == DocumentType.PDF:
+        blocks = FileProcessor.iter_pdf_pages(file_path)
+    else:
+        blocks = FileProcessor.iter_text_blocks(file_path)
+    
+    extract_seconds = 0.0
+    
+    def timed_blocks() -> Iterator[str]:
+        nonlocal extract_seconds
+        iterator = iter(blocks)
+        while True:
+            start = time.perf_counter()
+            try:
+                block = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                extract_seconds += time.perf_counter() - start
+            yield block
+    
+    start = time.perf_counter()
+    chunker = get_chunker(chunk_size, chunk_overlap)
+    chunks = list(chunker.chunk_stream(timed_blocks(), file_type))
+    total_seconds = time.perf_counter() - start
+    
+    if not chunks:
+        raise ValueError("No text content could be extracted from the file")
+    
+    return chunks, extract_seconds, total_seconds - extract_seconds
+
+def read_pdf_pages_timed(file_path: str, start: int, end: int) -> Tuple[List[str], float]:
+    """FileProcessor.read_pdf_pages, plus the seconds it took in the worker"""
+    started = time.perf_counter()
+    pages = FileProcessor.read_pdf_pages(file_path, start, end)
+    return pages, time.perf_counter() - started
+
+def chunk_text(
+    text: str,
+    file_type: DocumentType,
+    chunk_size: int,
+    chunk_overlap: int
+) -> List[TextChunk]:
+    """Split an in-memory text document into located chunks"""
+    chunks = list(get_chunker(chunk_size, chunk_overlap).chunk_stream([text], file_type))
+    
+    if not chunks:
+        raise ValueError("No text content could be extracted from the file")
+    
+    return chunks
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's bytes, read a block at a time"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,59 @@
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+class ProfilerBusyError(RuntimeError):
+    """A profile is already being taken"""
+
+class SamplingProfiler:
+    """Samples the stacks of every thread in this process at a fixed interval
+
+    Pure Python via sys._current_frames(), so it needs no extra dependency
+    and costs nothing when not running. The output is in the collapsed
+    format flamegraph.pl and speedscope read: one line per distinct stack,
+    root first, with its sample count. Work done in the parse process pool
+    happens in other processes and is not sampled.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    def _stack(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def profile(self, seconds: float) -> Dict:
+        """Sample for seconds and return the collapsed stacks; blocks the calling thread"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            own_thread = threading.get_ident()
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks: Counter = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    thread_name = thread_names.get(thread_id, str(thread_id))
+                    stacks[f"{thread_name};{self._stack(frame)}"] += 1
+                samples += 1
+                time.sleep(self.interval)
+        finally:
+            self._lock.release()
+
+        return {
+            "seconds": seconds,
+            "samples": samples,
+            "interval_ms": self.interval * 1000,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        }
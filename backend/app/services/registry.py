@@ -0,0 +1,247 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from fastapi import Request
+from app.config import Settings
+from app.services.embedding import EmbeddingService
+from app.services.embedding_cache import EmbeddingCache
+from app.services.vectorstore import VectorStoreService
+from app.services.lexical_index import LexicalIndex
+from app.services.metadata_index import MetadataIndex
+from app.services.ollama_service import OllamaService
+from app.services.document_service import DocumentIngestionService
+from app.services.search_service import SearchService
+from app.services.executor import ExecutorPools
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.reranker import CrossEncoderReranker
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.job_queue import JobQueue
+from app.services.document_registry import DocumentRegistry
+
+logger = logging.getLogger(__name__)
+
+class ServiceRegistry:
+    """Owns the process-wide service singletons shared by every request"""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.embedding_service: Optional[EmbeddingService] = None
+        self.vectorstore: Optional[VectorStoreService] = None
+        self.ollama_service: Optional[OllamaService] = None
+        self.document_service: Optional[DocumentIngestionService] = None
+        self.search_service: Optional[SearchService] = None
+        self.executors: Optional[ExecutorPools] = None
+        self.embedding_batcher: Optional[EmbeddingBatcher] = None
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        self.reranker: Optional[CrossEncoderReranker] = None
+        self.ingestion_pipeline: Optional[IngestionPipeline] = None
+        self.job_queue: Optional[JobQueue] = None
+        self.document_registry: Optional[DocumentRegistry] = None
+        self.startup_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        # Seconds spent in each startup stage, in order
+        self.startup_timings: Dict[str, float] = {}
+
+    @contextmanager
+    def _timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[stage] = round(time.perf_counter() - start, 4)
+
+    def _vector_index_options(self) -> Dict:
+        options = {"persist_interval": self.settings.vector_index_persist_interval}
+        if self.settings.vector_index_backend == "numpy":
+            options.update(
+                storage=self.settings.vector_storage,
+                rescore_factor=self.settings.vector_rescore_factor
+            )
+        elif self.settings.vector_index_backend == "ivfpq":
+            options.update(
+                nlist=self.settings.ivf_nlist,
+                nprobe=self.settings.ivf_nprobe,
+                pq_subquantizers=self.settings.pq_subquantizers,
+                train_size=self.settings.ivf_train_size,
+                rescore_factor=self.settings.vector_rescore_factor
+            )
+        return options
+
+    async def startup(self):
+        """Build all services once and warm them up"""
+        start = time.perf_counter()
+
+        with self._timed("executors"):
+            self.executors = ExecutorPools(self.settings)
+        with self._timed("embedding_model"):
+            embedding_cache = None
+            if self.settings.embedding_cache_enabled:
+                embedding_cache = EmbeddingCache(
+                    self.settings.embedding_model,
+                    self.settings.embedding_cache_directory,
+                    max_memory_bytes=self.settings.embedding_cache_memory_mb * 1024 * 1024
+                )
+            self.embedding_service = EmbeddingService(self.settings.embedding_model, cache=embedding_cache)
+        if self.settings.rerank_enabled:
+            with self._timed("rerank_model"):
+                self.reranker = CrossEncoderReranker(
+                    self.settings.rerank_model,
+                    batch_size=self.settings.rerank_batch_size,
+                    cache_size=self.settings.rerank_cache_size
+                )
+        with self._timed("lexical_index_load"):
+            lexical_index = None
+            if self.settings.lexical_index_enabled:
+                lexical_index = LexicalIndex(
+                    self.settings.lexical_index_path,
+                    persist_interval=self.settings.lexical_index_persist_interval
+                )
+                lexical_index.load()
+        with self._timed("metadata_index_load"):
+            metadata_index = None
+            if self.settings.metadata_index_enabled:
+                metadata_index = MetadataIndex(
+                    self.settings.metadata_index_path,
+                    persist_interval=self.settings.metadata_index_persist_interval
+                )
+                metadata_index.load()
+        with self._timed("vectorstore_open"):
+            self.vectorstore = VectorStoreService(
+                self.settings.chroma_persist_directory,
+                lexical_index=lexical_index,
+                index_backend=self.settings.vector_index_backend,
+                index_directory=self.settings.vector_index_directory,
+                metadata_index=metadata_index,
+                prefilter_max_candidates=self.settings.metadata_prefilter_max_candidates,
+                **self._vector_index_options()
+            )
+            self.vectorstore.sync_vector_index()
+        with self._timed("lexical_index_sync"):
+            self.vectorstore.sync_lexical_index()
+        with self._timed("metadata_index_sync"):
+            self.vectorstore.sync_metadata_index()
+        with self._timed("document_registry"):
+            self.document_registry = DocumentRegistry(self.settings.document_registry_path)
+            if self.document_registry.count() == 0 and self.vectorstore.collection.count() > 0:
+                # One-off scan for documents ingested before the registry existed
+                backfilled = self.document_registry.backfill(
+                    self.vectorstore.summarize_documents(),
+                    self.settings.chunk_size,
+                    self.settings.chunk_overlap,
+                    self.settings.embedding_model
+                )
+                logger.info("Registered %d existing documents", backfilled)
+        with self._timed("services"):
+            self.ollama_service = OllamaService(
+                base_url=self.settings.ollama_base_url,
+                model=self.settings.ollama_model,
+                max_concurrency=self.settings.ollama_max_concurrency,
+                max_queue=self.settings.ollama_max_queue,
+                queue_timeout=self.settings.ollama_queue_timeout,
+                request_timeout=self.settings.ollama_request_timeout,
+                keep_alive=self.settings.ollama_keep_alive,
+                health_interval=self.settings.ollama_health_interval
+            )
+            await self.ollama_service.start()
+            self.document_service = DocumentIngestionService(
+                embedding_service=self.embedding_service,
+                vectorstore=self.vectorstore,
+                executors=self.executors,
+                registry=self.document_registry
+            )
+            self.ingestion_pipeline = IngestionPipeline(self.document_service, self.settings)
+            self.job_queue = JobQueue(
+                self.settings.job_queue_path,
+                self.document_service,
+                workers=self.settings.job_workers,
+                max_attempts=self.settings.job_max_attempts,
+                retry_backoff_seconds=self.settings.job_retry_backoff_seconds,
+                retention_days=self.settings.job_retention_days,
+                trace_jobs=self.settings.trace_requests
+            )
+            if self.settings.embedding_batching_enabled:
+                self.embedding_batcher = EmbeddingBatcher(
+                    self.embedding_service,
+                    self.executors.search,
+                    window_ms=self.settings.embedding_batch_window_ms,
+                    max_batch_size=self.settings.embedding_max_batch_size,
+                    max_queue=self.settings.search_queue_size
+                )
+                await self.embedding_batcher.start()
+            if self.settings.answer_cache_enabled:
+                self.answer_cache = SemanticAnswerCache(
+                    similarity_threshold=self.settings.answer_cache_similarity,
+                    ttl_seconds=self.settings.answer_cache_ttl_seconds,
+                    max_entries=self.settings.answer_cache_max_entries
+                )
+            self.search_service = SearchService(
+                self.vectorstore,
+                self.embedding_service,
+                self.ollama_service,
+                self.executors,
+                self.embedding_batcher,
+                self.answer_cache,
+                self.reranker
+            )
+
+        if self.settings.warmup_on_startup:
+            self.warmup()
+
+        # Start consuming jobs only once everything is warm
+        with self._timed("job_queue"):
+            await self.job_queue.start()
+        
+        self.startup_seconds = time.perf_counter() - start
+        logger.info("Services ready in %.2fs", self.startup_seconds)
+
+    def warmup(self):
+        """Run one tiny encode and query so the first request doesn't pay lazy init costs"""
+        start = time.perf_counter()
+        with self._timed("warmup_embedding"):
+            self.embedding_service.generate_embedding("warmup")
+            if self.reranker is not None:
+                self.reranker.model.predict([("warmup", "warmup")], show_progress_bar=False)
+        if self.settings.preload_vector_index:
+            with self._timed("vector_index_load"):
+                self.vectorstore.load_index()
+        self.warmup_seconds = time.perf_counter() - start
+
+    async def shutdown(self):
+        """Release resources held by the services"""
+        if self.job_queue is not None:
+            await self.job_queue.stop()
+        if self.ingestion_pipeline is not None:
+            await self.ingestion_pipeline.stop()
+        if self.embedding_batcher is not None:
+            await self.embedding_batcher.stop()
+        if self.ollama_service is not None:
+            await self.ollama_service.close()
+        if self.executors is not None:
+            self.executors.shutdown()
+        if self.vectorstore is not None:
+            self.vectorstore.save()
+        if self.document_registry is not None:
+            self.document_registry.close()
+
+    def get_stats(self) -> Dict:
+        """Startup timings and runtime stats for the health endpoint"""
+        return {
+            "startup_seconds": self.startup_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "startup_timings": self.startup_timings,
+            "executors": self.executors.get_stats() if self.executors else None,
+            "embedding_batcher": self.embedding_batcher.get_stats() if self.embedding_batcher else None,
+            "answer_cache": self.answer_cache.get_stats() if self.answer_cache else None,
+            "reranker": self.reranker.get_stats() if self.reranker else None,
+            "ollama": self.ollama_service.get_stats() if self.ollama_service else None,
+            "ingestion_pipeline": self.ingestion_pipeline.get_stats() if self.ingestion_pipeline else None,
+            "job_queue": self.job_queue.get_stats() if self.job_queue else None,
+            "document_registry": self.document_registry.get_stats() if self.document_registry else None
+        }
+
+
+def get_registry(request: Request) -> ServiceRegistry:
+    """FastAPI dependency resolving the registry created in the app lifespan"""
+    return request.app.state.registry
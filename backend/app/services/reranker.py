@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a small cross-encoder on CPU
+
+    Scores are cached per (query, chunk text) hash in an LRU of cache_size
+    entries, so repeated and paginated queries only score new candidates.
+    Uncached pairs are scored batch_size at a time; when a deadline is given
+    and passes between batches, scoring stops and score() returns None so
+    the caller can keep its original order.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        batch_size: int = 16,
+        cache_size: int = 8192
+    ):
+        logger.info("Loading reranker model: %s", model_name)
+        self.model_name = model_name
+        # Imported here, like the embedding model, so runs without reranking don't load torch
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=512, device="cpu")
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+
+        # Scoring runs on search pool threads; guards the cache and the counters
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[bytes, float]" = OrderedDict()
+
+        self.requests = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+
+    @staticmethod
+    def _key(query: str, text: str) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(query.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def score(self, query: str, texts: List[str], deadline: Optional[float] = None) -> Optional[List[float]]:
+        """Relevance score of each text for query, or None if deadline (perf_counter) passed"""
+        start = time.perf_counter()
+        keys = [self._key(query, text) for text in texts]
+        scores: List[Optional[float]] = []
+        with self._lock:
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+            missing = [i for i, score in enumerate(scores) if score is None]
+            self.requests += 1
+            self.cache_hits += len(texts) - len(missing)
+
+        for batch_start in range(0, len(missing), self.batch_size):
+            if deadline is not None and time.perf_counter() > deadline:
+                with self._lock:
+                    self.timeouts += 1
+                    self.total_seconds += time.perf_counter() - start
+                return None
+            batch = missing[batch_start:batch_start + self.batch_size]
+            computed = self.model.predict(
+                [(query, texts[i]) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            with self._lock:
+                self.pairs_scored += len(batch)
+                for i, score in zip(batch, computed):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            self.total_seconds += time.perf_counter() - start
+        return scores
+
+    def get_stats(self) -> Dict:
+        return {
+            "model": self.model_name,
+            "requests": self.requests,
+            "pairs_scored": self.pairs_scored,
+            "cache_hits": self.cache_hits,
+            "cache_entries": len(self._cache),
+            "timeouts": self.timeouts,
+            "avg_ms": round(self.total_seconds / self.requests * 1000, 2) if self.requests else 0.0
+        }
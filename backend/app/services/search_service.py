@@ -1,7 +1,22 @@
-from typing import List, Dict, Optional
+import asyncio
+import json
+import logging
+import time
+import numpy as np
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from app.services.vectorstore import VectorStoreService
 from app.services.embedding import EmbeddingService
 from app.services.ollama_service import OllamaService
+from app.services.executor import ExecutorPools
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.reranker import CrossEncoderReranker
+from app.services.context_builder import ContextBuilder, PackedContext, estimate_tokens
+from app.services.chunking import LOCATION_FIELDS
+from app.services.metrics import span
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
 
 class SearchService:
     """Handles semantic search and query processing"""
@@ -10,56 +25,356 @@ class SearchService:
         self,
         vectorstore: VectorStoreService,
         embedding_service: EmbeddingService,
-        ollama_service: OllamaService
+        ollama_service: OllamaService,
+        executors: Optional[ExecutorPools] = None,
+        embedding_batcher: Optional[EmbeddingBatcher] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        reranker: Optional[CrossEncoderReranker] = None
     ):
         self.vectorstore = vectorstore
         self.embedding_service = embedding_service
         self.ollama_service = ollama_service
+        self.executors = executors or ExecutorPools(get_settings())
+        self.embedding_batcher = embedding_batcher
+        self.answer_cache = answer_cache
+        self.reranker = reranker
+        
+        settings = get_settings()
+        self.hybrid_candidates = settings.hybrid_candidates
+        self.rrf_k = settings.hybrid_rrf_k
+        self.rerank_candidates = settings.rerank_candidates
+        self.rerank_budget = settings.rerank_budget_ms / 1000
+        self.context_builder = ContextBuilder(
+            max_tokens=settings.context_max_tokens,
+            dedupe_similarity=settings.context_dedupe_similarity,
+            chunk_overlap=settings.chunk_overlap
+        )
+        if answer_cache is not None:
+            # Drop cached answers as soon as one of their sources changes
+            vectorstore.add_change_listener(answer_cache.invalidate_chunks)
+    
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query, batching it with concurrent queries when enabled"""
+        with span("query_embed"):
+            if self.embedding_batcher is not None:
+                return await self.embedding_batcher.embed(query)
+            return await self.executors.search.run(
+                self.embedding_service.generate_embedding, query
+            )
     
     async def search(
         self,
         query: str,
         top_k: int = 5,
-        filters: Optional[Dict] = None
+        filters: Optional[Dict] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        mode: str = "dense",
+        rerank: Optional[bool] = None
+    ) -> List[Dict]:
+        """Perform semantic (dense), keyword (sparse) or hybrid search
+        
+        With reranking (on by default when a reranker is configured) the
+        retrieval over-fetches rerank_candidates hits and the cross-encoder
+        picks the best top_k.
+        """
+        if rerank and self.reranker is None:
+            raise ValueError("Reranking is disabled (RERANK_ENABLED=false)")
+        if rerank is None:
+            rerank = self.reranker is not None
+        
+        if not rerank:
+            return await self._retrieve(query, top_k, filters, query_embedding, mode)
+        candidates = await self._retrieve(query, max(top_k, self.rerank_candidates), filters, query_embedding, mode)
+        return await self._rerank(query, candidates, top_k)
+    
+    async def _retrieve(
+        self,
+        query: str,
+        top_k: int,
+        filters: Optional[Dict],
+        query_embedding: Optional[np.ndarray],
+        mode: str
     ) -> List[Dict]:
-        """Perform semantic search"""
+        if mode == "sparse":
+            return await self._sparse_search(query, top_k, filters)
+        
+        # Generate query embedding unless the caller already has it
+        if query_embedding is None:
+            query_embedding = await self.embed_query(query)
         
-        # Generate query embedding
-        query_embedding = self.embedding_service.generate_embedding(query)
+        if mode == "hybrid":
+            # Over-fetch from both retrievers and fuse the rankings
+            candidates = max(top_k, self.hybrid_candidates)
+            dense_results = await self._dense_search(query_embedding, candidates, filters)
+            sparse_results = await self._sparse_search(query, candidates, filters)
+            return await self._fuse(dense_results, sparse_results, top_k, query_embedding)
         
+        return await self._dense_search(query_embedding, top_k, filters)
+    
+    async def _rerank(self, query: str, candidates: List[Dict], top_k: int) -> List[Dict]:
+        """Order candidates by cross-encoder score, keeping retrieval order if over budget"""
+        if len(candidates) <= 1:
+            return candidates[:top_k]
+        
+        # The deadline stops scoring between batches; wait_for bounds the last batch
+        deadline = time.perf_counter() + self.rerank_budget
+        with span("rerank", candidates=len(candidates)):
+            try:
+                scores = await asyncio.wait_for(
+                    self.executors.search.run(self.reranker.score, query, [c["text"] for c in candidates], deadline),
+                    self.rerank_budget
+                )
+            except asyncio.TimeoutError:
+                scores = None
+        if scores is None:
+            return candidates[:top_k]
+        
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [{**candidates[i], "rerank_score": scores[i]} for i in order]
+    
+    async def search_batch(self, queries: List[Dict], timeout: Optional[float] = None) -> List[List[Dict]]:
+        """Dense search for many queries at once, within one time budget
+        
+        queries are dicts with "query", "top_k" and optional "filters". All
+        queries are embedded in one encode call, and queries sharing the same
+        filters go to the vector store as one multi-vector query fetching
+        the group's largest top_k; hits are then split back per query.
+        Raises asyncio.TimeoutError when the batch takes longer than timeout
+        seconds.
+        """
+        return await asyncio.wait_for(self._search_batch(queries), timeout)
+    
+    async def _search_batch(self, queries: List[Dict]) -> List[List[Dict]]:
+        with span("query_embed", queries=len(queries)):
+            embeddings = await self.executors.search.run(
+                self.embedding_service.generate_embeddings, [q["query"] for q in queries], False
+            )
+        
+        groups: Dict[str, List[int]] = {}
+        for position, q in enumerate(queries):
+            key = json.dumps(q.get("filters") or {}, sort_keys=True)
+            groups.setdefault(key, []).append(position)
+        
+        results: List[List[Dict]] = [[] for _ in queries]
+        for positions in groups.values():
+            with span("vector_query", queries=len(positions)):
+                response = await self.executors.search.run(
+                    self.vectorstore.query,
+                    embeddings[positions],
+                    max(queries[position]["top_k"] for position in positions),
+                    queries[positions[0]].get("filters") or None
+                )
+            for row, position in enumerate(positions):
+                results[position] = self._format_hits(response, row)[:queries[position]["top_k"]]
+        return results
+    
+    @staticmethod
+    def _format_result(
+        chunk_id: str,
+        text: str,
+        metadata: Dict,
+        distance: Optional[float],
+        score: float
+    ) -> Dict:
+        return {
+            "text": text,
+            "metadata": metadata,
+            "distance": distance,
+            "score": score,
+            "chunk_id": chunk_id,
+            "filename": metadata.get("filename", "Unknown"),
+            "chunk_index": metadata.get("chunk_index", 0),
+            "doc_type": metadata.get("doc_type", "unknown"),
+            "location": {field: metadata[field] for field in LOCATION_FIELDS if field in metadata}
+        }
+    
+    @staticmethod
+    def text_preview(result: Dict) -> str:
+        """Stored preview of a hit's text (older chunks fall back to slicing)"""
+        preview = result["metadata"].get("text_preview") or result["text"][:200]
+        return preview + "..."
+    
+    @staticmethod
+    def relevance_score(result: Dict) -> float:
+        """Similarity in [0, 1]: cosine for vector hits, normalized BM25 otherwise"""
+        if result["distance"] is not None:
+            return 1 - result["distance"]  # Convert distance to similarity
+        return result["score"]
+    
+    async def _dense_search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        filters: Optional[Dict]
+    ) -> List[Dict]:
         # Search in vector store
-        results = self.vectorstore.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            where=filters
-        )
+        with span("vector_query"):
+            results = await self.executors.search.run(
+                self.vectorstore.query,
+                query_embedding[None, :],
+                top_k,
+                filters
+            )
         
-        # Format results
+        return self._format_hits(results, 0)
+    
+    def _format_hits(self, results: Dict, row: int) -> List[Dict]:
+        """Format the hits of one query out of a (multi-query) vector store result"""
         formatted_results = []
-        if results["documents"] and len(results["documents"]) > 0:
-            for i in range(len(results["documents"][0])):
-                formatted_results.append({
-                    "text": results["documents"][0][i],
-                    "metadata": results["metadatas"][0][i],
-                    "distance": results["distances"][0][i],
-                    "chunk_id": results["ids"][0][i],
-                    "filename": results["metadatas"][0][i].get("filename", "Unknown"),
-                    "chunk_index": results["metadatas"][0][i].get("chunk_index", 0),
-                    "doc_type": results["metadatas"][0][i].get("doc_type", "unknown")
-                })
+        if results["documents"] and len(results["documents"]) > row:
+            for i in range(len(results["documents"][row])):
+                distance = results["distances"][row][i]
+                formatted_results.append(self._format_result(
+                    results["ids"][row][i],
+                    results["documents"][row][i],
+                    results["metadatas"][row][i],
+                    distance,
+                    1 - distance
+                ))
         
         return formatted_results
     
+    async def _sparse_search(
+        self,
+        query: str,
+        top_k: int,
+        filters: Optional[Dict]
+    ) -> List[Dict]:
+        lexical_index = self.vectorstore.lexical_index
+        if lexical_index is None:
+            raise ValueError("Keyword search is disabled (LEXICAL_INDEX_ENABLED=false)")
+        
+        # Filters are applied when fetching the chunks, so over-fetch to
+        # leave enough hits after filtering
+        with span("lexical_query"):
+            hits = await self.executors.search.run(
+                lexical_index.search, query, top_k * 4 if filters else top_k
+            )
+        if not hits:
+            return []
+        
+        fetched = await self.executors.search.run(
+            self.vectorstore.get_chunks_by_ids, [chunk_id for chunk_id, _ in hits], filters
+        )
+        chunks = {
+            chunk_id: (text, metadata)
+            for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+        }
+        
+        top_score = hits[0][1]
+        formatted_results = []
+        for chunk_id, score in hits:
+            if chunk_id not in chunks:
+                continue
+            text, metadata = chunks[chunk_id]
+            formatted_results.append(self._format_result(chunk_id, text, metadata, None, score / top_score))
+        
+        return formatted_results[:top_k]
+    
+    async def _fuse(
+        self,
+        dense_results: List[Dict],
+        sparse_results: List[Dict],
+        top_k: int,
+        query_embedding: np.ndarray
+    ) -> List[Dict]:
+        """Reciprocal rank fusion of the dense and sparse rankings"""
+        fused: Dict[str, float] = {}
+        by_id: Dict[str, Dict] = {}
+        for ranking in (dense_results, sparse_results):
+            for rank, result in enumerate(ranking):
+                fused[result["chunk_id"]] = fused.get(result["chunk_id"], 0.0) + 1 / (self.rrf_k + rank + 1)
+                # Keep the dense copy when both have it, it carries a distance
+                by_id.setdefault(result["chunk_id"], result)
+        
+        best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        results = [{**by_id[chunk_id], "score": fused[chunk_id]} for chunk_id in best]
+        
+        # Keyword-only hits have no vector distance yet; compute it so
+        # relevance scores stay comparable across the fused list
+        missing = [r["chunk_id"] for r in results if r["distance"] is None]
+        if missing:
+            vectors = await self.executors.search.run(self.vectorstore.get_embeddings, missing)
+            # A copy: the caller still uses the embedding (e.g. as the answer cache key)
+            query = np.array(query_embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+            distances = {}
+            for chunk_id, vector in vectors.items():
+                distances[chunk_id] = 1 - float(np.dot(query, vector) / (np.linalg.norm(vector) or 1.0))
+            for result in results:
+                if result["distance"] is None:
+                    result["distance"] = distances.get(result["chunk_id"])
+        
+        return results
+    
+    def _lookup_answer(
+        self,
+        query_embedding: np.ndarray,
+        search_results: List[Dict],
+        conversation_history: Optional[List[Dict]]
+    ) -> Optional[Dict]:
+        # Answers to follow-up questions depend on the conversation, so only
+        # standalone questions are cached
+        if self.answer_cache is None or conversation_history:
+            return None
+        return self.answer_cache.lookup(query_embedding, [r["chunk_id"] for r in search_results])
+    
+    def _store_answer(
+        self,
+        query_embedding: np.ndarray,
+        search_results: List[Dict],
+        conversation_history: Optional[List[Dict]],
+        result: Dict
+    ):
+        if self.answer_cache is None or conversation_history:
+            return
+        self.answer_cache.store(query_embedding, [r["chunk_id"] for r in search_results], result)
+    
+    @staticmethod
+    def format_sources(search_results: List[Dict]) -> List[Dict]:
+        """Citation entries for the chunks an answer was based on"""
+        return [
+            {
+                "filename": result["filename"],
+                "chunk_index": result["chunk_index"],
+                "text_preview": SearchService.text_preview(result),
+                "relevance_score": SearchService.relevance_score(result),
+                **result["location"]
+            }
+            for result in search_results
+        ]
+    
+    async def build_context(self, search_results: List[Dict]) -> PackedContext:
+        """Deduplicated, merged and token-budgeted LLM context for the results"""
+        with span("context_build"):
+            embeddings = {}
+            if self.context_builder.dedupe_similarity < 1:
+                embeddings = await self.executors.search.run(
+                    self.vectorstore.get_embeddings, [r["chunk_id"] for r in search_results]
+                )
+            return self.context_builder.build(search_results, embeddings)
+    
+    def estimate_prompt_tokens(
+        self,
+        query: str,
+        context: PackedContext,
+        conversation_history: Optional[List[Dict]]
+    ) -> int:
+        messages = self.ollama_service.build_messages(query, context.chunks, conversation_history)
+        return sum(estimate_tokens(message["content"]) for message in messages)
+    
     async def ask_question(
         self,
         query: str,
         top_k: int = 5,
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        rerank: Optional[bool] = None
     ) -> Dict:
         """Ask a question and get LLM-powered answer with citations"""
         
         # Search for relevant chunks
-        search_results = await self.search(query, top_k)
+        query_embedding = await self.embed_query(query)
+        search_results = await self.search(query, top_k, query_embedding=query_embedding, rerank=rerank)
         
         if not search_results:
             return {
@@ -68,27 +383,115 @@ class SearchService:
                 "query": query
             }
         
+        # Only the chunks that made it into the prompt are cited
+        context = await self.build_context(search_results)
+        sources = self.format_sources(context.sources)
+        
+        cached = self._lookup_answer(query_embedding, search_results, conversation_history)
+        if cached is not None:
+            return {
+                "answer": cached["answer"],
+                "sources": sources,
+                "query": query,
+                "num_sources": len(sources),
+                "cached": True
+            }
+        
         # Generate answer using Ollama
-        answer = await self.ollama_service.generate_response(
+        estimated_prompt_tokens = self.estimate_prompt_tokens(query, context, conversation_history)
+        generation = await self.ollama_service.generate_response(
             query=query,
-            context_chunks=search_results,
+            context_chunks=context.chunks,
             conversation_history=conversation_history
         )
         
-        # Format sources
-        sources = [
-            {
-                "filename": result["filename"],
-                "chunk_index": result["chunk_index"],
-                "text_preview": result["text"][:200] + "...",
-                "relevance_score": 1 - result["distance"]  # Convert distance to similarity
-            }
-            for result in search_results
-        ]
-        
-        return {
-            "answer": answer,
+        result = {
+            "answer": generation["answer"],
             "sources": sources,
             "query": query,
-            "num_sources": len(sources)
+            "num_sources": len(sources),
+            "prompt_tokens": generation["prompt_eval_count"] or estimated_prompt_tokens,
+            "estimated_prompt_tokens": estimated_prompt_tokens,
+            "context": context.stats
+        }
+        self._store_answer(query_embedding, search_results, conversation_history, result)
+        return result
+    
+    async def ask_question_stream(
+        self,
+        query: str,
+        top_k: int = 5,
+        conversation_history: Optional[List[Dict]] = None,
+        rerank: Optional[bool] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Ask a question and stream the answer as (event, data) pairs
+        
+        Emits one "sources" event, a "token" event per generated piece of
+        text and a final "done" event with time-to-first-token, tokens/sec
+        and prompt token counts for the request.
+        """
+        
+        start = time.perf_counter()
+        query_embedding = await self.embed_query(query)
+        search_results = await self.search(query, top_k, query_embedding=query_embedding, rerank=rerank)
+        context = await self.build_context(search_results)
+        sources = self.format_sources(context.sources)
+        yield "sources", {"query": query, "sources": sources, "num_sources": len(sources)}
+        
+        if not search_results:
+            yield "token", {"token": "I couldn't find any relevant information in the documentation to answer your question."}
+            yield "done", {"total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            return
+        
+        cached = self._lookup_answer(query_embedding, search_results, conversation_history)
+        if cached is not None:
+            yield "token", {"token": cached["answer"]}
+            yield "done", {"cached": True, "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            return
+        
+        estimated_prompt_tokens = self.estimate_prompt_tokens(query, context, conversation_history)
+        generation_start = time.perf_counter()
+        first_token_at = None
+        token_events = 0
+        answer_parts = []
+        final = {}
+        async for chunk in self.ollama_service.stream_response(
+            query=query,
+            context_chunks=context.chunks,
+            conversation_history=conversation_history
+        ):
+            if chunk.get("done"):
+                final = chunk
+                break
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            token_events += 1
+            answer_parts.append(chunk["token"])
+            yield "token", {"token": chunk["token"]}
+        
+        end = time.perf_counter()
+        # Prefer Ollama's own token count; fall back to the number of streamed pieces
+        tokens = final.get("eval_count") or token_events
+        decode_seconds = end - first_token_at if first_token_at is not None else 0.0
+        stats = {
+            "time_to_first_token_ms": round((first_token_at - generation_start) * 1000, 1) if first_token_at else None,
+            "tokens": tokens,
+            "tokens_per_second": round(tokens / decode_seconds, 2) if decode_seconds > 0 else None,
+            "prompt_tokens": final.get("prompt_eval_count") or estimated_prompt_tokens,
+            "estimated_prompt_tokens": estimated_prompt_tokens,
+            "context": context.stats,
+            "total_ms": round((end - start) * 1000, 1)
         }
+        # A stream that ended without Ollama's done message may be cut off; never cache it
+        if final.get("done"):
+            self._store_answer(query_embedding, search_results, conversation_history, {
+                "answer": "".join(answer_parts),
+                "sources": sources,
+                "query": query,
+                "num_sources": len(sources)
+            })
+        logger.info(
+            "Streamed answer: ttft=%sms, %s tokens at %s tok/s",
+            stats["time_to_first_token_ms"], stats["tokens"], stats["tokens_per_second"]
+        )
+        yield "done", stats
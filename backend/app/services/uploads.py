@@ -0,0 +1,154 @@
+import hashlib
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import aiofiles
+from fastapi import Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+class UploadTooLargeError(ValueError):
+    """The uploaded file is bigger than the configured limit"""
+
+class UploadFormError(ValueError):
+    """The request body isn't a multipart form with exactly one file"""
+
+@dataclass
+class ReceivedUpload:
+    """A file received from a multipart upload
+
+    Exactly one of path (streamed to disk) and content (small text file
+    kept in memory) is set.
+    """
+    filename: str
+    size: int
+    sha256: str
+    path: Optional[str] = None
+    content: Optional[bytes] = None
+    fields: Dict[str, str] = field(default_factory=dict)
+
+class _Part:
+    def __init__(self):
+        self.header_field = b""
+        self.header_value = b""
+        self.headers: Dict[bytes, bytes] = {}
+        self.name: Optional[str] = None
+        self.filename: Optional[str] = None
+        self.value = bytearray()
+
+async def receive_upload(
+    request: Request,
+    directory: Path,
+    stem: str,
+    max_size: int,
+    memory_max_size: int = 0,
+    memory_extensions: Tuple[str, ...] = (),
+    file_field: str = "file"
+) -> ReceivedUpload:
+    """Stream a multipart upload's file to directory/<stem><suffix> as it arrives
+
+    The body is parsed incrementally, so memory use is bounded by the size
+    of one network read whatever the file size. The size limit is enforced
+    and the SHA-256 computed while streaming; an oversized upload is
+    rejected (and its partial file removed) as soon as it crosses max_size,
+    without reading the rest. Files with one of memory_extensions are
+    buffered in memory instead, and only spill to disk if they grow past
+    memory_max_size. Other (non-file) form fields are returned in fields.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadFormError("Expected a multipart/form-data request")
+
+    events: List[Tuple[str, bytes]] = []
+    callbacks = {
+        "on_part_begin": lambda: events.append(("begin", b"")),
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", b"")),
+        "on_header_field": lambda data, start, end: events.append(("header_field", data[start:end])),
+        "on_header_value": lambda data, start, end: events.append(("header_value", data[start:end])),
+        "on_header_end": lambda: events.append(("header_end", b"")),
+        "on_headers_finished": lambda: events.append(("headers_finished", b"")),
+    }
+    parser = MultipartParser(options[b"boundary"], callbacks)
+
+    upload: Optional[ReceivedUpload] = None
+    digest = hashlib.sha256()
+    buffer: Optional[bytearray] = None
+    out = None
+    part: Optional[_Part] = None
+    fields: Dict[str, str] = {}
+
+    async def spill():
+        nonlocal buffer, out
+        upload.path = str(directory / f"{stem}{Path(upload.filename).suffix}")
+        out = await aiofiles.open(upload.path, "wb")
+        if buffer:
+            await out.write(bytes(buffer))
+        buffer = None
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, data in events:
+                if kind == "begin":
+                    part = _Part()
+                elif kind == "header_field":
+                    part.header_field += data
+                elif kind == "header_value":
+                    part.header_value += data
+                elif kind == "header_end":
+                    part.headers[part.header_field.lower()] = part.header_value
+                    part.header_field, part.header_value = b"", b""
+                elif kind == "headers_finished":
+                    _, disposition = parse_options_header(part.headers.get(b"content-disposition", b""))
+                    part.name = disposition.get(b"name", b"").decode("utf-8")
+                    if b"filename" in disposition:
+                        part.filename = Path(disposition[b"filename"].decode("utf-8")).name
+                    if part.filename is not None and part.name == file_field:
+                        if upload is not None:
+                            raise UploadFormError("Only one file can be uploaded per request")
+                        upload = ReceivedUpload(filename=part.filename, size=0, sha256="")
+                        if Path(part.filename).suffix.lower() in memory_extensions and memory_max_size > 0:
+                            buffer = bytearray()
+                        else:
+                            await spill()
+                elif kind == "data":
+                    if part.filename is None or part.name != file_field:
+                        part.value += data
+                        continue
+                    upload.size += len(data)
+                    if upload.size > max_size:
+                        raise UploadTooLargeError(
+                            f"File size exceeds maximum allowed size of {max_size / 1024 / 1024}MB"
+                        )
+                    digest.update(data)
+                    if buffer is not None:
+                        buffer += data
+                        if len(buffer) > memory_max_size:
+                            await spill()
+                    else:
+                        await out.write(data)
+                elif kind == "end":
+                    if part.filename is None:
+                        fields[part.name] = part.value.decode("utf-8")
+                    part = None
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        if out is not None:
+            await out.close()
+            out = None
+        if upload is not None and upload.path and os.path.exists(upload.path):
+            os.remove(upload.path)
+        raise
+    finally:
+        if out is not None:
+            await out.close()
+
+    if upload is None:
+        raise UploadFormError(f"No file was uploaded in the '{file_field}' field")
+    upload.sha256 = digest.hexdigest()
+    upload.fields = fields
+    if buffer is not None:
+        upload.content = bytes(buffer)
+    return upload
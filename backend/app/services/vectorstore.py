@@ -1,78 +1,1251 @@
+import json
+import logging
+import os
+import threading
+import time
 import chromadb
+import numpy as np
 from chromadb.config import Settings
-from typing import List, Dict, Optional
+from pathlib import Path
+from typing import Callable, List, Dict, Optional, Set, Tuple
 import uuid
 from datetime import datetime
+from app.services.lexical_index import LexicalIndex
+from app.services.metadata_index import MetadataIndex, has_time_range
+
+logger = logging.getLogger(__name__)
+
+# Keys of a query result, one list per query vector under each
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances")
+
+def build_chunk_metadata(
+    document_id: str,
+    filename: str,
+    doc_type: str,
+    chunk_index: int,
+    chunk: str,
+    location: Optional[Dict] = None
+) -> Dict:
+    """Metadata stored alongside every chunk
+    
+    location holds the chunk's byte offsets, line range, PDF pages and
+    section path (see TextChunk.location), so citations can be rendered
+    without re-reading the source.
+    """
+    return {
+        "document_id": document_id,
+        "filename": filename,
+        "doc_type": doc_type,
+        "chunk_index": chunk_index,
+        "upload_time": datetime.now().isoformat(),
+        "text_preview": chunk[:200],
+        **(location or {})
+    }
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length float32 copies of the rows (cosine similarity becomes a dot product)"""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k largest scores in each row, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+def nearest_centroids(data: np.ndarray, centroids: np.ndarray, block: int = 16384) -> np.ndarray:
+    """Index of the closest centroid (L2) for every row of data"""
+    norms = (centroids ** 2).sum(axis=1)
+    assignment = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), block):
+        distances = norms - 2 * data[start:start + block] @ centroids.T
+        assignment[start:start + block] = distances.argmin(axis=1)
+    return assignment
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; empty clusters are re-seeded from random rows"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignment = nearest_centroids(data, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=k)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+        centroids[present] = np.add.reduceat(data[order], starts, axis=0) / counts[present, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty))]
+    return centroids
+
+
+class VectorIndex:
+    """Nearest-neighbour search over chunk vectors
+
+    Chroma always keeps chunk text and metadata; the index decides where
+    the vectors live and how they are searched. Distances are cosine
+    distances (1 - similarity), like Chroma's.
+    """
+    
+    name = "base"
+    # Set when the index was reopened after a shutdown that skipped save()
+    unclean = False
+    
+    def collection_embeddings(self, vectors: np.ndarray) -> List[List[float]]:
+        """Embeddings to hand Chroma alongside each record
+        
+        Indexes that hold the vectors themselves give Chroma a one-value
+        placeholder, so Chroma doesn't keep its own copy.
+        """
+        return [[1.0]] * len(vectors)
+    
+    def add(self, ids: List[str], vectors: np.ndarray):
+        raise NotImplementedError
+    
+    def remove(self, ids: List[str]):
+        raise NotImplementedError
+    
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        where: Optional[Dict] = None,
+        allowed_ids: Optional[Set[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """(chunk ID, distance) hits per query, nearest first"""
+        raise NotImplementedError
+    
+    def search_exact(self, queries: np.ndarray, top_k: int, ids: Set[str]) -> List[List[Tuple[str, float]]]:
+        """Brute-force search over just the given chunks, for small pre-filtered candidate sets"""
+        vectors = self.get_vectors(list(ids)) if ids else {}
+        if not vectors:
+            return [[] for _ in range(len(np.atleast_2d(queries)))]
+        candidate_ids = list(vectors)
+        similarities = normalize_rows(queries) @ normalize_rows(np.stack(list(vectors.values()))).T
+        columns, best = top_k_rows(similarities, top_k)
+        return [
+            [(candidate_ids[column], float(1 - similarity)) for column, similarity in zip(query_columns, query_best)]
+            for query_columns, query_best in zip(columns, best)
+        ]
+    
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+    
+    def ids(self) -> List[str]:
+        raise NotImplementedError
+    
+    def count(self) -> int:
+        raise NotImplementedError
+    
+    def warm(self):
+        """Load whatever the first query would otherwise have to"""
+    
+    def wait_for_training(self, timeout: Optional[float] = None):
+        """Block until any background training has been swapped in"""
+    
+    def maybe_save(self):
+        pass
+    
+    def save(self):
+        pass
+    
+    def get_stats(self) -> Dict:
+        return {"backend": self.name, "vectors": self.count()}
+
+
+class ChromaVectorIndex(VectorIndex):
+    """Vectors stored and searched by Chroma's own HNSW index"""
+    
+    name = "chroma"
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def collection_embeddings(self, vectors: np.ndarray) -> List[List[float]]:
+        # Chroma 0.4 validates embeddings as lists of Python floats
+        return np.asarray(vectors, dtype=np.float32).tolist()
+    
+    def add(self, ids: List[str], vectors: np.ndarray):
+        pass  # written by the collection upsert
+    
+    def remove(self, ids: List[str]):
+        pass  # removed by the collection delete
+    
+    def search(self, queries, top_k, where=None, allowed_ids=None):
+        results = self.collection.query(
+            query_embeddings=np.asarray(queries, dtype=np.float32).tolist(),
+            n_results=top_k,
+            where=where,
+            include=["distances"]
+        )
+        return [list(zip(ids, distances)) for ids, distances in zip(results["ids"], results["distances"])]
+    
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        if not ids:
+            # Chroma reads an empty ID list as "no ID filter"
+            return {}
+        fetched = self.collection.get(ids=ids, include=["embeddings"])
+        return {
+            chunk_id: np.asarray(embedding, dtype=np.float32)
+            for chunk_id, embedding in zip(fetched["ids"], fetched["embeddings"])
+        }
+    
+    def ids(self) -> List[str]:
+        return self.collection.get(include=[])["ids"]
+    
+    def count(self) -> int:
+        return self.collection.count()
+    
+    def warm(self):
+        # Chroma loads the HNSW segment on the first query
+        sample = self.collection.peek(limit=1)["embeddings"]
+        if sample:
+            self.collection.query(query_embeddings=[sample[0]], n_results=1, include=[])
+
+
+class LocalVectorIndex(VectorIndex):
+    """Vectors kept by DocuMind in a memory-mapped float32 file
+    
+    Each chunk owns a row of vectors.f32 (unit-normalized); ids.json maps
+    rows back to chunk IDs. Rows of deleted chunks are reused. The file is
+    paged in by the OS as it is read, so only what searches touch needs
+    to be resident. ids.json is rewritten at most every persist_interval
+    seconds and on shutdown; every row assignment in between is appended
+    to ids.log right after its vector is written, and replayed on load, so
+    a crashed process loses no chunks.
+    
+    Searches only hold the lock to snapshot which rows to scan and to map
+    the winners back to IDs, so concurrent searches scan in parallel. Each
+    row is stamped with the write that last touched it; if a winner was
+    rewritten or freed mid-scan, the search is redone under the lock.
+    """
+    
+    VECTORS_FILE = "vectors.f32"
+    IDS_FILE = "ids.json"
+    IDS_LOG = "ids.log"
+    
+    def __init__(self, directory: str, persist_interval: float = 30.0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.persist_interval = persist_interval
+        self.dimension: Optional[int] = None
+        
+        self._lock = threading.RLock()
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._live = np.zeros(0, dtype=bool)
+        self._stamps = np.zeros(0, dtype=np.int64)
+        self._version = 0
+        self._matrix: Optional[np.memmap] = None
+        self._capacity = 0
+        self._log = None
+        # Rows whose assignment was replayed from the log, for subclasses to refresh
+        self._recovered_rows = np.zeros(0, dtype=np.int64)
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.load()
+    
+    def _map_file(self, name: str, dtype, shape: Tuple[int, ...], current: Optional[np.memmap]) -> np.memmap:
+        """Memory-map a row file, growing it to hold shape"""
+        path = self.directory / name
+        with open(path, "ab") as f:
+            f.truncate(max(int(np.prod(shape)) * np.dtype(dtype).itemsize, os.path.getsize(path)))
+        if current is not None:
+            current.flush()
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+    
+    def _map(self, capacity: int):
+        """(Re)map the vectors file, growing it to capacity rows"""
+        self._matrix = self._map_file(self.VECTORS_FILE, np.float32, (capacity, self.dimension), self._matrix)
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live[:capacity]
+        self._live = live
+        stamps = np.zeros(capacity, dtype=np.int64)
+        stamps[:len(self._stamps)] = self._stamps[:capacity]
+        self._stamps = stamps
+        self._capacity = capacity
+    
+    def _allocate(self, count: int) -> List[int]:
+        rows = [self._free.pop() for _ in range(min(count, len(self._free)))]
+        start = len(self._ids)
+        extra = count - len(rows)
+        if start + extra > self._capacity:
+            self._map(max(start + extra, self._capacity * 2, 1024))
+        self._ids.extend([None] * extra)
+        rows.extend(range(start, start + extra))
+        return rows
+    
+    def add(self, ids: List[str], vectors: np.ndarray):
+        if not ids:
+            return
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                self._map(1024)
+                # The log can only be replayed on top of a file that records the dimension
+                self._write_ids()
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-d vectors, got {vectors.shape[1]}-d")
+            
+            # Latest vector wins when an ID repeats within the call
+            latest = {chunk_id: position for position, chunk_id in enumerate(ids)}
+            new_ids = [chunk_id for chunk_id in latest if chunk_id not in self._rows]
+            for chunk_id, row in zip(new_ids, self._allocate(len(new_ids))):
+                self._rows[chunk_id] = row
+                self._ids[row] = chunk_id
+            rows = np.array([self._rows[chunk_id] for chunk_id in latest], dtype=np.int64)
+            positions = np.fromiter(latest.values(), dtype=np.int64, count=len(latest))
+            self._version += 1
+            self._stamps[rows] = self._version
+            self._matrix[rows] = vectors[positions]
+            self._live[rows] = True
+            self._on_add(rows, vectors[positions])
+            self._append_log([(self._rows[chunk_id], chunk_id) for chunk_id in new_ids])
+            self._dirty = True
+        self.maybe_save()
+    
+    def remove(self, ids: List[str]):
+        with self._lock:
+            rows = [self._rows.pop(chunk_id) for chunk_id in ids if chunk_id in self._rows]
+            for row in rows:
+                self._ids[row] = None
+                self._free.append(row)
+            if rows:
+                self._version += 1
+                self._stamps[rows] = self._version
+                self._live[rows] = False
+                self._on_remove(np.array(rows, dtype=np.int64))
+                self._append_log([(row, None) for row in rows])
+                self._dirty = True
+        self.maybe_save()
+    
+    def _on_add(self, rows: np.ndarray, vectors: np.ndarray):
+        """Hook for subclasses that keep extra per-row state"""
+    
+    def _on_remove(self, rows: np.ndarray):
+        pass
+    
+    def search(self, queries, top_k, where=None, allowed_ids=None):
+        with self._lock:
+            if self.dimension is None or not self._rows:
+                return [[] for _ in range(len(np.atleast_2d(queries)))]
+            used = len(self._ids)
+            if allowed_ids is None:
+                mask = self._live[:used].copy()
+            else:
+                mask = np.zeros(used, dtype=bool)
+                rows = [self._rows[chunk_id] for chunk_id in allowed_ids if chunk_id in self._rows]
+                mask[rows] = True
+            version = self._version
+        rows, similarities = self._search(normalize_rows(queries), top_k, mask)
+        hits = self._hits(rows, similarities, version)
+        if hits is None:
+            with self._lock:
+                return self.search(queries, top_k, where, allowed_ids)
+        return hits
+    
+    def search_exact(self, queries, top_k, ids):
+        # Straight to the candidates' full-precision rows, whatever the backend compresses
+        with self._lock:
+            if self.dimension is None:
+                return [[] for _ in range(len(np.atleast_2d(queries)))]
+            rows = np.array(sorted(self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows), dtype=np.int64)
+            version = self._version
+        rows, similarities = self._exact_search(normalize_rows(queries), top_k, rows)
+        hits = self._hits(rows, similarities, version)
+        if hits is None:
+            with self._lock:
+                return self.search_exact(queries, top_k, ids)
+        return hits
+    
+    def _hits(
+        self,
+        rows: List[np.ndarray],
+        similarities: List[np.ndarray],
+        version: int
+    ) -> Optional[List[List[Tuple[str, float]]]]:
+        """Map scanned rows to (chunk ID, distance), or None if one was written after version"""
+        with self._lock:
+            if any(len(query_rows) and self._stamps[query_rows].max() > version for query_rows in rows):
+                return None
+            return [
+                [(self._ids[row], float(1 - similarity)) for row, similarity in zip(query_rows, query_similarities)]
+                for query_rows, query_similarities in zip(rows, similarities)
+            ]
+    
+    def _search(self, queries: np.ndarray, top_k: int, mask: np.ndarray) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Rows and cosine similarities of the best matches among masked-in rows"""
+        return self._exact_search(queries, top_k, np.flatnonzero(mask))
+    
+    def _exact_search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        candidates: np.ndarray
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Brute-force dot products against the full-precision rows"""
+        return self._scan(queries, top_k, candidates, lambda rows: queries @ self._matrix[rows].T)
+    
+    def _scan(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        candidates: np.ndarray,
+        score_rows: Callable[[np.ndarray], np.ndarray],
+        block: int = 65536
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Top-k over candidate rows scored a block at a time by score_rows"""
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(candidates), block):
+            rows = candidates[start:start + block]
+            scores = score_rows(rows)
+            columns, scores = top_k_rows(scores, top_k)
+            merged_rows = np.concatenate([best_rows, rows[columns]], axis=1)
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            columns, best_scores = top_k_rows(merged_scores, top_k)
+            best_rows = np.take_along_axis(merged_rows, columns, axis=1)
+        return list(best_rows), list(best_scores)
+    
+    def _rescore(self, query: np.ndarray, rows: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-rank a shortlist by exact similarity, read from the full-precision file"""
+        rows = np.sort(rows)  # in file order, so the reads are sequential
+        similarities = self._matrix[rows] @ query
+        columns, best = top_k_rows(similarities[None, :], top_k)
+        return rows[columns[0]], best[0]
+    
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            return {
+                chunk_id: np.array(self._matrix[self._rows[chunk_id]])
+                for chunk_id in ids if chunk_id in self._rows
+            }
+    
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._rows)
+    
+    def count(self) -> int:
+        return len(self._rows)
+    
+    def warm(self):
+        # Fault the live rows into the page cache
+        with self._lock:
+            if self._matrix is not None and self._rows:
+                float(self._matrix[:len(self._ids)].sum())
+    
+    def maybe_save(self):
+        if self._dirty and time.monotonic() - self._last_save >= self.persist_interval:
+            self.save()
+    
+    def _append_log(self, assignments: List[Tuple[int, Optional[str]]]):
+        """Record row assignments (None for a freed row) until the next save"""
+        if not assignments:
+            return
+        if self._log is None:
+            self._log = open(self.directory / self.IDS_LOG, "a")
+        self._log.write("".join(json.dumps([row, chunk_id]) + "\n" for row, chunk_id in assignments))
+        self._log.flush()
+    
+    def _write_ids(self):
+        tmp_path = self.directory / (self.IDS_FILE + ".tmp")
+        tmp_path.write_text(json.dumps({"dimension": self.dimension, "ids": self._ids}))
+        os.replace(tmp_path, self.directory / self.IDS_FILE)
+    
+    def save(self):
+        with self._lock:
+            if self.dimension is None:
+                return
+            self._matrix.flush()
+            self._save_extra()
+            self._write_ids()
+            # Everything in the log is in ids.json now
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            (self.directory / self.IDS_LOG).unlink(missing_ok=True)
+            self.unclean = False
+            self._dirty = False
+            self._last_save = time.monotonic()
+    
+    def _save_extra(self):
+        pass
+    
+    def load(self):
+        ids_path = self.directory / self.IDS_FILE
+        if not ids_path.exists():
+            return
+        state = json.loads(ids_path.read_text())
+        with self._lock:
+            self.dimension = state["dimension"]
+            self._ids = state["ids"]
+            self._replay_log()
+            self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids) if chunk_id is not None}
+            self._free = [row for row, chunk_id in enumerate(self._ids) if chunk_id is None]
+            self._live = np.array([chunk_id is not None for chunk_id in self._ids], dtype=bool)
+            self._map(max(len(self._ids), 1024))
+            self._load_extra()
+    
+    def _replay_log(self):
+        """Apply the row assignments made after ids.json was last written"""
+        log_path = self.directory / self.IDS_LOG
+        if not log_path.exists():
+            return
+        recovered = set()
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    row, chunk_id = json.loads(line)
+                except ValueError:
+                    break  # a line cut short by the crash
+                if row >= len(self._ids):
+                    self._ids.extend([None] * (row + 1 - len(self._ids)))
+                self._ids[row] = chunk_id
+                recovered.add(row)
+        if recovered:
+            logger.warning(
+                "%s index was not saved on the last shutdown; recovered %d row changes from its log",
+                self.name, len(recovered)
+            )
+            self.unclean = True
+            self._dirty = True
+        self._recovered_rows = np.array(sorted(recovered), dtype=np.int64)
+    
+    def _load_extra(self):
+        pass
+    
+    def get_stats(self) -> Dict:
+        return {
+            **super().get_stats(),
+            "dimension": self.dimension,
+            "disk_bytes": self._capacity * (self.dimension or 0) * 4,
+            "ram_bytes": self._ram_bytes()
+        }
+    
+    def _ram_bytes(self) -> int:
+        """Memory that has to stay resident for searches to be fast"""
+        return len(self._ids) * (self.dimension or 0) * 4
+
+
+class NumpyVectorIndex(LocalVectorIndex):
+    """Exact search: one matrix product and an argpartition per query batch
+    
+    Recall is perfect and latency grows linearly with the corpus, which is
+    the right trade-off up to a few hundred thousand chunks.
+    
+    With storage="int8" the scan reads one-byte codes (plus a scale per
+    row) instead of float32 rows, a quarter of the memory traffic and of
+    the resident set. The best rescore_factor * top_k rows are then
+    re-ranked with the full-precision vectors, which stay on disk.
+    The storage mode is recorded next to the vectors; reopening in int8
+    after running in float32 re-quantizes every row, since rows rewritten
+    meanwhile still hold their old codes.
+    """
+    
+    name = "numpy"
+    CODES_FILE = "vectors.i8"
+    SCALES_FILE = "scales.f32"
+    STORAGE_FILE = "storage"
+    
+    def __init__(
+        self,
+        directory: str,
+        persist_interval: float = 30.0,
+        storage: str = "float32",
+        rescore_factor: int = 4
+    ):
+        if storage not in ("float32", "int8"):
+            raise ValueError(f"Unknown vector storage: {storage}")
+        self.storage = storage
+        self.rescore_factor = rescore_factor
+        self._codes: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        super().__init__(directory, persist_interval)
+        (self.directory / self.STORAGE_FILE).write_text(self.storage)
+    
+    def _map(self, capacity: int):
+        super()._map(capacity)
+        if self.storage == "int8":
+            self._codes = self._map_file(self.CODES_FILE, np.int8, (capacity, self.dimension), self._codes)
+            self._scales = self._map_file(self.SCALES_FILE, np.float32, (capacity,), self._scales)
+    
+    def _quantize(self, rows: np.ndarray, vectors: np.ndarray):
+        """Symmetric per-row int8 codes: vector ~= codes * scale"""
+        peaks = np.abs(vectors).max(axis=1)
+        peaks[peaks == 0] = 1.0
+        self._codes[rows] = np.rint(vectors / peaks[:, None] * 127).astype(np.int8)
+        self._scales[rows] = peaks / 127
+    
+    def _on_add(self, rows: np.ndarray, vectors: np.ndarray):
+        if self.storage == "int8":
+            self._quantize(rows, vectors)
+    
+    def _search(self, queries, top_k, mask):
+        candidates = np.flatnonzero(mask)
+        if self.storage == "float32":
+            return self._exact_search(queries, top_k, candidates)
+        
+        shortlist = top_k * max(self.rescore_factor, 1)
+        rows, scores = self._scan(
+            queries,
+            shortlist,
+            candidates,
+            lambda rows: (queries @ self._codes[rows].T.astype(np.float32)) * self._scales[rows],
+            block=16384
+        )
+        if not self.rescore_factor:
+            return rows, scores
+        rescored = [self._rescore(query, query_rows, top_k) for query, query_rows in zip(queries, rows)]
+        return [rows for rows, _ in rescored], [scores for _, scores in rescored]
+    
+    def _save_extra(self):
+        if self.storage == "int8":
+            self._codes.flush()
+            self._scales.flush()
+    
+    def _load_extra(self):
+        if self.storage != "int8":
+            return
+        # Codes are only current if the index last ran in int8. Otherwise rows
+        # without a scale are new, and rows recovered from the log may hold a
+        # previous occupant's codes; quantize them now
+        storage_path = self.directory / self.STORAGE_FILE
+        recorded = storage_path.read_text().strip() if storage_path.exists() else None
+        used = len(self._ids)
+        if recorded != "int8":
+            logger.info("Vector storage was %s; quantizing all rows to int8", recorded or "unrecorded")
+            stale = np.ones(used, dtype=bool)
+        else:
+            stale = self._scales[:used] == 0
+        stale[self._recovered_rows] = True
+        stale = np.flatnonzero(stale & self._live[:used])
+        for start in range(0, len(stale), 65536):
+            rows = stale[start:start + 65536]
+            self._quantize(rows, np.array(self._matrix[rows]))
+    
+    def _ram_bytes(self) -> int:
+        if self.storage == "float32":
+            return super()._ram_bytes()
+        return len(self._ids) * ((self.dimension or 0) + 4)
+    
+    def get_stats(self) -> Dict:
+        return {**super().get_stats(), "storage": self.storage, "rescore_factor": self.rescore_factor}
+
+
+class IvfPqVectorIndex(LocalVectorIndex):
+    """Approximate search with an inverted file and product quantization
+    
+    Vectors are assigned to the nearest of nlist k-means centroids and the
+    residual is compressed to pq_subquantizers one-byte codes, so a
+    384-d vector costs 48 bytes in RAM instead of 1536. A query scans only
+    the nprobe closest lists, scoring codes with per-list lookup tables,
+    then re-ranks the best rescore_factor * top_k with the full vectors,
+    which stay in the memory-mapped file and are only read for training
+    and rescoring. Until train_size vectors exist, searches are exact.
+    Training runs on a background thread over a copied sample, and searches
+    stay exact until the trained quantizers are swapped in.
+    """
+    
+    name = "ivfpq"
+    STATE_FILE = "ivfpq.npz"
+    
+    def __init__(
+        self,
+        directory: str,
+        persist_interval: float = 30.0,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        pq_subquantizers: int = 48,
+        train_size: int = 50000,
+        rescore_factor: int = 4
+    ):
+        self.nlist = nlist
+        self.rescore_factor = rescore_factor
+        self.nprobe = nprobe
+        self.pq_subquantizers = pq_subquantizers
+        self.train_size = max(train_size, nlist * 8, 256)
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None
+        self._codebook_norms: Optional[np.ndarray] = None
+        self._codes = np.zeros((0, pq_subquantizers), dtype=np.uint8)
+        self._assignment = np.zeros(0, dtype=np.int32)
+        self._training: Optional[threading.Thread] = None
+        # Rows written while training runs, re-encoded when it is swapped in
+        self._touched: Set[int] = set()
+        super().__init__(directory, persist_interval)
+    
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+    
+    def _map(self, capacity: int):
+        super()._map(capacity)
+        codes = np.zeros((capacity, self.pq_subquantizers), dtype=np.uint8)
+        codes[:len(self._codes)] = self._codes[:capacity]
+        assignment = np.full(capacity, -1, dtype=np.int32)
+        assignment[:len(self._assignment)] = self._assignment[:capacity]
+        self._codes, self._assignment = codes, assignment
+    
+    def _encode(
+        self,
+        vectors: np.ndarray,
+        centroids: Optional[np.ndarray] = None,
+        codebooks: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        centroids = self.centroids if centroids is None else centroids
+        codebooks = self.codebooks if codebooks is None else codebooks
+        assignment = nearest_centroids(vectors, centroids)
+        residuals = vectors - centroids[assignment]
+        width = self.dimension // self.pq_subquantizers
+        codes = np.empty((len(vectors), self.pq_subquantizers), dtype=np.uint8)
+        for j in range(self.pq_subquantizers):
+            codes[:, j] = nearest_centroids(residuals[:, j * width:(j + 1) * width], codebooks[j])
+        return assignment, codes
+    
+    def _start_training(self):
+        """Copy a training sample and fit the quantizers on a background thread (lock held)"""
+        if self.dimension % self.pq_subquantizers:
+            raise ValueError(
+                f"pq_subquantizers ({self.pq_subquantizers}) must divide the vector dimension ({self.dimension})"
+            )
+        logger.info("Training IVF-PQ index on %d of %d vectors...", self.train_size, len(self._rows))
+        live_rows = np.flatnonzero(self._live[:len(self._ids)])
+        rng = np.random.default_rng(0)
+        sample = np.array(self._matrix[np.sort(rng.choice(live_rows, self.train_size, replace=False))])
+        self._touched = set()
+        self._training = threading.Thread(target=self._train, args=(sample,), name="ivfpq-train", daemon=True)
+        self._training.start()
+    
+    def _train(self, sample: np.ndarray):
+        try:
+            centroids = kmeans(sample, self.nlist)
+            residuals = sample - centroids[nearest_centroids(sample, centroids)]
+            width = self.dimension // self.pq_subquantizers
+            codebooks = np.stack([
+                kmeans(residuals[:, j * width:(j + 1) * width], 256, iterations=10, seed=j)
+                for j in range(self.pq_subquantizers)
+            ])
+            
+            # Encode what is live now without the lock; rows written from here on are touched
+            with self._lock:
+                self._touched = set()
+                live_rows = np.flatnonzero(self._live[:len(self._ids)])
+                matrix = self._matrix
+            encoded = [
+                (rows, *self._encode(np.array(matrix[rows]), centroids, codebooks))
+                for rows in (live_rows[start:start + 65536] for start in range(0, len(live_rows), 65536))
+            ]
+            
+            with self._lock:
+                for rows, assignment, codes in encoded:
+                    self._codes[rows] = codes
+                    self._assignment[rows] = assignment
+                touched = np.array(sorted(self._touched), dtype=np.int64)
+                self._assignment[touched] = -1
+                touched = touched[self._live[touched]]
+                if len(touched):
+                    self._assignment[touched], self._codes[touched] = self._encode(
+                        np.array(self._matrix[touched]), centroids, codebooks
+                    )
+                # Searches read centroids as the "trained" flag, so they go last
+                self.codebooks = codebooks
+                self._codebook_norms = (codebooks ** 2).sum(axis=2)
+                self.centroids = centroids
+                self._dirty = True
+            logger.info("IVF-PQ index trained")
+        except Exception:
+            logger.exception("IVF-PQ training failed; searches stay exact")
+        finally:
+            with self._lock:
+                self._training = None
+    
+    def wait_for_training(self, timeout: Optional[float] = None):
+        training = self._training
+        if training is not None:
+            training.join(timeout)
+    
+    def _on_add(self, rows: np.ndarray, vectors: np.ndarray):
+        if self.trained:
+            self._assignment[rows], self._codes[rows] = self._encode(vectors)
+        elif self._training is not None:
+            self._touched.update(rows.tolist())
+        elif len(self._rows) >= self.train_size:
+            self._start_training()
+    
+    def _on_remove(self, rows: np.ndarray):
+        self._assignment[rows] = -1
+        if self._training is not None:
+            self._touched.update(rows.tolist())
+    
+    def _search(self, queries, top_k, mask):
+        if not self.trained:
+            return self._exact_search(queries, top_k, np.flatnonzero(mask))
+        
+        used = len(self._ids)
+        width = self.dimension // self.pq_subquantizers
+        nprobe = min(self.nprobe, self.nlist)
+        centroid_norms = (self.centroids ** 2).sum(axis=1)
+        subquantizers = np.arange(self.pq_subquantizers)
+        all_rows, all_similarities = [], []
+        for query in queries:
+            # Probe the lists whose centroids are closest to the query
+            centroid_distances = centroid_norms - 2 * self.centroids @ query
+            probes = np.argpartition(centroid_distances, nprobe - 1)[:nprobe]
+            rows = np.flatnonzero(np.isin(self._assignment[:used], probes) & mask)
+            
+            # Lookup tables: squared distance from each residual subvector to every code,
+            # as |r|^2 - 2 r.c + |c|^2, with the products batched in one matmul
+            residuals = (query[None, :] - self.centroids[probes]).reshape(nprobe, self.pq_subquantizers, 1, width)
+            products = (residuals @ self.codebooks.transpose(0, 2, 1)[None])[:, :, 0, :]
+            tables = (residuals ** 2).sum(axis=3) - 2 * products + self._codebook_norms[None]
+            probe_position = np.empty(self.nlist, dtype=np.int64)
+            probe_position[probes] = np.arange(nprobe)
+            positions = probe_position[self._assignment[rows]]
+            flat = (positions[:, None] * self.pq_subquantizers + subquantizers[None, :]) * 256 + self._codes[rows]
+            distances = np.take(tables, flat).sum(axis=1)
+            
+            # Unit vectors: squared L2 distance d maps to cosine similarity 1 - d / 2
+            columns, best = top_k_rows((1 - distances / 2)[None, :], top_k * max(self.rescore_factor, 1))
+            shortlist, similarities = rows[columns[0]], best[0]
+            if self.rescore_factor:
+                shortlist, similarities = self._rescore(query, shortlist, top_k)
+            all_rows.append(shortlist)
+            all_similarities.append(similarities)
+        return all_rows, all_similarities
+    
+    def _save_extra(self):
+        if not self.trained:
+            return
+        used = len(self._ids)
+        tmp_path = self.directory / (self.STATE_FILE + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            codes=self._codes[:used],
+            assignment=self._assignment[:used]
+        )
+        os.replace(tmp_path, self.directory / self.STATE_FILE)
+    
+    def _load_extra(self):
+        path = self.directory / self.STATE_FILE
+        if path.exists():
+            state = np.load(path)
+            if state["codebooks"].shape[0] == self.pq_subquantizers and len(state["centroids"]) == self.nlist:
+                self.centroids = state["centroids"]
+                self.codebooks = state["codebooks"]
+                self._codebook_norms = (self.codebooks ** 2).sum(axis=2)
+                saved = len(state["assignment"])
+                self._codes[:saved] = state["codes"]
+                self._assignment[:saved] = state["assignment"]
+                # Rows written after the last save (or freed since) are re-encoded
+                stale = self._assignment[:len(self._ids)] < 0
+                stale[self._recovered_rows] = True
+                stale = np.flatnonzero(stale & self._live[:len(self._ids)])
+                if len(stale):
+                    self._assignment[stale], self._codes[stale] = self._encode(np.array(self._matrix[stale]))
+                return
+            logger.info("IVF-PQ parameters changed; retraining")
+        if len(self._rows) >= self.train_size:
+            self._start_training()
+    
+    def _ram_bytes(self) -> int:
+        if not self.trained:
+            return super()._ram_bytes()
+        used = len(self._ids)
+        return (
+            self._codes[:used].nbytes + self._assignment[:used].nbytes
+            + self.centroids.nbytes + self.codebooks.nbytes
+        )
+    
+    def get_stats(self) -> Dict:
+        return {
+            **super().get_stats(),
+            "trained": self.trained,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "rescore_factor": self.rescore_factor
+        }
+
+
+def build_vector_index(backend: str, collection, directory: str, **options) -> VectorIndex:
+    """Create the configured vector index backend"""
+    if backend == "chroma":
+        return ChromaVectorIndex(collection)
+    if backend == "numpy":
+        return NumpyVectorIndex(directory, **options)
+    if backend == "ivfpq":
+        return IvfPqVectorIndex(directory, **options)
+    raise ValueError(f"Unknown vector index backend: {backend}")
+
 
 class VectorStoreService:
-    """Handles ChromaDB operations"""
+    """Handles ChromaDB operations
+    
+    Data lives in a persistent Chroma store under persist_directory (a
+    SQLite database plus one HNSW segment per collection). Opening the store
+    is cheap: Chroma only loads the HNSW segment on the first query, which
+    the service registry's warmup triggers unless preloading is disabled.
     
-    def __init__(self, persist_directory: str):
-        self.client = chromadb.Client(Settings(
-            persist_directory=persist_directory,
-            anonymized_telemetry=False
-        ))
+    Vectors are searched through a VectorIndex. With the default "chroma"
+    backend they live in Chroma's HNSW index; the "numpy" and "ivfpq"
+    backends keep them under index_directory and Chroma stores only text
+    and metadata, in a separate collection (switching backends therefore
+    needs a re-ingest).
+    """
+    
+    def __init__(
+        self,
+        persist_directory: str,
+        lexical_index: Optional[LexicalIndex] = None,
+        index_backend: str = "chroma",
+        index_directory: Optional[str] = None,
+        metadata_index: Optional[MetadataIndex] = None,
+        prefilter_max_candidates: int = 20000,
+        **index_options
+    ):
+        self.persist_directory = persist_directory
+        self.client = chromadb.PersistentClient(
+            path=persist_directory,
+            settings=Settings(anonymized_telemetry=False)
+        )
         
         # Create or get collection
         self.collection = self.client.get_or_create_collection(
-            name="documents",
+            name="documents" if index_backend == "chroma" else "chunks",
             metadata={"hnsw:space": "cosine"}
         )
+        self.index = build_vector_index(
+            index_backend,
+            self.collection,
+            index_directory or str(Path(persist_directory) / "vector_index"),
+            **index_options
+        )
+        
+        # Callbacks told about chunk IDs whose content or metadata changed
+        self._change_listeners: List[Callable[[List[str]], None]] = []
+        
+        # Keyword index kept in step with the collection for sparse/hybrid search
+        self.lexical_index = lexical_index
+        
+        # Secondary index resolving metadata filters to chunk IDs; filters
+        # matching at most prefilter_max_candidates chunks are searched
+        # exactly over just those chunks
+        self.metadata_index = metadata_index
+        self.prefilter_max_candidates = prefilter_max_candidates
+    
+    def sync_vector_index(self):
+        """Drop index entries for chunks the collection no longer has
+        
+        Local indexes replay their row log after a crash, but a chunk written
+        to Chroma and not yet to the index (or the reverse) can still be off.
+        After an unclean shutdown every ID is compared, not just the counts.
+        Chunks missing from the index can't be recovered without their
+        vectors and need their documents re-uploaded.
+        """
+        if isinstance(self.index, ChromaVectorIndex):
+            return
+        if not self.index.unclean and self.index.count() == self.collection.count():
+            return
+        stored = set(self.collection.get(include=[])["ids"])
+        indexed = self.index.ids()
+        stale = [chunk_id for chunk_id in indexed if chunk_id not in stored]
+        if stale:
+            self.index.remove(stale)
+        missing = len(stored) - (len(indexed) - len(stale))
+        if missing:
+            logger.warning(
+                "%d stored chunks have no vector in the %s index; re-upload their documents", missing, self.index.name
+            )
+    
+    def sync_lexical_index(self, page_size: int = 1000):
+        """Rebuild the keyword index from the collection if it has drifted
+        
+        Drift is detected as for the metadata index: a different chunk
+        count, or changes the last process never saved.
+        """
+        if self.lexical_index is None:
+            return
+        total = self.collection.count()
+        if not self.lexical_index.unclean and self.lexical_index.doc_count == total:
+            return
+        
+        logger.info("Rebuilding lexical index from %d stored chunks...", total)
+        self.lexical_index.clear()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=["documents"], limit=page_size, offset=offset)
+            self.lexical_index.add(page["ids"], page["documents"])
+        self.lexical_index.save()
+    
+    def sync_metadata_index(self, page_size: int = 1000):
+        """Rebuild the metadata index from the collection if it has drifted
+        
+        It has when its chunk count differs, or when the last process exited
+        with changes it never saved (the count can match by coincidence).
+        """
+        if self.metadata_index is None:
+            return
+        total = self.collection.count()
+        if not self.metadata_index.unclean and self.metadata_index.chunk_count == total:
+            return
+        
+        logger.info("Rebuilding metadata index from %d stored chunks...", total)
+        self.metadata_index.clear()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            self.metadata_index.add(page["ids"], page["metadatas"])
+        self.metadata_index.save()
+    
+    def summarize_documents(self, page_size: int = 1000) -> Dict[str, Dict]:
+        """Filename, type and chunk count of every stored document (a full scan)"""
+        documents: Dict[str, Dict] = {}
+        total = self.collection.count()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for metadata in page["metadatas"]:
+                summary = documents.setdefault(metadata["document_id"], {
+                    "filename": metadata["filename"],
+                    "doc_type": metadata["doc_type"],
+                    "chunk_count": 0
+                })
+                summary["chunk_count"] += 1
+        return documents
+    
+    def add_change_listener(self, listener: Callable[[List[str]], None]):
+        """Register a callback invoked with chunk IDs that were rewritten or deleted"""
+        self._change_listeners.append(listener)
+    
+    def _notify_changed(self, ids: List[str]):
+        for listener in self._change_listeners:
+            listener(ids)
     
     def add_chunks(
         self,
         chunks: List[str],
-        embeddings: List[List[float]],
+        embeddings: np.ndarray,
         document_id: str,
         filename: str,
-        doc_type: str
+        doc_type: str,
+        chunk_ids: Optional[List[str]] = None,
+        chunk_indices: Optional[List[int]] = None,
+        locations: Optional[List[Dict]] = None
     ) -> int:
-        """Add document chunks to vector store"""
+        """Add (or overwrite) document chunks in the vector store"""
         
-        ids = [f"{document_id}_chunk_{i}" for i in range(len(chunks))]
+        ids = chunk_ids or [f"{document_id}_chunk_{i}" for i in range(len(chunks))]
+        indices = chunk_indices if chunk_indices is not None else list(range(len(chunks)))
+        locations = locations or [None] * len(chunks)
         
         metadatas = [
-            {
-                "document_id": document_id,
-                "filename": filename,
-                "doc_type": doc_type,
-                "chunk_index": i,
-                "upload_time": datetime.now().isoformat(),
-                "text_preview": chunk[:100]
-            }
-            for i, chunk in enumerate(chunks)
+            build_chunk_metadata(document_id, filename, doc_type, i, chunk, location)
+            for i, chunk, location in zip(indices, chunks, locations)
         ]
         
-        self.collection.add(
+        return self.upsert_chunks(ids, chunks, embeddings, metadatas)
+    
+    def upsert_chunks(
+        self,
+        ids: List[str],
+        chunks: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict]
+    ) -> int:
+        """Write prepared chunks, possibly from several documents, in one call"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        self._mark_indexes_dirty()
+        self.collection.upsert(
             ids=ids,
-            embeddings=embeddings,
+            embeddings=self.index.collection_embeddings(vectors),
             documents=chunks,
             metadatas=metadatas
         )
+        self.index.add(ids, vectors)
+        if self.lexical_index is not None:
+            self.lexical_index.add(ids, chunks)
+        if self.metadata_index is not None:
+            self.metadata_index.add(ids, metadatas)
+        self._notify_changed(ids)
         
         return len(chunks)
     
-    def get_document_chunks(self, document_id: str) -> List[Dict]:
-        """Retrieve all chunks for a document"""
-        results = self.collection.get(
-            where={"document_id": document_id}
-        )
-        return results
+    def _mark_indexes_dirty(self, text_changed: bool = True):
+        # Before the collection changes, so a crash before the indexes catch up is detected
+        if text_changed and self.lexical_index is not None:
+            self.lexical_index.mark_dirty()
+        if self.metadata_index is not None:
+            self.metadata_index.mark_dirty()
+    
+    def _document_chunk_ids(self, document_id: str) -> List[str]:
+        """IDs of a document's chunks, from the metadata index when there is one"""
+        if self.metadata_index is not None:
+            return self.metadata_index.document_chunk_ids(document_id)
+        return self.collection.get(where={"document_id": document_id}, include=[])["ids"]
+    
+    def get_document_chunks(self, document_id: str) -> Dict:
+        """Retrieve all chunks for a document, as Chroma's ids/documents/metadatas lists"""
+        ids = self._document_chunk_ids(document_id)
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        return self.collection.get(ids=ids, include=["documents", "metadatas"])
+    
+    def get_document_chunk_metadata(self, document_id: str) -> Dict[str, Dict]:
+        """Map chunk ID -> metadata for every stored chunk of a document"""
+        ids = self._document_chunk_ids(document_id)
+        if not ids:
+            return {}
+        results = self.collection.get(ids=ids, include=["metadatas"])
+        return dict(zip(results["ids"], results["metadatas"]))
+    
+    def update_chunk_metadata(self, ids: List[str], metadatas: List[Dict]):
+        """Rewrite chunk metadata without touching text or embeddings"""
+        self._mark_indexes_dirty(text_changed=False)
+        self.collection.update(ids=ids, metadatas=metadatas)
+        if self.metadata_index is not None:
+            self.metadata_index.add(ids, metadatas)
+        self._notify_changed(ids)
+    
+    def delete_chunks(self, ids: List[str]):
+        """Delete individual chunks by ID"""
+        self._mark_indexes_dirty()
+        self.collection.delete(ids=ids)
+        self.index.remove(ids)
+        if self.lexical_index is not None:
+            self.lexical_index.remove(ids)
+        if self.metadata_index is not None:
+            self.metadata_index.remove(ids)
+        self._notify_changed(ids)
     
     def delete_document(self, document_id: str) -> bool:
         """Delete all chunks for a document"""
         try:
-            self.collection.delete(
-                where={"document_id": document_id}
-            )
+            # Resolve the IDs first so listeners learn which chunks went away
+            ids = self._document_chunk_ids(document_id)
+            if ids:
+                self.delete_chunks(ids)
             return True
-        except Exception as e:
-            print(f"Error deleting document: {e}")
+        except Exception:
+            logger.exception("Error deleting document %s", document_id)
             return False
     
+    def get_chunks_by_ids(
+        self,
+        ids: List[str],
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """Fetch text and metadata for specific chunks, optionally filtered"""
+        allowed_ids = self._resolve_filter(where)
+        if allowed_ids is not None:
+            ids = [chunk_id for chunk_id in ids if chunk_id in allowed_ids]
+            where = None
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        return self.collection.get(ids=ids, where=where, include=["documents", "metadatas"])
+    
+    def _resolve_filter(self, where: Optional[Dict]) -> Optional[Set[str]]:
+        """Chunk IDs matching where, from the metadata index, or None to leave filtering to Chroma
+        
+        upload_time range filters can only be answered by the index (Chroma
+        compares numbers only), so they raise ValueError when it can't.
+        """
+        if not where:
+            return None
+        allowed_ids = self.metadata_index.resolve(where) if self.metadata_index is not None else None
+        if allowed_ids is None and has_time_range(where):
+            raise ValueError(
+                "upload_time range filters need the metadata index (METADATA_INDEX_ENABLED=true) "
+                "and may only combine document_id, filename, doc_type and upload_time"
+            )
+        return allowed_ids
+    
+    def query(
+        self,
+        query_embeddings: np.ndarray,
+        n_results: int,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """Nearest chunks for each query vector, shaped like Chroma's query result
+        
+        Filters the metadata index can resolve become a candidate set before
+        the vector search; small candidate sets are searched exactly, on
+        their own, instead of filtering a search over the whole index.
+        upload_time ranges, which Chroma can't filter, are searched exactly
+        over their candidates on the chroma backend whatever their size.
+        """
+        allowed_ids = self._resolve_filter(where)
+        
+        if allowed_ids is not None and not allowed_ids:
+            # Nothing matches the filter
+            return {key: [[] for _ in range(len(np.atleast_2d(query_embeddings)))] for key in RESULT_KEYS}
+        prefilter = allowed_ids is not None and (
+            len(allowed_ids) <= self.prefilter_max_candidates
+            or (isinstance(self.index, ChromaVectorIndex) and has_time_range(where))
+        )
+        if prefilter:
+            hits = self.index.search_exact(query_embeddings, n_results, allowed_ids)
+        elif isinstance(self.index, ChromaVectorIndex):
+            # Chroma searches and fetches records in one call
+            return self.collection.query(
+                query_embeddings=self.index.collection_embeddings(query_embeddings),
+                n_results=n_results,
+                where=where
+            )
+        else:
+            if where and allowed_ids is None:
+                allowed_ids = set(self.collection.get(where=where, include=[])["ids"])
+            hits = self.index.search(query_embeddings, n_results, allowed_ids=allowed_ids)
+        
+        hit_ids = list({chunk_id for query_hits in hits for chunk_id, _ in query_hits})
+        fetched = {"ids": [], "documents": [], "metadatas": []}
+        if hit_ids:
+            # An empty ID list would fetch the whole collection
+            fetched = self.collection.get(ids=hit_ids, include=["documents", "metadatas"])
+        records = {
+            chunk_id: (text, metadata)
+            for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+        }
+        results = {key: [] for key in RESULT_KEYS}
+        for query_hits in hits:
+            query_hits = [(chunk_id, distance) for chunk_id, distance in query_hits if chunk_id in records]
+            results["ids"].append([chunk_id for chunk_id, _ in query_hits])
+            results["documents"].append([records[chunk_id][0] for chunk_id, _ in query_hits])
+            results["metadatas"].append([records[chunk_id][1] for chunk_id, _ in query_hits])
+            results["distances"].append([distance for _, distance in query_hits])
+        return results
+    
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors for specific chunks"""
+        return self.index.get_vectors(ids)
+    
+    def load_index(self):
+        """Load the vector index so the first query doesn't pay for it"""
+        self.index.warm()
+    
+    def save(self):
+        """Persist state that isn't written through on every change"""
+        self.index.save()
+        if self.lexical_index is not None:
+            self.lexical_index.save()
+        if self.metadata_index is not None:
+            self.metadata_index.save()
+    
     def get_collection_stats(self) -> Dict:
         """Get statistics about the collection"""
-        return {
+        stats = {
             "total_chunks": self.collection.count(),
             "collection_name": self.collection.name
         }
+        stats["vector_index"] = self.index.get_stats()
+        if self.lexical_index is not None:
+            stats["lexical_index"] = self.lexical_index.get_stats()
+        if self.metadata_index is not None:
+            stats["metadata_index"] = self.metadata_index.get_stats()
+        return stats
@@ -0,0 +1,182 @@
+"""Snapshot and restore the DocuMind data stores.
+
+A snapshot is a .tar.gz holding the persistent Chroma directory (SQLite
+database and HNSW segments), the local vector index when a "numpy" or
+"ivfpq" backend is configured, the BM25 lexical index, the document
+registry and a manifest. The metadata index is not included; it is
+rebuilt from Chroma on the first startup after a restore.
+
+    python -m app.snapshot create backups/documind-2024-01-01.tar.gz
+    python -m app.snapshot restore backups/documind-2024-01-01.tar.gz
+
+With the default "chroma" backend, snapshots can be taken while the API
+is running: HNSW segment files are copied first and the SQLite database
+last through SQLite's online backup, so on restore Chroma replays any
+writes newer than the copied segments. The "numpy" and "ivfpq" index files
+are copied as they are on disk, and the running API only saves them
+periodically, so stop the API before snapshotting with those backends.
+Always stop the API before restoring.
+"""
+import argparse
+import json
+import shutil
+import sqlite3
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from app.config import get_settings
+
+CHROMA_DATABASE = "chroma.sqlite3"
+MANIFEST = "manifest.json"
+
+
+def create_snapshot(archive_path: str) -> dict:
+    """Write a snapshot of the configured data stores to archive_path"""
+    settings = get_settings()
+    chroma_dir = Path(settings.chroma_persist_directory)
+    if not (chroma_dir / CHROMA_DATABASE).exists():
+        raise FileNotFoundError(f"No Chroma database found in {chroma_dir}")
+
+    with tempfile.TemporaryDirectory() as staging:
+        staged_chroma = Path(staging) / "chroma"
+        shutil.copytree(chroma_dir, staged_chroma, ignore=shutil.ignore_patterns(f"{CHROMA_DATABASE}*"))
+
+        source = sqlite3.connect(chroma_dir / CHROMA_DATABASE)
+        target = sqlite3.connect(staged_chroma / CHROMA_DATABASE)
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+
+        vector_index = Path(settings.vector_index_directory)
+        has_vector_index = settings.vector_index_backend != "chroma" and vector_index.exists()
+        if has_vector_index:
+            shutil.copytree(vector_index, Path(staging) / "vector_index")
+
+        lexical_index = Path(settings.lexical_index_path)
+        if lexical_index.exists():
+            shutil.copy2(lexical_index, Path(staging) / "lexical_index.bin")
+
+        document_registry = Path(settings.document_registry_path)
+        if document_registry.exists():
+            source = sqlite3.connect(document_registry)
+            target = sqlite3.connect(Path(staging) / "documents.db")
+            with target:
+                source.backup(target)
+            source.close()
+            target.close()
+
+        manifest = {
+            "created_at": time.time(),
+            "embedding_model": settings.embedding_model,
+            "chunk_size": settings.chunk_size,
+            "chunk_overlap": settings.chunk_overlap,
+            "vector_index_backend": settings.vector_index_backend,
+            "vector_index": has_vector_index,
+            "lexical_index": lexical_index.exists(),
+            "document_registry": document_registry.exists()
+        }
+        (Path(staging) / MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+        Path(archive_path).parent.mkdir(parents=True, exist_ok=True)
+        with tarfile.open(archive_path, "w:gz") as archive:
+            for entry in sorted(Path(staging).iterdir()):
+                archive.add(entry, arcname=entry.name)
+    return manifest
+
+
+def restore_snapshot(archive_path: str, force: bool = False) -> dict:
+    """Replace the configured data stores with the contents of a snapshot
+
+    The current stores are moved aside with a .bak suffix rather than deleted.
+    """
+    settings = get_settings()
+    chroma_dir = Path(settings.chroma_persist_directory)
+    lexical_index = Path(settings.lexical_index_path)
+    metadata_index = Path(settings.metadata_index_path)
+    document_registry = Path(settings.document_registry_path)
+    if chroma_dir.exists() and any(chroma_dir.iterdir()) and not force:
+        raise FileExistsError(f"{chroma_dir} is not empty; pass --force to replace it")
+
+    with tempfile.TemporaryDirectory(dir=chroma_dir.parent if chroma_dir.parent.exists() else None) as staging:
+        with tarfile.open(archive_path, "r:gz") as archive:
+            for member in archive.getmembers():
+                # Snapshots only ever contain plain files and directories
+                if not (member.isfile() or member.isdir()) or member.name.startswith("/") or ".." in Path(member.name).parts:
+                    raise ValueError(f"Unexpected entry in snapshot: {member.name}")
+            archive.extractall(staging)
+
+        manifest = json.loads((Path(staging) / MANIFEST).read_text())
+        if manifest["embedding_model"] != settings.embedding_model:
+            print(
+                f"Warning: snapshot was built with {manifest['embedding_model']}, "
+                f"but the configured model is {settings.embedding_model}"
+            )
+
+        if chroma_dir.exists():
+            backup = chroma_dir.with_name(chroma_dir.name + ".bak")
+            shutil.rmtree(backup, ignore_errors=True)
+            chroma_dir.rename(backup)
+        chroma_dir.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(Path(staging) / "chroma"), str(chroma_dir))
+
+        if manifest.get("vector_index"):
+            vector_index = Path(settings.vector_index_directory)
+            if vector_index.exists():
+                backup = vector_index.with_name(vector_index.name + ".bak")
+                shutil.rmtree(backup, ignore_errors=True)
+                vector_index.rename(backup)
+            vector_index.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(Path(staging) / "vector_index"), str(vector_index))
+
+        # A missing lexical index is rebuilt from Chroma on the next startup
+        if lexical_index.exists():
+            lexical_index.rename(lexical_index.with_name(lexical_index.name + ".bak"))
+        if manifest.get("lexical_index"):
+            lexical_index.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(Path(staging) / "lexical_index.bin"), str(lexical_index))
+
+        # Likewise the metadata index, which snapshots don't carry
+        if metadata_index.exists():
+            metadata_index.rename(metadata_index.with_name(metadata_index.name + ".bak"))
+
+        # An empty registry is backfilled from Chroma (without content hashes)
+        if document_registry.exists():
+            for suffix in ("-wal", "-shm"):
+                Path(str(document_registry) + suffix).unlink(missing_ok=True)
+            document_registry.rename(document_registry.with_name(document_registry.name + ".bak"))
+        if manifest.get("document_registry"):
+            document_registry.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(Path(staging) / "documents.db"), str(document_registry))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="write a snapshot archive")
+    create.add_argument("archive")
+    restore = commands.add_parser("restore", help="restore a snapshot archive")
+    restore.add_argument("archive")
+    restore.add_argument("--force", action="store_true", help="replace existing data (kept as .bak)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "create":
+            if get_settings().vector_index_backend != "chroma":
+                print("Note: the API must be stopped while snapshotting a local vector index")
+            manifest = create_snapshot(args.archive)
+            print(f"Snapshot written to {args.archive}")
+        else:
+            manifest = restore_snapshot(args.archive, force=args.force)
+            print(f"Restored snapshot from {args.archive}")
+    except (FileNotFoundError, FileExistsError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Chunking throughput (chars/sec) and peak RSS per document type.
+
+Each document type is chunked in a fresh process so peak RSS is not
+inflated by earlier runs. Two modes are measured:
+
+* whole:  the full text as one string through DocumentChunker.chunk_document
+* stream: 1MB blocks through DocumentChunker.chunk_stream
+
+Corpora are synthetic: markdown docs, Python source, an application log
+(as plain text) and a JSON dump (as plain text).
+
+Run from backend/:
+
+    python benchmarks/chunking.py --size-mb 50
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.models.schemas import DocumentType
+from app.services.chunking import DocumentChunker
+
+BLOCK_SIZE = 1 << 20
+WORDS = "index query chunk vector cache embed document retrieval search token batch worker".split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+
+def markdown_blocks(rng: random.Random) -> Iterator[str]:
+    section = 0
+    while True:
+        section += 1
+        paragraphs = "\n\n".join(" ".join(_sentence(rng) for _ in range(5)) for _ in range(3))
+        yield f"## Section {section}\n\n{paragraphs}\n\n- {_sentence(rng)}\n- {_sentence(rng)}\n\n"
+
+
+def python_blocks(rng: random.Random) -> Iterator[str]:
+    n = 0
+    while True:
+        n += 1
+        body = "\n".join(f"        {rng.choice(WORDS)}_{i} = {rng.choice(WORDS)}(x, {i})" for i in range(8))
+        yield (
+            f"class Handler{n}:\n    \"\"\"{_sentence(rng)}\"\"\"\n\n"
+            f"    def handle_{rng.choice(WORDS)}(self, x):\n{body}\n        return x\n\n\n"
+        )
+
+
+def log_blocks(rng: random.Random) -> Iterator[str]:
+    n = 0
+    while True:
+        n += 1
+        level = rng.choice(["INFO", "INFO", "INFO", "WARN", "ERROR"])
+        yield f"2024-01-01T00:{n // 60 % 60:02d}:{n % 60:02d}Z {level} worker-{n % 8} {_sentence(rng)} id={n}\n"
+
+
+def json_blocks(rng: random.Random) -> Iterator[str]:
+    n = 0
+    yield "[\n"
+    while True:
+        n += 1
+        record = {"id": n, "type": rng.choice(WORDS), "tags": rng.sample(WORDS, 3), "text": _sentence(rng)}
+        yield json.dumps(record) + ",\n"
+
+
+CORPORA = {
+    "markdown": (DocumentType.MARKDOWN, markdown_blocks),
+    "python": (DocumentType.PYTHON, python_blocks),
+    "log": (DocumentType.TXT, log_blocks),
+    "json": (DocumentType.TXT, json_blocks),
+}
+
+
+def build_text(corpus: str, size: int, seed: int) -> str:
+    parts, total = [], 0
+    for piece in CORPORA[corpus][1](random.Random(seed)):
+        parts.append(piece)
+        total += len(piece)
+        if total >= size:
+            break
+    return "".join(parts)
+
+
+def run_one(corpus: str, mode: str, size: int, seed: int, chunk_size: int, chunk_overlap: int, results):
+    doc_type = CORPORA[corpus][0]
+    chunker = DocumentChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    text = build_text(corpus, size, seed)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if mode == "whole":
+        n_chunks = len(chunker.chunk_document(text, doc_type))
+    else:
+        blocks = (text[i:i + BLOCK_SIZE] for i in range(0, len(text), BLOCK_SIZE))
+        n_chunks = sum(1 for _ in chunker.chunk_stream(blocks, doc_type))
+    elapsed = time.perf_counter() - start
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        "corpus": corpus,
+        "mode": mode,
+        "chars": len(text),
+        "chunks": n_chunks,
+        "chars_per_sec": round(len(text) / elapsed),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "rss_growth_mb": round((peak_kb - baseline_kb) / 1024, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=50)
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA), choices=list(CORPORA))
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    report = []
+    for corpus in args.corpora:
+        for mode in ("whole", "stream"):
+            process = context.Process(
+                target=run_one,
+                args=(corpus, mode, int(args.size_mb * 1024 * 1024), args.seed,
+                      args.chunk_size, args.chunk_overlap, results)
+            )
+            process.start()
+            row: Dict = results.get()
+            process.join()
+            report.append(row)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Cold-start time of the persistent vector store, and a restart check.
+
+Builds a persistent Chroma store with N chunks of random unit vectors (no
+embedding model involved, so 1M chunks is practical), then reopens it in
+fresh processes and measures:
+
+* open_seconds:        VectorStoreService construction (client + collection)
+* first_query_seconds: the first query, which loads the HNSW segment
+* warm_query_ms:       median of later queries
+
+Each restarted process also queries with the stored vectors of sampled
+chunks and checks that they come back as their own nearest neighbour, so
+data written before the restart is proven searchable after it.
+
+Run from backend/:
+
+    python benchmarks/cold_start.py --chunks 1000000 --restarts 3
+"""
+import argparse
+import json
+import multiprocessing
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.vectorstore import VectorStoreService
+
+BATCH = 5000
+
+
+def vectors_for(start: int, count: int, dimension: int, seed: int) -> np.ndarray:
+    """Deterministic unit vectors for chunk numbers [start, start + count)"""
+    rng = np.random.default_rng(seed + start)
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(directory: str, n_chunks: int, dimension: int, seed: int) -> float:
+    vectorstore = VectorStoreService(directory)
+    start = time.perf_counter()
+    for offset in range(0, n_chunks, BATCH):
+        count = min(BATCH, n_chunks - offset)
+        vectors = vectors_for(offset, count, dimension, seed)
+        ids = [f"bench_{i}" for i in range(offset, offset + count)]
+        vectorstore.upsert_chunks(
+            ids,
+            [f"chunk {i}" for i in range(offset, offset + count)],
+            vectors,
+            [{"document_id": "bench", "chunk_index": i} for i in range(offset, offset + count)]
+        )
+        if offset and offset % 100000 == 0:
+            print(f"  {offset} chunks written", file=sys.stderr)
+    return time.perf_counter() - start
+
+
+def restart(directory: str, n_chunks: int, dimension: int, seed: int, samples: int, results):
+    start = time.perf_counter()
+    vectorstore = VectorStoreService(directory)
+    open_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed + 1)
+    sampled = sorted(rng.choice(n_chunks, size=min(samples, n_chunks), replace=False).tolist())
+    # Vectors are generated per write batch, so regenerate each sample from its batch's seed
+    queries = [vectors_for(i - i % BATCH, i % BATCH + 1, dimension, seed)[-1] for i in sampled]
+
+    start = time.perf_counter()
+    vectorstore.collection.query(query_embeddings=[queries[0].tolist()], n_results=1, include=[])
+    first_query_seconds = time.perf_counter() - start
+
+    found = 0
+    latencies = []
+    for chunk_number, query in zip(sampled, queries):
+        start = time.perf_counter()
+        hit = vectorstore.collection.query(query_embeddings=[query.tolist()], n_results=1, include=[])
+        latencies.append(time.perf_counter() - start)
+        found += hit["ids"][0][:1] == [f"bench_{chunk_number}"]
+
+    results.put({
+        "count": vectorstore.collection.count(),
+        "open_seconds": round(open_seconds, 3),
+        "first_query_seconds": round(first_query_seconds, 3),
+        "warm_query_ms": round(statistics.median(latencies) * 1000, 2),
+        "found_after_restart": f"{found}/{len(sampled)}"
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1000000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--restarts", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--directory", help="reuse (or keep) a store here instead of a temporary one")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        directory = args.directory or str(Path(workdir) / "chroma")
+        report = {"chunks": args.chunks, "dimension": args.dimension}
+
+        # Build in a child process too, so nothing stays cached in this one
+        context = multiprocessing.get_context("spawn")
+        existing = VectorStoreService(directory).collection.count() if args.directory else 0
+        if existing != args.chunks:
+            with context.Pool(1) as pool:
+                report["build_seconds"] = round(
+                    pool.apply(build, (directory, args.chunks, args.dimension, args.seed)), 1
+                )
+
+        results = context.Queue()
+        runs = []
+        for _ in range(args.restarts):
+            process = context.Process(
+                target=restart,
+                args=(directory, args.chunks, args.dimension, args.seed, args.samples, results)
+            )
+            process.start()
+            runs.append(results.get())
+            process.join()
+
+        report["restarts"] = runs
+        report["persisted"] = all(run["count"] == args.chunks for run in runs)
+        print(json.dumps(report, indent=2))
+        if not report["persisted"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
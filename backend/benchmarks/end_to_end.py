@@ -0,0 +1,469 @@
+"""End-to-end load test: upload, search and ask against a real API process.
+
+Generates a deterministic synthetic corpus of Markdown, Python and PDF
+files, starts the API (uvicorn, in a subprocess with all data stores in a
+temporary directory) against a stub Ollama server (fake_ollama.py) with a
+configurable token rate, then runs three phases at --concurrency:
+
+* upload: POST /documents/upload for every file, polling each job until
+  it finishes (upload_ms is the request, job_ms until the job completed)
+* search: --searches POST /search/semantic
+* ask:    --asks POST /search/ask
+
+For each phase it reports throughput and client-side p50/p95/p99 latency,
+and per-stage p50/p95/p99 estimated from the server's /metrics histograms
+(the difference between scrapes before and after the phase). The embedding
+model defaults to "hashing", a tiny deterministic stand-in, so runs are
+CPU-only and reproducible; pass --embedding-model to use a real one.
+
+Results are written as JSON to --output. With --baseline, the relative
+change of throughput and p95 against an earlier results file is added, to
+compare commits:
+
+Run from backend/:
+
+    python benchmarks/end_to_end.py --docs 60 --concurrency 8 --output e2e.json
+    git checkout other-branch
+    python benchmarks/end_to_end.py --docs 60 --concurrency 8 --baseline e2e.json
+
+or against an already running server (its own Ollama and model are used):
+
+    python benchmarks/end_to_end.py --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fake_ollama import FakeOllama
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+WORDS = (
+    "config database install server client request response cache index "
+    "query embedding vector chunk token model python deploy docker auth "
+    "session error timeout retry handler router schema field value worker "
+    "queue upload search filter metadata snapshot restore backup latency"
+).split()
+
+SAMPLE_LABELS = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# Synthetic corpus
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_markdown(rng: random.Random, sections: int) -> bytes:
+    lines = [f"# {sentence(rng, 4)}"]
+    for number in range(sections):
+        lines.append(f"\n## Section {number}: {rng.choice(WORDS)} {rng.choice(WORDS)}\n")
+        lines.extend(sentence(rng, rng.randint(12, 30)) for _ in range(rng.randint(3, 8)))
+        if rng.random() < 0.3:
+            lines.append(f"\n```bash\n{rng.choice(WORDS)} --{rng.choice(WORDS)} {rng.randint(1, 99)}\n```")
+    return "\n".join(lines).encode()
+
+
+def make_python(rng: random.Random, functions: int) -> bytes:
+    lines = [f'"""{sentence(rng, 8)}"""', "import os", ""]
+    for number in range(functions):
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{number}"
+        lines += [
+            "",
+            f"def {name}({rng.choice(WORDS)}, {rng.choice(WORDS)}=None):",
+            f'    """{sentence(rng, 10)}"""',
+            f"    {rng.choice(WORDS)} = os.environ.get(\"{rng.choice(WORDS).upper()}\", {rng.randint(0, 100)})",
+            f"    if {rng.choice(WORDS)} is None:",
+            f"        raise ValueError(\"{sentence(rng, 5)}\")",
+            f"    return {rng.choice(WORDS)}",
+        ]
+    return "\n".join(lines).encode()
+
+
+def make_pdf(rng: random.Random, pages: int) -> bytes:
+    """A minimal multi-page PDF with extractable Helvetica text"""
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for _ in range(pages):
+        text = " T* ".join(f"({escape(sentence(rng, 10))}) Tj" for _ in range(40))
+        stream = f"BT /F1 10 Tf 14 TL 50 780 Td {text} ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_corpus(docs: int, seed: int, pdf_pages: int) -> List[Tuple[str, bytes, str]]:
+    """(filename, content, content type) for docs files, cycling Markdown, Python and PDF"""
+    rng = random.Random(seed)
+    corpus = []
+    for number in range(docs):
+        kind = number % 3
+        if kind == 0:
+            corpus.append((f"guide_{number}.md", make_markdown(rng, rng.randint(4, 12)), "text/markdown"))
+        elif kind == 1:
+            corpus.append((f"module_{number}.py", make_python(rng, rng.randint(5, 20)), "text/x-python"))
+        else:
+            corpus.append((f"manual_{number}.pdf", make_pdf(rng, pdf_pages), "application/pdf"))
+    return corpus
+
+
+def make_queries(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed + 1)
+    return [f"how does the {rng.choice(WORDS)} {rng.choice(WORDS)} handle {rng.choice(WORDS)}" for _ in range(count)]
+
+
+# Metrics
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize_ms(seconds: List[float]) -> Dict:
+    return {
+        "count": len(seconds),
+        **{f"p{pct}_ms": round(percentile(seconds, pct) * 1000, 2) if seconds else None for pct in (50, 95, 99)}
+    }
+
+
+def parse_stage_buckets(text: str) -> Dict[Tuple[str, str], Dict[float, float]]:
+    """(stage, doc_type) -> {upper bound: cumulative count} from a /metrics scrape, summed over endpoints"""
+    buckets: Dict[Tuple[str, str], Dict[float, float]] = {}
+    for line in text.splitlines():
+        if not line.startswith("documind_stage_duration_seconds_bucket{"):
+            continue
+        labels_text, value = line[line.index("{") + 1:].rsplit("} ", 1)
+        labels = dict(SAMPLE_LABELS.findall(labels_text))
+        key = (labels["stage"], labels.get("doc_type", ""))
+        bound = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+        series = buckets.setdefault(key, {})
+        series[bound] = series.get(bound, 0.0) + float(value)
+    return buckets
+
+
+def histogram_quantile(quantile: float, buckets: Dict[float, float]) -> Optional[float]:
+    """Quantile of a cumulative histogram, interpolated within its bucket (like PromQL)"""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    if total <= 0:
+        return None
+    rank = quantile * total
+    lower_bound, lower_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def stage_latencies(before: str, after: str) -> Dict:
+    """Per-stage count and p50/p95/p99 of the observations made between two scrapes"""
+    start, end = parse_stage_buckets(before), parse_stage_buckets(after)
+    stages = {}
+    for (stage, doc_type), series in sorted(end.items()):
+        previous = start.get((stage, doc_type), {})
+        delta = {bound: count - previous.get(bound, 0.0) for bound, count in series.items()}
+        count = delta[max(delta)]
+        if count <= 0:
+            continue
+        stages[f"{stage}[{doc_type}]" if doc_type else stage] = {
+            "count": int(count),
+            **{
+                f"p{pct}_ms": round(histogram_quantile(pct / 100, delta) * 1000, 2)
+                for pct in (50, 95, 99)
+            }
+        }
+    return stages
+
+
+# Load phases
+
+async def run_concurrently(concurrency: int, items: List, worker) -> float:
+    """Run worker over items with at most concurrency in flight; returns wall seconds"""
+    queue = list(reversed(items))
+
+    async def loop():
+        while queue:
+            await worker(queue.pop())
+
+    start = time.perf_counter()
+    await asyncio.gather(*[loop() for _ in range(concurrency)])
+    return time.perf_counter() - start
+
+
+async def upload_phase(client: httpx.AsyncClient, corpus, concurrency: int, poll_interval: float) -> Dict:
+    upload_seconds: List[float] = []
+    job_seconds: List[float] = []
+    outcomes = {"completed": 0, "failed": 0, "duplicate": 0, "rejected": 0}
+    chunks = [0]
+
+    async def upload(item):
+        filename, content, content_type = item
+        start = time.perf_counter()
+        response = await client.post("/documents/upload", files={"file": (filename, content, content_type)})
+        upload_seconds.append(time.perf_counter() - start)
+        if response.status_code == 429:
+            outcomes["rejected"] += 1
+            return
+        response.raise_for_status()
+        job = response.json()
+        while job["status"] in ("queued", "running"):
+            await asyncio.sleep(poll_interval)
+            job = (await client.get(f"/documents/jobs/{job['job_id']}")).json()
+        job_seconds.append(time.perf_counter() - start)
+        if job["status"] != "completed":
+            outcomes["failed"] += 1
+            return
+        outcomes["duplicate" if job["result"].get("duplicate") else "completed"] += 1
+        chunks[0] += job["result"]["chunks_created"]
+
+    seconds = await run_concurrently(concurrency, corpus, upload)
+    return {
+        "seconds": round(seconds, 2),
+        "docs_per_second": round(len(corpus) / seconds, 2),
+        "chunks_per_second": round(chunks[0] / seconds, 1),
+        "bytes": sum(len(content) for _, content, _ in corpus),
+        "chunks": chunks[0],
+        **outcomes,
+        "upload": summarize_ms(upload_seconds),
+        "job": summarize_ms(job_seconds)
+    }
+
+
+async def request_phase(client: httpx.AsyncClient, path: str, payloads: List[Dict], concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def send(payload):
+        start = time.perf_counter()
+        response = await client.post(path, json=payload)
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    seconds = await run_concurrently(concurrency, payloads, send)
+    return {
+        "seconds": round(seconds, 2),
+        "requests_per_second": round(len(latencies) / seconds, 2),
+        "errors": errors,
+        **summarize_ms(latencies)
+    }
+
+
+async def run_phases(base_url: str, args, corpus) -> Dict:
+    queries = make_queries(max(args.searches, args.asks), args.seed)
+    phases = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=600.0) as client:
+        async def measured(name, phase):
+            before = (await client.get("/metrics")).text
+            phases[name] = await phase
+            phases[name]["stages"] = stage_latencies(before, (await client.get("/metrics")).text)
+
+        await measured("upload", upload_phase(client, corpus, args.concurrency, args.poll_ms / 1000))
+        if args.searches:
+            await measured("search", request_phase(
+                client, "/search/semantic",
+                [{"query": query, "top_k": args.top_k} for query in queries[:args.searches]],
+                args.concurrency
+            ))
+        if args.asks:
+            await measured("ask", request_phase(
+                client, "/search/ask",
+                [{"query": query, "top_k": args.top_k} for query in queries[:args.asks]],
+                args.concurrency
+            ))
+    return phases
+
+
+# Server management
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(data_dir: Path, args, ollama_url: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_PERSIST_DIRECTORY": str(data_dir / "chroma_db"),
+        "UPLOAD_DIRECTORY": str(data_dir / "uploads"),
+        "VECTOR_INDEX_DIRECTORY": str(data_dir / "vector_index"),
+        "EMBEDDING_CACHE_DIRECTORY": str(data_dir / "embedding_cache"),
+        "LEXICAL_INDEX_PATH": str(data_dir / "lexical_index" / "index.bin"),
+        "JOB_QUEUE_PATH": str(data_dir / "jobs" / "jobs.db"),
+        "METADATA_INDEX_PATH": str(data_dir / "metadata_index" / "index.json"),
+        "DOCUMENT_REGISTRY_PATH": str(data_dir / "registry" / "documents.db"),
+        "EMBEDDING_MODEL": args.embedding_model,
+        "OLLAMA_BASE_URL": ollama_url,
+        "OLLAMA_MODEL": "llama3.2:3b",
+        # Every ask should reach the (fake) LLM rather than the answer cache
+        "ANSWER_CACHE_ENABLED": "false",
+        "TRACE_REQUESTS": "false",
+        "LOG_LEVEL": "WARNING",
+    })
+    for override in args.env:
+        key, _, value = override.partition("=")
+        env[key] = value
+    return env
+
+
+def start_server(env: Dict[str, str], port: int, startup_timeout: float) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND,
+        env=env
+    )
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode} during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"API server did not become healthy within {startup_timeout:.0f}s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict, baseline: Dict) -> Dict:
+    """Relative change of throughput and p95 latency per phase (positive = more)"""
+    def change(new, old):
+        return round((new - old) / old, 3) if new is not None and old else None
+
+    changes = {}
+    for phase, result in report["phases"].items():
+        old = baseline.get("phases", {}).get(phase)
+        if old is None:
+            continue
+        if phase == "upload":
+            changes[phase] = {
+                "docs_per_second": change(result["docs_per_second"], old["docs_per_second"]),
+                "job_p95_ms": change(result["job"]["p95_ms"], old["job"]["p95_ms"])
+            }
+        else:
+            changes[phase] = {
+                "requests_per_second": change(result["requests_per_second"], old["requests_per_second"]),
+                "p95_ms": change(result["p95_ms"], old["p95_ms"])
+            }
+        changes[phase]["stages_p95_ms"] = {
+            stage: change(timing["p95_ms"], old["stages"][stage]["p95_ms"])
+            for stage, timing in result["stages"].items() if stage in old.get("stages", {})
+        }
+    return {"baseline_commit": baseline.get("commit"), "changes": changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="benchmark this running server instead of starting one")
+    parser.add_argument("--docs", type=int, default=60, help="synthetic files, a third each .md, .py and .pdf")
+    parser.add_argument("--pdf-pages", type=int, default=5)
+    parser.add_argument("--searches", type=int, default=500)
+    parser.add_argument("--asks", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--poll-ms", type=float, default=50.0, help="job status polling interval")
+    parser.add_argument("--embedding-model", default="hashing")
+    parser.add_argument("--ollama-tokens", type=int, default=64, help="tokens per fake answer")
+    parser.add_argument("--ollama-token-ms", type=float, default=5.0, help="fake generation time per token")
+    parser.add_argument("--ollama-prompt-ms", type=float, default=20.0, help="fake prompt evaluation time")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra setting for the started server, e.g. VECTOR_INDEX_BACKEND=numpy")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, args.seed, args.pdf_pages)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    }
+
+    if args.base_url:
+        report["phases"] = asyncio.run(run_phases(args.base_url, args, corpus))
+    else:
+        ollama = FakeOllama(
+            port=0, tokens=args.ollama_tokens, token_ms=args.ollama_token_ms, prompt_ms=args.ollama_prompt_ms
+        ).start()
+        with tempfile.TemporaryDirectory() as data_dir:
+            port = free_port()
+            start = time.perf_counter()
+            server = start_server(server_env(Path(data_dir), args, ollama.base_url), port, args.startup_timeout)
+            report["server_startup_seconds"] = round(time.perf_counter() - start, 2)
+            try:
+                report["phases"] = asyncio.run(run_phases(f"http://127.0.0.1:{port}", args, corpus))
+                report["server"] = httpx.get(f"http://127.0.0.1:{port}/health", timeout=10.0).json()
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+                ollama.stop()
+        report["fake_ollama"] = ollama.get_stats()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""A stub Ollama server for benchmarks: /api/tags and /api/chat, no model.
+
+/api/chat answers after a configurable prompt-eval delay plus a delay per
+generated token, streaming NDJSON when asked to, and reports
+prompt_eval_count (whitespace tokens of the messages) and eval_count like
+the real server. It counts requests and tracks the peak number of
+concurrent generations, so client-side concurrency limits can be checked.
+
+    python benchmarks/fake_ollama.py --port 11435 --tokens 64 --token-ms 5
+
+or in-process: server = FakeOllama(port=0).start(); ...; server.stop()
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+
+class FakeOllama:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 11435,
+        model: str = "llama3.2:3b",
+        tokens: int = 64,
+        token_ms: float = 5.0,
+        prompt_ms: float = 20.0
+    ):
+        self.model = model
+        self.tokens = tokens
+        self.token_seconds = token_ms / 1000
+        self.prompt_seconds = prompt_ms / 1000
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.active = 0
+        self.peak_active = 0
+        self.keep_alive_values = set()
+        # Set to end streams without the final done message, like a dropped connection
+        self.truncate_streams = False
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "peak_concurrent_generations": self.peak_active,
+                "keep_alive": sorted(self.keep_alive_values)
+            }
+
+    def _count(self, path: str):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, body: Dict):
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                fake._count(self.path)
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": fake.model}]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                fake._count(self.path)
+                if self.path != "/api/chat":
+                    self.send_error(404)
+                    return
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt_tokens = sum(len(m["content"].split()) for m in request["messages"])
+                with fake._lock:
+                    fake.active += 1
+                    fake.peak_active = max(fake.peak_active, fake.active)
+                    if "keep_alive" in request:
+                        fake.keep_alive_values.add(str(request["keep_alive"]))
+                try:
+                    time.sleep(fake.prompt_seconds)
+                    final = {"done": True, "prompt_eval_count": prompt_tokens, "eval_count": fake.tokens}
+                    if not request.get("stream", True):
+                        time.sleep(fake.token_seconds * fake.tokens)
+                        self._send_json({
+                            "message": {"role": "assistant", "content": " ".join(["word"] * fake.tokens)},
+                            **final
+                        })
+                        return
+
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for i in range(fake.tokens):
+                        time.sleep(fake.token_seconds)
+                        self._write_chunk({"message": {"role": "assistant", "content": "word "}, "done": False})
+                    if not fake.truncate_streams:
+                        self._write_chunk({"message": {"role": "assistant", "content": ""}, **final})
+                    self.wfile.write(b"0\r\n\r\n")
+                finally:
+                    with fake._lock:
+                        fake.active -= 1
+
+            def _write_chunk(self, body: Dict):
+                line = (json.dumps(body) + "\n").encode()
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default="llama3.2:3b")
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--prompt-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server = FakeOllama(args.host, args.port, args.model, args.tokens, args.token_ms, args.prompt_ms)
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
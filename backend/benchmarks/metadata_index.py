@@ -0,0 +1,194 @@
+"""Filter resolution and document lookups with the metadata index at scale.
+
+Builds a MetadataIndex over --chunks synthetic chunks (--chunks-per-doc per
+document, a handful of doc types, upload times spread over a year) and
+times, per filter, resolving it to chunk IDs through the index against a
+linear scan over every chunk's metadata (what a post-filtered metadata
+scan costs). Also times per-document stats, the per-type summary and a
+save/load round trip.
+
+With --vectors > 0 it then builds a NumpyVectorIndex and compares, for a
+one-document filter, the masked search over the whole index with the
+pre-filtered exact search over just the candidate chunks that
+VectorStoreService uses for small candidate sets.
+
+Run from backend/:
+
+    python benchmarks/metadata_index.py --chunks 1000000 --vectors 200000
+"""
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.vector_index import make_vectors
+from app.services.metadata_index import MetadataIndex, to_timestamp
+from app.services.vectorstore import NumpyVectorIndex
+
+DOC_TYPES = ["markdown", "pdf", "python", "txt", "typescript", "java"]
+START = datetime(2024, 1, 1)
+BATCH = 5000
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_metadata(chunks: int, chunks_per_doc: int, seed: int) -> Tuple[List[str], List[Dict]]:
+    rng = np.random.default_rng(seed)
+    ids, metadatas = [], []
+    documents = (chunks + chunks_per_doc - 1) // chunks_per_doc
+    doc_types = rng.integers(0, len(DOC_TYPES), documents)
+    offsets = np.sort(rng.uniform(0, 365 * 86400, documents))
+    for i in range(chunks):
+        doc = i // chunks_per_doc
+        ids.append(f"doc{doc}_{i % chunks_per_doc}")
+        metadatas.append({
+            "document_id": f"doc{doc}",
+            "filename": f"dir{doc % 100}/file{doc}.{DOC_TYPES[doc_types[doc]]}",
+            "doc_type": DOC_TYPES[doc_types[doc]],
+            "chunk_index": i % chunks_per_doc,
+            "upload_time": (START + timedelta(seconds=float(offsets[doc]))).isoformat()
+        })
+    return ids, metadatas
+
+
+def scan(ids: List[str], metadatas: List[Dict], predicate) -> set:
+    return {chunk_id for chunk_id, metadata in zip(ids, metadatas) if predicate(metadata)}
+
+
+def timed(fn, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1000000)
+    parser.add_argument("--chunks-per-doc", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ids, metadatas = make_metadata(args.chunks, args.chunks_per_doc, args.seed)
+    documents = (args.chunks + args.chunks_per_doc - 1) // args.chunks_per_doc
+    recent = (START + timedelta(days=362)).isoformat()
+    recent_ts = to_timestamp(recent)
+    filename = metadatas[42 * args.chunks_per_doc]["filename"]
+    some_docs = [f"doc{d}" for d in range(0, documents, max(documents // 10, 1))][:10]
+    filters = {
+        "document_id": (
+            {"document_id": "doc42"},
+            lambda m: m["document_id"] == "doc42"
+        ),
+        "filename": (
+            {"filename": filename},
+            lambda m: m["filename"] == filename
+        ),
+        "document_id $in 10": (
+            {"document_id": {"$in": some_docs}},
+            lambda m: m["document_id"] in some_docs
+        ),
+        "doc_type": (
+            {"doc_type": "pdf"},
+            lambda m: m["doc_type"] == "pdf"
+        ),
+        "upload_time last 3 days": (
+            {"upload_time": {"$gte": recent}},
+            lambda m: to_timestamp(m["upload_time"]) >= recent_ts
+        ),
+        "doc_type and upload_time": (
+            {"$and": [{"doc_type": "python"}, {"upload_time": {"$gte": recent}}]},
+            lambda m: m["doc_type"] == "python" and to_timestamp(m["upload_time"]) >= recent_ts
+        ),
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        rss_before = rss_mb()
+        index = MetadataIndex(str(Path(workdir) / "index.json"), persist_interval=float("inf"))
+        start = time.perf_counter()
+        for offset in range(0, len(ids), BATCH):
+            index.add(ids[offset:offset + BATCH], metadatas[offset:offset + BATCH])
+        build_seconds = time.perf_counter() - start
+        index.resolve({"upload_time": {"$gte": recent}})  # sort upload times once
+        rss_after = rss_mb()
+
+        results = []
+        for name, (where, predicate) in filters.items():
+            index_seconds, matched = timed(lambda: index.resolve(where), args.repeat)
+            scan_seconds, expected = timed(lambda: scan(ids, metadatas, predicate), max(args.repeat // 10, 1))
+            results.append({
+                "filter": name,
+                "matches": len(matched),
+                "correct": matched == expected,
+                "index_ms": round(index_seconds * 1000, 3),
+                "scan_ms": round(scan_seconds * 1000, 1),
+                "speedup": round(scan_seconds / index_seconds, 1)
+            })
+
+        stats_seconds, _ = timed(lambda: index.document_stats("doc42"), args.repeat)
+        summary_seconds, _ = timed(index.summary, args.repeat)
+        start = time.perf_counter()
+        index.save()
+        save_seconds = time.perf_counter() - start
+        reloaded = MetadataIndex(str(Path(workdir) / "index.json"))
+        start = time.perf_counter()
+        reloaded.load()
+        load_seconds = time.perf_counter() - start
+        disk_bytes = index.get_stats()["disk_bytes"]
+
+    report = {
+        "chunks": args.chunks,
+        "documents": documents,
+        "build_seconds": round(build_seconds, 2),
+        "index_rss_mb": round(rss_after - rss_before, 1),
+        "disk_mb": round(disk_bytes / 1024 / 1024, 1),
+        "save_seconds": round(save_seconds, 2),
+        "load_seconds": round(load_seconds, 2),
+        "document_stats_ms": round(stats_seconds * 1000, 3),
+        "summary_ms": round(summary_seconds * 1000, 2),
+        "filters": results
+    }
+
+    if args.vectors:
+        del metadatas
+        corpus = make_vectors(args.vectors, args.dimension, topics=200, spread=0.6, seed=args.seed)
+        queries = make_vectors(args.repeat, args.dimension, topics=200, spread=0.6, seed=args.seed + 1)
+        with tempfile.TemporaryDirectory() as workdir:
+            vectors = NumpyVectorIndex(workdir, persist_interval=float("inf"))
+            for offset in range(0, args.vectors, BATCH):
+                vectors.add(ids[offset:offset + BATCH], corpus[offset:offset + BATCH])
+            candidates = index.resolve({"document_id": "doc42"})
+            masked_seconds, masked = timed(
+                lambda: [vectors.search(query[None, :], args.top_k, allowed_ids=candidates)[0] for query in queries], 1
+            )
+            exact_seconds, exact = timed(
+                lambda: [vectors.search_exact(query[None, :], args.top_k, candidates)[0] for query in queries], 1
+            )
+        report["prefiltered_search"] = {
+            "vectors": args.vectors,
+            "candidates": len(candidates),
+            "same_results": [[c for c, _ in hits] for hits in masked] == [[c for c, _ in hits] for hits in exact],
+            "masked_full_index_ms": round(masked_seconds / len(queries) * 1000, 3),
+            "prefiltered_ms": round(exact_seconds / len(queries) * 1000, 3)
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Concurrency limiting, queueing and health caching of OllamaService.
+
+Starts the stub server from benchmarks/fake_ollama.py and fires
+--requests concurrent generations (half streamed) through one
+OllamaService, then calls check_health --health-calls times. Reports
+latency, the peak number of generations the server saw at once (must not
+exceed --max-concurrency), requests rejected or timed out in the queue,
+how many /api/tags round-trips the health checks cost, and the keep_alive
+the server received.
+
+Run from backend/:
+
+    python benchmarks/ollama_client.py --requests 64 --max-concurrency 2
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fake_ollama import FakeOllama
+from app.services.ollama_service import OllamaBusyError, OllamaService
+
+CONTEXT = [{"filename": "guide.md", "chunk_index": 0, "text": "Retries back off exponentially. " * 20}]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def one_request(service: OllamaService, i: int) -> float:
+    start = time.perf_counter()
+    if i % 2:
+        async for _ in service.stream_response(f"question {i}", CONTEXT):
+            pass
+    else:
+        await service.generate_response(f"question {i}", CONTEXT)
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--max-concurrency", type=int, default=2)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--queue-timeout", type=float, default=30.0)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--token-ms", type=float, default=2.0)
+    parser.add_argument("--health-calls", type=int, default=1000)
+    args = parser.parse_args()
+
+    server = FakeOllama(port=0, tokens=args.tokens, token_ms=args.token_ms).start()
+    service = OllamaService(
+        base_url=server.base_url,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        queue_timeout=args.queue_timeout
+    )
+    await service.start()
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(one_request(service, i) for i in range(args.requests)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    latencies = [o for o in outcomes if isinstance(o, float)]
+    busy = sum(isinstance(o, OllamaBusyError) for o in outcomes)
+    errors = [str(o) for o in outcomes if isinstance(o, Exception) and not isinstance(o, OllamaBusyError)]
+
+    tags_before = server.get_stats()["requests"].get("/api/tags", 0)
+    health_start = time.perf_counter()
+    for _ in range(args.health_calls):
+        await service.check_health()
+    health_seconds = time.perf_counter() - health_start
+
+    server_stats = server.get_stats()
+    report = {
+        "requests": args.requests,
+        "max_concurrency": args.max_concurrency,
+        "completed": len(latencies),
+        "rejected_busy": busy,
+        "errors": errors[:5],
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        "server_peak_concurrent": server_stats["peak_concurrent_generations"],
+        "concurrency_respected": server_stats["peak_concurrent_generations"] <= args.max_concurrency,
+        "health_calls": args.health_calls,
+        "health_round_trips": server_stats["requests"].get("/api/tags", 0) - tags_before,
+        "health_call_us": round(health_seconds / args.health_calls * 1e6, 2),
+        "keep_alive_sent": server_stats["keep_alive"],
+        "client": service.get_stats()
+    }
+    await service.close()
+    server.stop()
+
+    print(json.dumps(report, indent=2))
+    if not report["concurrency_respected"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,147 @@
+"""Prompt tokens saved by cross-encoder reranking in ask_question.
+
+Uses the synthetic identifier corpus of benchmarks/retrieval_modes.py:
+each query ("what does ERR_04821 do?") has exactly one chunk that answers
+it. For every query, rerank_candidates chunks are retrieved densely and
+ranked twice, in vector order and in cross-encoder order. For each order
+the report gives:
+
+* recall@k for a few context sizes k
+* k_needed: the smallest context size whose recall reaches --target-recall
+* prompt_tokens: mean size of the ask_question prompt with k_needed
+  chunks (OllamaService.build_messages, counted with the embedding model's
+  tokenizer, a close proxy for the LLM's)
+
+and, for reranking, its latency and how many requests fell back to vector
+order under --budget-ms.
+
+Run from backend/:
+
+    python benchmarks/rerank.py --chunks 5000 --queries 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.retrieval_modes import build_corpus, percentile
+from app.services.embedding import EmbeddingService
+from app.services.ollama_service import OllamaService
+from app.services.reranker import CrossEncoderReranker
+from app.services.search_service import SearchService
+from app.services.vectorstore import VectorStoreService
+
+
+def recall_at(ranks: List[int], k: int) -> float:
+    return sum(1 for rank in ranks if rank < k) / len(ranks)
+
+
+def prompt_tokens(tokenizer, ollama: OllamaService, query: str, chunks: List[Dict]) -> int:
+    messages = ollama.build_messages(query, chunks)
+    return sum(len(tokenizer(message["content"])["input_ids"]) for message in messages)
+
+
+def summarize(name: str, rankings: List[Dict], args, tokenizer, ollama: OllamaService) -> Dict:
+    ranks = [r["rank"] for r in rankings]
+    k_needed = next(
+        (k for k in range(1, args.candidates + 1) if recall_at(ranks, k) >= args.target_recall),
+        args.candidates
+    )
+    tokens = [prompt_tokens(tokenizer, ollama, r["query"], r["results"][:k_needed]) for r in rankings]
+    return {
+        "order": name,
+        **{f"recall@{k}": round(recall_at(ranks, k), 4) for k in (1, 3, 5, 10) if k <= args.candidates},
+        "k_needed": k_needed,
+        "prompt_tokens": round(statistics.mean(tokens), 1)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=20, help="rerank_candidates")
+    parser.add_argument("--target-recall", type=float, default=0.9)
+    parser.add_argument("--budget-ms", type=float, default=300)
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    chunks, identifiers, _ = build_corpus(args.chunks, args.seed)
+    ids = [f"bench_{i}" for i in range(len(chunks))]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        vectorstore = VectorStoreService(str(Path(workdir) / "chroma"))
+        embedding_service = EmbeddingService(args.embedding_model)
+        embeddings = embedding_service.generate_embeddings(chunks)
+        for start in range(0, len(chunks), 1000):
+            end = start + 1000
+            vectorstore.add_chunks(
+                chunks=chunks[start:end],
+                embeddings=embeddings[start:end],
+                document_id="bench",
+                filename="bench.md",
+                doc_type="markdown",
+                chunk_ids=ids[start:end],
+                chunk_indices=list(range(start, min(end, len(chunks))))
+            )
+
+        ollama = OllamaService()
+        service = SearchService(
+            vectorstore,
+            embedding_service,
+            ollama,
+            reranker=CrossEncoderReranker(args.rerank_model)
+        )
+        service.rerank_candidates = args.candidates
+        service.rerank_budget = args.budget_ms / 1000
+
+        rng = random.Random(args.seed + 1)
+        vector_rankings, reranked_rankings = [], []
+        latencies, fallbacks = [], 0
+        for i in rng.sample(range(len(chunks)), min(args.queries, len(chunks))):
+            query = f"what does {identifiers[i]} do?"
+            candidates = await service.search(query, top_k=args.candidates, rerank=False)
+
+            start = time.perf_counter()
+            reranked = await service._rerank(query, candidates, args.candidates)
+            latencies.append(time.perf_counter() - start)
+            fallbacks += "rerank_score" not in reranked[0]
+
+            for rankings, results in ((vector_rankings, candidates), (reranked_rankings, reranked)):
+                found = [r["chunk_id"] for r in results]
+                rank = found.index(ids[i]) if ids[i] in found else args.candidates
+                rankings.append({"query": query, "results": results, "rank": rank})
+
+        tokenizer = embedding_service.model.tokenizer
+        vector = summarize("vector", vector_rankings, args, tokenizer, ollama)
+        reranked = summarize("reranked", reranked_rankings, args, tokenizer, ollama)
+        report = {
+            "chunks": len(chunks),
+            "queries": len(latencies),
+            "candidates": args.candidates,
+            "target_recall": args.target_recall,
+            "vector": vector,
+            "reranked": reranked,
+            "prompt_tokens_saved_pct": round(100 * (1 - reranked["prompt_tokens"] / vector["prompt_tokens"]), 1),
+            "rerank_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "rerank_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "rerank_fallbacks": fallbacks,
+            "reranker": service.reranker.get_stats()
+        }
+        service.executors.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""Latency and recall@k of dense, sparse and hybrid retrieval.
+
+Builds a synthetic corpus in a temporary Chroma store: every chunk is
+prose about one topic plus a unique identifier (a function name, an error
+code or a config key). Two query sets are run against each mode:
+
+* identifier queries ("what does ERR_4821 mean?") whose answer is the one
+  chunk containing that identifier, and
+* topic queries whose answers are all chunks about that topic.
+
+Run from backend/:
+
+    python benchmarks/retrieval_modes.py --chunks 5000 --queries 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.embedding import EmbeddingService
+from app.services.lexical_index import LexicalIndex
+from app.services.ollama_service import OllamaService
+from app.services.search_service import SearchService
+from app.services.vectorstore import VectorStoreService
+
+TOPICS = {
+    "database": "connection pool migrations schema postgres transactions replicas",
+    "deployment": "docker container image registry rollout kubernetes helm",
+    "authentication": "login token session oauth password credentials expiry",
+    "caching": "redis eviction ttl invalidation warm cold hit ratio",
+    "logging": "structured logs levels handlers rotation tracing spans",
+    "networking": "proxy dns tls certificates ports firewall latency",
+}
+FILLER = "the service uses this setting when it starts and documents the behaviour below".split()
+
+
+def make_identifier(rng: random.Random, i: int) -> str:
+    kind = i % 3
+    if kind == 0:
+        return f"handle{rng.choice(['Request', 'Upload', 'Retry', 'Flush'])}{i}"
+    if kind == 1:
+        return f"ERR_{i:05d}"
+    return f"{rng.choice(['max', 'min', 'default'])}_{rng.choice(['pool', 'cache', 'batch'])}_size_{i}"
+
+
+def build_corpus(n_chunks: int, seed: int):
+    rng = random.Random(seed)
+    chunks, identifiers, topics = [], [], []
+    topic_names = list(TOPICS)
+    for i in range(n_chunks):
+        topic = topic_names[i % len(topic_names)]
+        words = TOPICS[topic].split()
+        body = " ".join(rng.choice(words + FILLER) for _ in range(80))
+        identifier = make_identifier(rng, i)
+        chunks.append(f"{body} See {identifier} for details. {body[:200]}")
+        identifiers.append(identifier)
+        topics.append(topic)
+    return chunks, identifiers, topics
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_mode(service: SearchService, mode: str, queries: List[Dict], top_k: int) -> Dict:
+    latencies, recalls = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = await service.search(query["text"], top_k=top_k, mode=mode)
+        latencies.append(time.perf_counter() - start)
+        found = {r["chunk_id"] for r in results}
+        relevant = query["relevant"]
+        recalls.append(len(found & relevant) / min(len(relevant), top_k))
+    return {
+        f"recall@{top_k}": round(statistics.mean(recalls), 4),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    chunks, identifiers, topics = build_corpus(args.chunks, args.seed)
+    ids = [f"bench_{i}" for i in range(len(chunks))]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        vectorstore = VectorStoreService(
+            str(Path(workdir) / "chroma"),
+            lexical_index=LexicalIndex(str(Path(workdir) / "lexical.bin"))
+        )
+        embedding_service = EmbeddingService(args.embedding_model)
+        embeddings = embedding_service.generate_embeddings(chunks)
+        for start in range(0, len(chunks), 1000):
+            end = start + 1000
+            vectorstore.add_chunks(
+                chunks=chunks[start:end],
+                embeddings=embeddings[start:end],
+                document_id="bench",
+                filename="bench.md",
+                doc_type="markdown",
+                chunk_ids=ids[start:end],
+                chunk_indices=list(range(start, min(end, len(chunks))))
+            )
+
+        service = SearchService(vectorstore, embedding_service, OllamaService())
+        rng = random.Random(args.seed + 1)
+        by_topic: Dict[str, set] = {}
+        for chunk_id, topic in zip(ids, topics):
+            by_topic.setdefault(topic, set()).add(chunk_id)
+
+        identifier_queries = [
+            {"text": f"what does {identifiers[i]} do?", "relevant": {ids[i]}}
+            for i in rng.sample(range(len(chunks)), min(args.queries, len(chunks)))
+        ]
+        topic_queries = [
+            {"text": f"how do I configure {topic}: {TOPICS[topic]}", "relevant": by_topic[topic]}
+            for topic in (rng.choice(list(TOPICS)) for _ in range(args.queries))
+        ]
+
+        report = {"chunks": len(chunks), "top_k": args.top_k}
+        for mode in ("dense", "sparse", "hybrid"):
+            report[mode] = {
+                "identifier_queries": await run_mode(service, mode, identifier_queries, args.top_k),
+                "topic_queries": await run_mode(service, mode, topic_queries, args.top_k),
+            }
+        service.executors.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""Search latency while bulk uploads are running.
+
+Measures /search/semantic latency on an idle server, then again while a
+number of concurrent uploaders push synthetic documents. With the CPU-bound
+stages off the event loop the p99 of the second phase should stay close to
+the first.
+
+Start the API first (uvicorn app.main:app --port 8000), then run:
+
+    python benchmarks/search_under_ingest.py --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import List
+
+import httpx
+
+WORDS = (
+    "config database install server client request response cache index "
+    "query embedding vector chunk token model python deploy docker auth "
+    "session error timeout retry handler router schema field value"
+).split()
+
+QUERIES = [
+    "how to configure the database",
+    "what does the retry handler do",
+    "docker deployment steps",
+    "authentication session timeout",
+    "how are embeddings cached",
+]
+
+
+def make_document(paragraphs: int) -> str:
+    rng = random.Random()
+    lines = [f"# Synthetic document {rng.randint(0, 1_000_000)}"]
+    for _ in range(paragraphs):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(120)))
+    return "\n\n".join(lines)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies: List[float]) -> dict:
+    if not latencies:
+        return {"count": 0}
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+    }
+
+
+async def search_loop(client: httpx.AsyncClient, duration: float, latencies: List[float], rejected: List[int]):
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post(
+            "/search/semantic",
+            json={"query": random.choice(QUERIES), "top_k": 5}
+        )
+        if response.status_code == 429:
+            rejected[0] += 1
+            continue
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def upload_loop(client: httpx.AsyncClient, stop: asyncio.Event, paragraphs: int, counts: List[int]):
+    while not stop.is_set():
+        content = make_document(paragraphs).encode()
+        response = await client.post(
+            "/documents/upload",
+            files={"file": (f"bench-{time.time_ns()}.md", content, "text/markdown")}
+        )
+        if response.status_code == 429:
+            counts[1] += 1
+            await asyncio.sleep(0.1)
+        else:
+            counts[0] += 1
+
+
+async def run_phase(client, args, with_uploads: bool) -> dict:
+    latencies: List[float] = []
+    rejected = [0]
+    stop = asyncio.Event()
+    upload_counts = [0, 0]
+    uploaders = []
+    if with_uploads:
+        uploaders = [
+            asyncio.create_task(upload_loop(client, stop, args.paragraphs, upload_counts))
+            for _ in range(args.uploaders)
+        ]
+        # Let the upload stream reach steady state before measuring
+        await asyncio.sleep(1.0)
+
+    await asyncio.gather(*[
+        search_loop(client, args.duration, latencies, rejected)
+        for _ in range(args.searchers)
+    ])
+
+    stop.set()
+    await asyncio.gather(*uploaders)
+
+    result = summarize(latencies)
+    result["search_rejected"] = rejected[0]
+    if with_uploads:
+        result["uploads_completed"] = upload_counts[0]
+        result["uploads_rejected"] = upload_counts[1]
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per phase")
+    parser.add_argument("--searchers", type=int, default=8)
+    parser.add_argument("--uploaders", type=int, default=4)
+    parser.add_argument("--paragraphs", type=int, default=200, help="paragraphs per uploaded document")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=300.0) as client:
+        # Make sure there is something to search
+        await client.post(
+            "/documents/upload",
+            files={"file": ("seed.md", make_document(20).encode(), "text/markdown")}
+        )
+        idle = await run_phase(client, args, with_uploads=False)
+        loaded = await run_phase(client, args, with_uploads=True)
+
+    print(json.dumps({"idle": idle, "during_uploads": loaded}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
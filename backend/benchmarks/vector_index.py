@@ -0,0 +1,138 @@
+"""Recall, QPS and RAM of the vector index backends.
+
+Vectors are synthetic but shaped like MiniLM embeddings: 384-d, unit
+length, drawn around a few hundred topic centres so neighbourhoods are
+meaningful. Ground truth is exact cosine top-k. Each backend is built and
+queried in a fresh process; RAM is the growth in resident memory from
+before the index is opened to after all queries ran.
+
+Run from backend/:
+
+    python benchmarks/vector_index.py --vectors 200000 --queries 500
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.vectorstore import VectorStoreService, normalize_rows, top_k_rows
+
+BATCH = 5000
+
+
+def make_vectors(count: int, dimension: int, topics: int, spread: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = np.random.default_rng(0).standard_normal((topics, dimension))
+    vectors = centres[rng.integers(0, topics, count)] + spread * rng.standard_normal((count, dimension))
+    return normalize_rows(vectors)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(corpus), 65536):
+        scores = queries @ corpus[start:start + 65536].T
+        columns, scores = top_k_rows(scores, k)
+        rows = np.concatenate([best_rows, columns + start], axis=1)
+        merged = np.concatenate([best_scores, scores], axis=1)
+        columns, best_scores = top_k_rows(merged, k)
+        best_rows = np.take_along_axis(rows, columns, axis=1)
+    return best_rows
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux)"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_backend(backend: str, args, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, results):
+    with tempfile.TemporaryDirectory() as workdir:
+        baseline = rss_mb()
+        options = {}
+        if backend == "ivfpq":
+            options = dict(
+                nlist=args.nlist, nprobe=args.nprobe,
+                pq_subquantizers=args.subquantizers, train_size=args.train_size
+            )
+        vectorstore = VectorStoreService(
+            str(Path(workdir) / "chroma"),
+            index_backend=backend,
+            index_directory=str(Path(workdir) / "index"),
+            **options
+        )
+
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), BATCH):
+            ids = [str(i) for i in range(offset, min(offset + BATCH, len(corpus)))]
+            vectorstore.upsert_chunks(ids, [""] * len(ids), corpus[offset:offset + BATCH], [{"n": 0}] * len(ids))
+        vectorstore.index.wait_for_training()
+        vectorstore.index.save()
+        build_seconds = time.perf_counter() - start
+        # The corpus array itself is shared input, not index memory
+        del corpus
+
+        hits = []
+        start = time.perf_counter()
+        for query in queries:
+            hits.append(vectorstore.index.search(query[None, :], args.top_k)[0])
+        elapsed = time.perf_counter() - start
+
+        recall = np.mean([
+            len({int(chunk_id) for chunk_id, _ in query_hits} & set(expected.tolist())) / args.top_k
+            for query_hits, expected in zip(hits, truth)
+        ])
+        results.put({
+            "backend": backend,
+            f"recall@{args.top_k}": round(float(recall), 4),
+            "qps": round(len(queries) / elapsed, 1),
+            "build_seconds": round(build_seconds, 1),
+            "rss_growth_mb": round(rss_mb() - baseline, 1),
+            "index": vectorstore.index.get_stats()
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=0.6, help="noise around each topic centre")
+    parser.add_argument("--backends", nargs="+", default=["numpy", "ivfpq", "chroma"])
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--subquantizers", type=int, default=48)
+    parser.add_argument("--train-size", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = make_vectors(args.vectors, args.dimension, args.topics, args.spread, args.seed)
+    queries = make_vectors(args.queries, args.dimension, args.topics, args.spread, args.seed + 1)
+    truth = exact_top_k(corpus, queries, args.top_k)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    report = {"vectors": args.vectors, "dimension": args.dimension, "queries": args.queries, "backends": []}
+    for backend in args.backends:
+        process = context.Process(target=run_backend, args=(backend, args, corpus, queries, truth, results))
+        process.start()
+        report["backends"].append(results.get())
+        process.join()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
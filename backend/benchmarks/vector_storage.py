@@ -0,0 +1,117 @@
+"""Memory per chunk and recall loss of the compressed vector storage modes.
+
+Builds each configuration directly on the local index classes (no Chroma
+involved) over the same synthetic MiniLM-shaped corpus used by
+benchmarks/vector_index.py, and compares against exact float32 search:
+
+* float32:       NumpyVectorIndex, the baseline (recall 1.0)
+* int8:          NumpyVectorIndex(storage="int8"), codes only
+* int8+rescore:  int8 codes, top_k * rescore_factor re-ranked in float32
+* ivfpq:         IvfPqVectorIndex, PQ codes only
+* ivfpq+rescore: PQ shortlist re-ranked in float32
+
+bytes_per_chunk is what the scan keeps resident; the float32 file used for
+rescoring stays memory-mapped and only the shortlisted rows are paged in.
+recall_loss is 1 - recall@k against exact search.
+
+Run from backend/:
+
+    python benchmarks/vector_storage.py --vectors 200000 --queries 500
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.vector_index import exact_top_k, make_vectors
+from app.services.vectorstore import IvfPqVectorIndex, NumpyVectorIndex
+
+BATCH = 5000
+
+
+def build_index(name: str, directory: str, args):
+    rescore_factor = args.rescore_factor if name.endswith("+rescore") else 0
+    if name.startswith("ivfpq"):
+        return IvfPqVectorIndex(
+            directory,
+            nlist=args.nlist,
+            nprobe=args.nprobe,
+            pq_subquantizers=args.subquantizers,
+            train_size=min(args.train_size, args.vectors),
+            rescore_factor=rescore_factor
+        )
+    storage = "float32" if name == "float32" else "int8"
+    return NumpyVectorIndex(directory, storage=storage, rescore_factor=rescore_factor)
+
+
+def run(name: str, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        index = build_index(name, workdir, args)
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), BATCH):
+            ids = [str(i) for i in range(offset, min(offset + BATCH, len(corpus)))]
+            index.add(ids, corpus[offset:offset + BATCH])
+        index.wait_for_training()
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits = [index.search(query[None, :], args.top_k)[0] for query in queries]
+        elapsed = time.perf_counter() - start
+
+        recall = np.mean([
+            len({int(chunk_id) for chunk_id, _ in query_hits} & set(expected.tolist())) / args.top_k
+            for query_hits, expected in zip(hits, truth)
+        ])
+        stats = index.get_stats()
+        return {
+            "mode": name,
+            "bytes_per_chunk": round(stats["ram_bytes"] / index.count(), 1),
+            f"recall@{args.top_k}": round(float(recall), 4),
+            "recall_loss": round(1 - float(recall), 4),
+            "qps": round(len(queries) / elapsed, 1),
+            "build_seconds": round(build_seconds, 1)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=0.6, help="noise around each topic centre")
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument(
+        "--modes", nargs="+",
+        default=["float32", "int8", "int8+rescore", "ivfpq", "ivfpq+rescore"]
+    )
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--subquantizers", type=int, default=48)
+    parser.add_argument("--train-size", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = make_vectors(args.vectors, args.dimension, args.topics, args.spread, args.seed)
+    queries = make_vectors(args.queries, args.dimension, args.topics, args.spread, args.seed + 1)
+    truth = exact_top_k(corpus, queries, args.top_k)
+
+    report = {
+        "vectors": args.vectors,
+        "dimension": args.dimension,
+        "queries": args.queries,
+        "rescore_factor": args.rescore_factor,
+        "modes": [run(name, corpus, queries, truth, args) for name in args.modes]
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
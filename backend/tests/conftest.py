@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Tests import the app package the way the API does, from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import get_settings  # noqa: E402
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """Settings with the hashing embedder and every data store under tmp_path"""
+    from chromadb.api.client import SharedSystemClient
+
+    monkeypatch.setenv("EMBEDDING_MODEL", "hashing")
+    monkeypatch.setenv("CHROMA_PERSIST_DIRECTORY", str(tmp_path / "chroma"))
+    monkeypatch.setenv("UPLOAD_DIRECTORY", str(tmp_path / "uploads"))
+    monkeypatch.setenv("PARSE_POOL_TYPE", "thread")
+    get_settings.cache_clear()
+    yield get_settings()
+    get_settings.cache_clear()
+    SharedSystemClient.clear_system_cache()
@@ -0,0 +1,104 @@
+"""Streamed chunking: offsets, coverage, bounded buffering and chunk locations"""
+from app.models.schemas import DocumentType
+from app.services.chunking import DocumentChunker
+
+# No two sentences alike, so every chunk's position in the text is unambiguous
+PARAGRAPHS = [
+    f"Paragraph {i}. " + " ".join(f"Sentence {i}.{j} about pumps and valves." for j in range(8))
+    for i in range(40)
+]
+TEXT = "\n\n".join(PARAGRAPHS)
+
+
+def blocks(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_streamed_chunks_carry_their_offsets_in_the_whole_text():
+    chunker = DocumentChunker(chunk_size=300, chunk_overlap=50)
+    chunks = list(chunker.chunk_stream(blocks(TEXT, 97), DocumentType.TXT))
+
+    assert len(chunks) > 10
+    for chunk in chunks:
+        assert TEXT[chunk.start:chunk.end] == chunk.text
+    starts = [chunk.start for chunk in chunks]
+    assert starts == sorted(starts)
+    # Every paragraph made it into some chunk
+    assert all(any(paragraph[:20] in chunk.text for chunk in chunks) for paragraph in PARAGRAPHS)
+
+
+def test_streamed_chunks_respect_the_chunk_size_and_cover_the_text():
+    chunker = DocumentChunker(chunk_size=300, chunk_overlap=50)
+    chunks = list(chunker.chunk_stream(blocks(TEXT, 1000), DocumentType.TXT))
+
+    assert all(len(chunk.text) <= 300 for chunk in chunks)
+    covered = set()
+    for chunk in chunks:
+        covered.update(range(chunk.start, chunk.end))
+    # Only separators between chunks may be left out
+    assert all(TEXT[i] in " \n" for i in set(range(len(TEXT))) - covered)
+
+
+def test_streaming_holds_only_a_window_of_text():
+    chunker = DocumentChunker(chunk_size=300, chunk_overlap=50)
+    stream = chunker.stream_chunker(DocumentType.TXT)
+    peak = 0
+    for block in blocks(TEXT * 5, 500):
+        stream.feed(block)
+        peak = max(peak, stream.buffered_chars)
+    stream.finish()
+    assert peak < 300 * 8 + 500
+
+
+MARKDOWN = """# Install
+
+Prérequis: Python 3.11 and a C compiler.
+
+## Linux
+
+Run the installer from a terminal. It asks for the target directory.
+
+## Windows
+
+Double-click setup.exe and follow the wizard to the end.
+"""
+
+
+def test_chunks_record_lines_bytes_and_heading_path():
+    chunker = DocumentChunker(chunk_size=80, chunk_overlap=0)
+    chunks = list(chunker.chunk_stream(blocks(MARKDOWN, 30), DocumentType.MARKDOWN))
+    encoded = MARKDOWN.encode("utf-8")
+    lines = MARKDOWN.split("\n")
+
+    for chunk in chunks:
+        assert encoded[chunk.start_byte:chunk.end_byte].decode("utf-8") == chunk.text
+        assert "\n".join(lines[chunk.start_line - 1:chunk.end_line]).count(chunk.text) == 1
+    by_text = {chunk.text.split("\n")[-1]: chunk for chunk in chunks}
+    assert by_text["Run the installer from a terminal. It asks for the target directory."].section == "Install > Linux"
+    assert by_text["Double-click setup.exe and follow the wizard to the end."].section == "Install > Windows"
+    assert "page_start" not in chunks[0].location()
+
+
+def test_code_chunks_record_the_enclosing_symbol():
+    source = "class Handler:\n    def handle(self, event):\n        return event\n\n\ndef main():\n    pass\n"
+    chunker = DocumentChunker(chunk_size=60, chunk_overlap=0)
+    chunks = list(chunker.chunk_stream([source], DocumentType.PYTHON))
+
+    sections = {chunk.text.split("\n")[0].strip(): chunk.section for chunk in chunks}
+    assert sections["def main():"] == "main"
+    assert sections["class Handler:"] == "Handler"
+
+
+def test_pdf_chunks_record_the_pages_they_span():
+    pages = [f"Page {page} " + " ".join(f"line {page}.{i}" for i in range(30)) + "\n" for page in range(1, 4)]
+    chunker = DocumentChunker(chunk_size=120, chunk_overlap=0)
+    chunks = list(chunker.chunk_stream(pages, DocumentType.PDF))
+
+    text = "".join(pages)
+    page_starts = [sum(len(page) for page in pages[:i]) for i in range(len(pages))]
+    for chunk in chunks:
+        expected_start = max(i for i, start in enumerate(page_starts) if start <= chunk.start) + 1
+        expected_end = max(i for i, start in enumerate(page_starts) if start < chunk.end) + 1
+        assert (chunk.page_start, chunk.page_end) == (expected_start, expected_end)
+        assert text[chunk.start:chunk.end] == chunk.text
+    assert {chunk.page_start for chunk in chunks} == {1, 2, 3}
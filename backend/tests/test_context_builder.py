@@ -0,0 +1,78 @@
+"""Deduplication, merging and token-budget packing of LLM context"""
+import numpy as np
+
+from app.services.context_builder import ContextBlock, ContextBuilder, estimate_tokens
+
+
+def result(chunk_id: str, chunk_index: int, text: str, document_id: str = "doc", **metadata) -> dict:
+    return {
+        "chunk_id": chunk_id,
+        "filename": f"{document_id}.md",
+        "chunk_index": chunk_index,
+        "text": text,
+        "metadata": {"document_id": document_id, **metadata}
+    }
+
+
+def block(text: str, rank: int) -> ContextBlock:
+    return ContextBlock(filename="doc.md", document_id="doc", first_index=rank, last_index=rank,
+                        text=text, rank=rank, end_byte=None, results=[])
+
+
+def test_consecutive_chunks_merge_with_their_overlap_once():
+    builder = ContextBuilder(chunk_overlap=20)
+    blocks = builder.merge([
+        result("doc_1", 1, "the pump starts. Then the valve opens"),
+        result("other_0", 0, "unrelated text", document_id="other"),
+        result("doc_0", 0, "Press start and the pump starts."),
+    ])
+
+    assert [(b.first_index, b.last_index) for b in blocks] == [(0, 1), (0, 0)]
+    assert blocks[0].text == "Press start and the pump starts. Then the valve opens"
+    # A merged block ranks as its best member
+    assert blocks[0].rank == 0 and blocks[0].as_chunk()["chunk_index"] == "0-1"
+
+
+def test_byte_offsets_decide_the_overlap_when_stored():
+    builder = ContextBuilder()
+    first = result("doc_0", 0, "héllo wörld", start_byte=0, end_byte=len("héllo wörld".encode()))
+    second = result("doc_1", 1, "wörld again", start_byte=len("héllo ".encode()), end_byte=len("héllo wörld again".encode()))
+
+    merged, = builder.merge([first, second])
+    assert merged.text == "héllo wörld again"
+
+
+def test_near_duplicates_of_better_results_are_dropped():
+    builder = ContextBuilder(dedupe_similarity=0.95)
+    results = [result("a", 0, "alpha"), result("b", 5, "beta"), result("c", 9, "alpha")]
+    embeddings = {"a": np.array([1.0, 0.0]), "b": np.array([0.99, 0.05]), "c": np.array([0.0, 1.0])}
+
+    assert [r["chunk_id"] for r in builder.deduplicate(results, embeddings)] == ["a"]
+
+
+def test_pack_stops_at_the_budget_and_skips_what_does_not_fit():
+    builder = ContextBuilder(max_tokens=12)
+    blocks = [block("one two three four five", 0), block("six " * 10, 1), block("seven eight", 2)]
+
+    packed, tokens, skipped, truncated = builder.pack(blocks)
+    assert [b.rank for b in packed] == [0, 2]
+    assert tokens == estimate_tokens("one two three four five") + estimate_tokens("seven eight") <= 12
+    assert (skipped, truncated) == (1, False)
+
+
+def test_pack_truncates_the_best_block_rather_than_sending_nothing():
+    builder = ContextBuilder(max_tokens=10)
+    packed, tokens, skipped, truncated = builder.pack([block("word " * 100, 0), block("short", 1)])
+
+    assert [b.rank for b in packed] == [0]
+    assert truncated and skipped == 1
+    assert 0 < tokens <= 10 and tokens == estimate_tokens(packed[0].text)
+
+
+def test_build_reports_only_packed_sources():
+    builder = ContextBuilder(max_tokens=8)
+    results = [result("a_0", 0, "short answer", document_id="a"), result("b_0", 0, "long " * 50, document_id="b")]
+
+    context = builder.build(results)
+    assert [source["chunk_id"] for source in context.sources] == ["a_0"]
+    assert context.stats["blocks_over_budget"] == 1 and context.tokens <= 8
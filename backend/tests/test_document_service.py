@@ -0,0 +1,100 @@
+"""Duplicate detection, re-upload diffing and reported stats of single-document ingestion"""
+import asyncio
+
+from app.services.document_registry import DocumentRegistry
+from app.services.document_service import DocumentIngestionService
+from app.services.embedding import EmbeddingService
+from app.services.executor import ExecutorPools
+from app.services.vectorstore import VectorStoreService
+
+CONTENT = b"# Release notes\n\nVersion 2 drops support for the legacy config format.\n"
+
+
+def test_same_bytes_under_another_name_are_their_own_document(settings, tmp_path):
+    async def run():
+        executors = ExecutorPools(settings)
+        service = DocumentIngestionService(
+            EmbeddingService(settings.embedding_model),
+            VectorStoreService(settings.chroma_persist_directory),
+            executors,
+            DocumentRegistry(str(tmp_path / "documents.db"))
+        )
+
+        async def upload(filename: str):
+            path = tmp_path / filename
+            path.write_bytes(CONTENT)
+            return await service.ingest_document(str(path), filename, len(CONTENT))
+
+        try:
+            first = await upload("a.md")
+            again = await upload("a.md")
+            copy = await upload("b.md")
+            assert again.duplicate and again.id == first.id
+            assert not copy.duplicate and copy.id != first.id
+            assert {document["filename"] for document in service.registry.list()} == {"a.md", "b.md"}
+
+            # Deleting one copy leaves the other searchable
+            assert await service.delete_document(first.id)
+            assert service.vectorstore.get_document_chunk_metadata(copy.id)
+        finally:
+            executors.shutdown()
+
+    asyncio.run(run())
+
+
+def test_unstreamed_types_report_no_buffer_peak(settings, tmp_path):
+    async def run():
+        executors = ExecutorPools(settings)
+        service = DocumentIngestionService(
+            EmbeddingService(settings.embedding_model),
+            VectorStoreService(settings.chroma_persist_directory),
+            executors
+        )
+        path = tmp_path / "notes.md"
+        path.write_bytes(CONTENT)
+        try:
+            from_file = await service.ingest_document(str(path), "notes.md", len(CONTENT))
+            in_memory = await service.ingest_document(None, "memo.md", len(CONTENT), content=CONTENT)
+        finally:
+            executors.shutdown()
+        return from_file, in_memory
+
+    # Only PDFs are streamed through a bounded buffer
+    assert [response.peak_buffered_chars for response in asyncio.run(run())] == [None, None]
+
+
+SECTIONS = [f"## Step {i}\n" + f"Tighten bolt {i} by hand, then check the seal. " * 12 for i in range(6)]
+
+
+def test_reupload_only_replaces_changed_chunks(settings, tmp_path):
+    async def run():
+        executors = ExecutorPools(settings)
+        service = DocumentIngestionService(
+            EmbeddingService(settings.embedding_model),
+            VectorStoreService(settings.chroma_persist_directory),
+            executors
+        )
+
+        async def upload(sections):
+            path = tmp_path / "manual.md"
+            path.write_text("\n\n".join(sections))
+            return await service.ingest_document(str(path), "manual.md", path.stat().st_size)
+
+        try:
+            first = await upload(SECTIONS)
+            edited = list(SECTIONS)
+            edited[3] = "## Step 3\n" + "Torque bolt 3 to spec before checking the seal. " * 12
+            second = await upload(edited)
+            stored = service.vectorstore.get_document_chunks(second.id)["documents"]
+        finally:
+            executors.shutdown()
+        return first, second, stored
+
+    first, second, stored = asyncio.run(run())
+    assert second.id == first.id
+    assert second.chunks_added > 0 and second.chunks_removed > 0
+    assert second.chunks_unchanged > 0
+    assert second.chunks_added + second.chunks_unchanged == second.chunks_created
+    assert len(stored) == second.chunks_created
+    assert any("Torque bolt 3" in text for text in stored)
+    assert not any("Tighten bolt 3" in text for text in stored)
@@ -0,0 +1,67 @@
+"""Concurrent query embeddings are coalesced into batched encode calls"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.executor import BoundedExecutor
+
+
+class RecordingEmbedder:
+    """Embeds each text as [len(text)] and records the batches it was given"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.batches = []
+
+    def generate_embeddings(self, texts, show_progress_bar=True):
+        self.batches.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32)
+
+
+async def embed_all(embedder: RecordingEmbedder, texts, **options):
+    pool = ThreadPoolExecutor(max_workers=1)
+    batcher = EmbeddingBatcher(embedder, BoundedExecutor("search", pool, 1, 8), **options)
+    await batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.embed(text) for text in texts), return_exceptions=True), batcher
+    finally:
+        await batcher.stop()
+        pool.shutdown()
+
+
+def test_concurrent_queries_share_batches_up_to_the_size_limit():
+    embedder = RecordingEmbedder()
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    results, batcher = asyncio.run(embed_all(embedder, texts, window_ms=50, max_batch_size=3))
+
+    assert embedder.batches == [["a", "bb", "ccc"], ["dddd", "eeeee"]]
+    # Every caller gets its own query's embedding back
+    assert [float(result[0]) for result in results] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert batcher.get_stats()["batch_size_counts"] == {2: 1, 3: 1}
+
+
+def test_encode_error_reaches_every_caller_in_the_batch():
+    embedder = RecordingEmbedder(error=RuntimeError("model crashed"))
+    results, _ = asyncio.run(embed_all(embedder, ["a", "b"], window_ms=50))
+
+    assert len(embedder.batches) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "model crashed" for result in results)
+
+
+def test_stop_fails_queries_still_waiting():
+    async def run():
+        batcher = EmbeddingBatcher(RecordingEmbedder(), executor=None)
+        # Queued but never picked up, since the batching task isn't running
+        batcher._queue = asyncio.Queue()
+        waiting = asyncio.ensure_future(batcher.embed("a"))
+        await asyncio.sleep(0)
+        await batcher.stop()
+        with pytest.raises(RuntimeError, match="stopped"):
+            await waiting
+
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+"""The embedding cache's in-memory LRU and its on-disk tier"""
+import numpy as np
+
+from app.services.embedding_cache import ENTRY_OVERHEAD_BYTES, EmbeddingCache
+
+DIMENSION = 4
+ENTRY_BYTES = DIMENSION * 4 + ENTRY_OVERHEAD_BYTES
+
+
+def vectors(*values: float) -> np.ndarray:
+    return np.array([[value] * DIMENSION for value in values], dtype=np.float32)
+
+
+def test_least_recently_used_entries_leave_memory_but_stay_on_disk(tmp_path):
+    cache = EmbeddingCache("model", str(tmp_path), max_memory_bytes=2 * ENTRY_BYTES)
+    cache.put_many(["a", "b"], vectors(1, 2))
+    cache.get_many(["a"])  # "b" is now the least recently used
+    cache.put_many(["c"], vectors(3))
+
+    assert cache.get_stats()["memory_entries"] == 2
+    assert [float(vector[0]) for vector in cache.get_many(["a", "c"])] == [1.0, 3.0]
+    assert cache.get_stats()["disk_hits"] == 0
+    assert float(cache.get_many(["b"])[0][0]) == 2.0
+    assert cache.get_stats()["disk_hits"] == 1
+
+
+def test_cached_embeddings_survive_a_restart(tmp_path):
+    cache = EmbeddingCache("model", str(tmp_path))
+    cache.put_many(["a", "b"], vectors(1, 2))
+
+    reopened = EmbeddingCache("model", str(tmp_path))
+    found = reopened.get_many(["b", "a", "unknown"])
+    np.testing.assert_array_equal(found[0], vectors(2)[0])
+    np.testing.assert_array_equal(found[1], vectors(1)[0])
+    assert found[2] is None
+    assert reopened.get_stats()["disk_hits"] == 2
+
+
+def test_rows_torn_by_a_crash_are_dropped_on_load(tmp_path):
+    cache = EmbeddingCache("model", str(tmp_path))
+    cache.put_many(["a"], vectors(1))
+    # The vector of a second row was written, its key never was
+    with open(cache.vectors_path, "ab") as f:
+        f.write(vectors(2).tobytes())
+
+    reopened = EmbeddingCache("model", str(tmp_path))
+    assert reopened.get_stats()["disk_entries"] == 1
+    assert reopened.vectors_path.stat().st_size == DIMENSION * 4
+    reopened.put_many(["b"], vectors(2))
+    assert float(EmbeddingCache("model", str(tmp_path)).get_many(["b"])[0][0]) == 2.0
+
+
+def test_models_do_not_share_entries(tmp_path):
+    EmbeddingCache("model-a", str(tmp_path)).put_many(["a"], vectors(1))
+    assert EmbeddingCache("model-b", str(tmp_path)).get_many(["a"]) == [None]
@@ -0,0 +1,121 @@
+"""Batch ingestion keeps a document consistent while its new version is stored"""
+import asyncio
+import zipfile
+
+import pytest
+
+from app.services.document_service import DocumentIngestionService, document_id_for
+from app.services.embedding import EmbeddingService
+from app.services.executor import ExecutorPools
+from app.services.ingestion_pipeline import BatchFile, IngestionPipeline, unpack_archive
+from app.services.vectorstore import VectorStoreService
+
+VERSION_1 = "\n\n".join(f"## Step {i}\n" + f"Tighten bolt {i} by hand. " * 30 for i in range(6))
+VERSION_2 = "\n\n".join(f"## Step {i}\n" + f"Torque bolt {i} to spec. " * 30 for i in range(6))
+
+
+def batch_file(tmp_path, text: str) -> BatchFile:
+    path = tmp_path / "manual.md"
+    path.write_text(text)
+    return BatchFile(path=str(path), filename="manual.md", document_key="manual.md")
+
+
+async def run_job(pipeline: IngestionPipeline, files):
+    job = pipeline.submit(files)
+    while job.status in ("queued", "running"):
+        await asyncio.sleep(0.01)
+    return job
+
+
+def stored_texts(vectorstore: VectorStoreService):
+    chunk_ids = list(vectorstore.get_document_chunk_metadata(document_id_for("manual.md")))
+    return vectorstore.get_chunks_by_ids(chunk_ids)["documents"]
+
+
+def test_failed_store_keeps_the_previous_version(settings, tmp_path):
+    async def run():
+        vectorstore = VectorStoreService(settings.chroma_persist_directory)
+        executors = ExecutorPools(settings)
+        service = DocumentIngestionService(EmbeddingService(settings.embedding_model), vectorstore, executors)
+        pipeline = IngestionPipeline(service, settings)
+        try:
+            job = await run_job(pipeline, [batch_file(tmp_path, VERSION_1)])
+            assert job.status == "completed"
+            before = stored_texts(vectorstore)
+            assert before and all("Tighten" in text for text in before)
+
+            def failing_upsert(*args, **kwargs):
+                raise RuntimeError("disk full")
+
+            vectorstore.upsert_chunks = failing_upsert
+            job = await run_job(pipeline, [batch_file(tmp_path, VERSION_2)])
+            assert job.status == "failed"
+            # The removed chunks are only deleted once their replacements are stored
+            assert sorted(stored_texts(vectorstore)) == sorted(before)
+
+            # ... and the document's lock was released with the failed job
+            del vectorstore.upsert_chunks
+            path = tmp_path / "manual.md"
+            await asyncio.wait_for(service.ingest_document(str(path), "manual.md", path.stat().st_size), 10)
+            after = stored_texts(vectorstore)
+            assert after and all("Torque" in text for text in after)
+        finally:
+            executors.shutdown()
+
+    asyncio.run(run())
+
+
+def test_stop_cancels_running_jobs(settings, tmp_path):
+    async def run():
+        vectorstore = VectorStoreService(settings.chroma_persist_directory)
+        executors = ExecutorPools(settings)
+        service = DocumentIngestionService(EmbeddingService(settings.embedding_model), vectorstore, executors)
+        pipeline = IngestionPipeline(service, settings)
+
+        async def stuck_store(*args):
+            await asyncio.Event().wait()
+
+        pipeline._store = stuck_store
+        try:
+            job = pipeline.submit([batch_file(tmp_path, VERSION_1)])
+            while job.status != "running":
+                await asyncio.sleep(0.01)
+            await asyncio.wait_for(pipeline.stop(), 10)
+            assert job.status == "cancelled"
+            assert not pipeline._tasks
+        finally:
+            executors.shutdown()
+
+    asyncio.run(run())
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, text in members.items():
+            archive.writestr(name, text)
+    return str(path)
+
+
+def test_unpack_archive_stops_at_the_file_limit(tmp_path):
+    archive = make_zip(tmp_path / "docs.zip", {f"doc{i}.md": "text" for i in range(5)})
+    destination = tmp_path / "files"
+
+    with pytest.raises(ValueError, match="more than 3 files"):
+        unpack_archive(archive, destination, max_member_size=1024, max_files=3, max_total_size=1024)
+    assert len(list(destination.iterdir())) == 3
+
+
+def test_unpack_archive_stops_at_the_total_size_limit(tmp_path):
+    archive = make_zip(tmp_path / "docs.zip", {f"doc{i}.md": "x" * 400 for i in range(5)})
+    destination = tmp_path / "files"
+
+    with pytest.raises(ValueError, match="unpacks to more than"):
+        unpack_archive(archive, destination, max_member_size=1024, max_files=100, max_total_size=1000)
+    assert len(list(destination.iterdir())) == 2
+
+
+def test_unpack_archive_reports_what_it_extracted(tmp_path):
+    archive = make_zip(tmp_path / "docs.zip", {"a.md": "x" * 10, "sub/b.md": "y" * 20, "big.md": "z" * 2000})
+
+    files, size = unpack_archive(archive, tmp_path / "files", max_member_size=1024, max_files=10, max_total_size=1024)
+    assert (files, size) == (2, 30)
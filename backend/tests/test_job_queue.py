@@ -0,0 +1,31 @@
+"""Finished ingestion jobs are deleted once they are past retention"""
+import time
+
+from app.services.job_queue import JobQueue
+
+
+def test_sweep_deletes_only_old_finished_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), document_service=None, retention_days=7)
+    queue.record_completed("old-duplicate", "a.md", 10, "{}")
+    queue.record_completed("recent-duplicate", "b.md", 10, "{}")
+    queue.enqueue("", "c.md", 10, job_id="old-queued", content=b"text")
+    week_ago = time.time() - 8 * 86400
+    queue._conn.execute(
+        "UPDATE jobs SET created_at = ?, finished_at = CASE WHEN status = 'completed' THEN ? END "
+        "WHERE id IN ('old-duplicate', 'old-queued')",
+        (week_ago, week_ago)
+    )
+
+    assert queue.sweep() == 1
+    assert queue.get("old-duplicate") is None
+    assert queue.get("recent-duplicate") is not None
+    assert queue.get("old-queued")["status"] == "queued"
+
+
+def test_zero_retention_keeps_every_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), document_service=None, retention_days=0)
+    queue.record_completed("old-duplicate", "a.md", 10, "{}")
+    queue._conn.execute("UPDATE jobs SET finished_at = 0")
+
+    assert queue.sweep() == 0
+    assert queue.get("old-duplicate") is not None
@@ -0,0 +1,68 @@
+"""BM25 scoring, incremental updates and persistence of the keyword index"""
+import math
+
+import pytest
+
+from app.services.lexical_index import LexicalIndex, tokenize
+
+DOCS = {
+    "a": "retry the request with exponential backoff",
+    "b": "the request timeout is thirty seconds",
+    "c": "set max_file_size in the config",
+}
+
+
+def make_index(tmp_path) -> LexicalIndex:
+    index = LexicalIndex(str(tmp_path / "lexical.bin"))
+    index.add(list(DOCS), list(DOCS.values()))
+    return index
+
+
+def test_identifiers_are_indexed_whole_and_by_part():
+    assert tokenize("getDocumentChunks max_file_size") == [
+        "getdocumentchunks", "get", "document", "chunks", "max_file_size", "max", "file", "size"
+    ]
+
+
+def test_scores_follow_bm25(tmp_path):
+    index = make_index(tmp_path)
+    results = dict(index.search("backoff"))
+
+    n_docs, doc_freq, tf = 3, 1, 1
+    avg_length = sum(len(tokenize(text)) for text in DOCS.values()) / n_docs
+    idf = math.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+    norm = index.k1 * (1 - index.b + index.b * len(tokenize(DOCS["a"])) / avg_length)
+    assert list(results) == ["a"]
+    assert results["a"] == pytest.approx(idf * tf * (index.k1 + 1) / (tf + norm))
+
+
+def test_rarer_terms_weigh_more(tmp_path):
+    index = make_index(tmp_path)
+    # "request" is in two chunks, "timeout" only in b
+    ranked = [chunk_id for chunk_id, _ in index.search("request timeout")]
+    assert ranked == ["b", "a"]
+    assert index.search("file size", top_k=1)[0][0] == "c"
+
+
+def test_replaced_and_removed_chunks_leave_the_postings(tmp_path):
+    index = make_index(tmp_path)
+    index.add(["a"], ["jitter between attempts"])
+    index.remove(["b"])
+
+    assert index.search("backoff") == []
+    assert index.search("timeout") == []
+    assert [chunk_id for chunk_id, _ in index.search("jitter")] == ["a"]
+    assert index.doc_count == 2
+
+
+def test_saved_index_scores_the_same_after_loading(tmp_path):
+    index = make_index(tmp_path)
+    index.remove(["a"])
+    index.save()
+
+    reopened = LexicalIndex(str(tmp_path / "lexical.bin"))
+    assert reopened.load()
+    assert reopened.search("request config") == pytest.approx(index.search("request config"))
+    # Deletes still work on doc numbers compacted by the save
+    reopened.remove(["b"])
+    assert [chunk_id for chunk_id, _ in reopened.search("request config")] == ["c"]
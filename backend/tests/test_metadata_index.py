@@ -0,0 +1,74 @@
+"""Filter resolution, updates and the crash marker of the metadata index"""
+from app.services.metadata_index import MetadataIndex
+
+METADATA = {"document_id": "doc", "filename": "a.md", "doc_type": "md", "upload_time": "2024-05-01T12:00:00"}
+
+
+def test_loading_a_clean_index_leaves_no_crash_marker(tmp_path):
+    index = MetadataIndex(str(tmp_path / "metadata_index.json"))
+    index.add(["doc_0"], [METADATA])
+    index.save()
+
+    reopened = MetadataIndex(str(tmp_path / "metadata_index.json"))
+    assert reopened.load()
+    assert reopened.resolve({"document_id": "doc"}) == {"doc_0"}
+    assert not reopened.dirty_path.exists()
+
+
+def test_unsaved_changes_make_the_next_load_unclean(tmp_path):
+    index = MetadataIndex(str(tmp_path / "metadata_index.json"))
+    index.add(["doc_0"], [METADATA])
+    index.save()
+    index.remove(["doc_0"])
+    # No save(): the process dies before the periodic flush
+
+    reopened = MetadataIndex(str(tmp_path / "metadata_index.json"))
+    assert not reopened.load()
+    assert reopened.unclean
+
+
+def chunk(document_id: str, filename: str, doc_type: str, day: int) -> dict:
+    return {"document_id": document_id, "filename": filename, "doc_type": doc_type, "upload_time": f"2024-05-{day:02d}T12:00:00"}
+
+
+def filled_index(tmp_path) -> MetadataIndex:
+    index = MetadataIndex(str(tmp_path / "metadata_index.json"))
+    index.add(
+        ["a_0", "a_1", "b_0", "c_0"],
+        [chunk("a", "a.md", "markdown", 1), chunk("a", "a.md", "markdown", 1),
+         chunk("b", "b.py", "python", 2), chunk("c", "c.pdf", "pdf", 3)]
+    )
+    return index
+
+
+def test_keyword_and_time_filters_resolve_to_chunk_ids(tmp_path):
+    index = filled_index(tmp_path)
+
+    assert index.resolve({"doc_type": "markdown"}) == {"a_0", "a_1"}
+    assert index.resolve({"doc_type": {"$in": ["python", "pdf"]}}) == {"b_0", "c_0"}
+    assert index.resolve({"filename": {"$ne": "a.md"}}) == {"b_0", "c_0"}
+    assert index.resolve({"upload_time": {"$gte": "2024-05-02T12:00:00"}}) == {"b_0", "c_0"}
+    assert index.resolve({"upload_time": {"$gt": "2024-05-01T12:00:00", "$lt": "2024-05-03T12:00:00"}}) == {"b_0"}
+    assert index.resolve({"$or": [{"document_id": "a"}, {"doc_type": "pdf"}]}) == {"a_0", "a_1", "c_0"}
+    # Several fields in one dict are an implicit $and
+    assert index.resolve({"doc_type": "markdown", "document_id": "b"}) == set()
+
+
+def test_filters_the_index_cannot_answer_fall_back(tmp_path):
+    index = filled_index(tmp_path)
+
+    assert index.resolve(None) is None
+    assert index.resolve({"section": "Install"}) is None
+    assert index.resolve({"$and": [{"doc_type": "pdf"}, {"chunk_index": {"$gt": 2}}]}) is None
+    assert index.resolve({"doc_type": {"$contains": "py"}}) is None
+
+
+def test_updates_move_chunks_between_postings(tmp_path):
+    index = filled_index(tmp_path)
+    index.add(["a_1"], [chunk("a", "a.md", "markdown", 9)])
+    index.remove(["b_0"])
+
+    assert index.resolve({"upload_time": {"$gte": "2024-05-05T00:00:00"}}) == {"a_1"}
+    assert index.resolve({"doc_type": "python"}) == set()
+    assert index.summary()["documents_by_type"] == {"markdown": 1, "pdf": 1}
+    assert index.document_stats("a")["chunks"] == 2
@@ -0,0 +1,55 @@
+"""Prometheus text rendering and stage spans"""
+from app.services.metrics import STAGE_SECONDS, Histogram, MetricsRegistry, observe_stage, start_trace
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0, 0.5))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value, route="/ask")
+    histogram.observe(0.7, route='/a"b')
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a\\"b",le="0.1"} 0',
+        'latency_seconds_bucket{route="/a\\"b",le="0.5"} 0',
+        'latency_seconds_bucket{route="/a\\"b",le="1"} 1',
+        'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 1',
+        'latency_seconds_sum{route="/a\\"b"} 0.7',
+        'latency_seconds_count{route="/a\\"b"} 1',
+        # A value equal to a bound falls in that bound's bucket
+        'latency_seconds_bucket{route="/ask",le="0.1"} 2',
+        'latency_seconds_bucket{route="/ask",le="0.5"} 3',
+        'latency_seconds_bucket{route="/ask",le="1"} 3',
+        'latency_seconds_bucket{route="/ask",le="+Inf"} 4',
+        'latency_seconds_sum{route="/ask"} 2.45',
+        'latency_seconds_count{route="/ask"} 4',
+    ]
+
+
+def test_unlabelled_metrics_render_without_braces():
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Jobs").inc(3)
+    registry.histogram("wait_seconds", "Wait", buckets=(1.0,)).observe(0.5)
+
+    assert registry.render().splitlines()[3:] == [
+        "# HELP wait_seconds Wait",
+        "# TYPE wait_seconds histogram",
+        'wait_seconds_bucket{le="1"} 1',
+        'wait_seconds_bucket{le="+Inf"} 1',
+        "wait_seconds_sum 0.5",
+        "wait_seconds_count 1",
+    ]
+    assert registry.render().splitlines()[:3] == ["# HELP jobs_total Jobs", "# TYPE jobs_total counter", "jobs_total 3"]
+
+
+def test_stages_are_recorded_in_the_current_trace():
+    with start_trace("/search/ask") as trace:
+        observe_stage("query_embed", 0.002, tokens=5)
+    with start_trace("batch_ingest", record_spans=False) as quiet:
+        observe_stage("embed", 0.5, doc_type="pdf")
+
+    assert trace.spans == [{"stage": "query_embed", "ms": 2.0, "tokens": 5}]
+    assert quiet.spans == []
+    rendered = "\n".join(STAGE_SECONDS.render())
+    assert 'stage="embed",endpoint="batch_ingest",doc_type="pdf"' in rendered
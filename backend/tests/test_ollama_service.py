@@ -0,0 +1,126 @@
+"""OllamaService concurrency limits, health caching and keep_alive, against the stub server"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import search
+from app.services.ollama_service import OllamaBusyError, OllamaService
+from benchmarks.fake_ollama import FakeOllama
+
+CONTEXT = [{"filename": "guide.md", "chunk_index": 0, "text": "Retries back off exponentially."}]
+
+
+@pytest.fixture
+def server():
+    server = FakeOllama(port=0, tokens=8, token_ms=5, prompt_ms=5).start()
+    yield server
+    server.stop()
+
+
+async def ask(service: OllamaService, streamed: bool = False):
+    if streamed:
+        return [event async for event in service.stream_response("How do retries work?", CONTEXT)]
+    return await service.generate_response("How do retries work?", CONTEXT)
+
+
+async def ask_many(service: OllamaService, count: int):
+    try:
+        return await asyncio.gather(*(ask(service, streamed=i % 2 == 1) for i in range(count)), return_exceptions=True)
+    finally:
+        await service.close()
+
+
+def test_generations_never_exceed_max_concurrency(server):
+    service = OllamaService(base_url=server.base_url, max_concurrency=2)
+    outcomes = asyncio.run(ask_many(service, 8))
+
+    assert not [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    assert server.get_stats()["requests"]["/api/chat"] == 8
+    assert server.peak_active <= 2
+    assert service.generations == 8
+
+
+def test_full_queue_rejects_new_questions(server):
+    service = OllamaService(base_url=server.base_url, max_concurrency=1, max_queue=1)
+    outcomes = asyncio.run(ask_many(service, 3))
+
+    # One generating, one waiting, the third turned away
+    assert [isinstance(outcome, OllamaBusyError) for outcome in outcomes] == [False, False, True]
+    assert service.rejected == 1
+
+
+def test_queue_wait_times_out(server):
+    server.token_seconds = 0.05
+    service = OllamaService(base_url=server.base_url, max_concurrency=1, queue_timeout=0.05)
+    outcomes = asyncio.run(ask_many(service, 2))
+
+    assert isinstance(outcomes[1], OllamaBusyError)
+    assert not isinstance(outcomes[0], Exception)
+    assert service.queue_timeouts == 1
+
+
+def test_busy_llm_answers_429(server):
+    ollama_service = OllamaService(base_url=server.base_url, max_concurrency=1, max_queue=0)
+
+    class StubSearchService:
+        def __init__(self):
+            self.ollama_service = ollama_service
+
+        async def ask_question(self, query, top_k, conversation_history=None, rerank=None):
+            # The second question finds the only slot taken and no room to wait
+            return await asyncio.gather(ask(self.ollama_service), ask(self.ollama_service))
+
+    app = FastAPI()
+    app.include_router(search.router)
+    app.dependency_overrides[search.get_search_service] = StubSearchService
+    with TestClient(app) as client:
+        response = client.post("/search/ask", json={"query": "How do retries work?"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_check_health_answers_from_cache(server):
+    async def run():
+        service = OllamaService(base_url=server.base_url, health_interval=60)
+        await service.start()
+        try:
+            return [await service.check_health() for _ in range(100)]
+        finally:
+            await service.close()
+
+    assert all(asyncio.run(run()))
+    # Only start() went to the server
+    assert server.get_stats()["requests"]["/api/tags"] == 1
+
+
+def test_keep_alive_is_sent(server):
+    async def run():
+        service = OllamaService(base_url=server.base_url, keep_alive="10m")
+        try:
+            await ask(service)
+            await ask(service, streamed=True)
+        finally:
+            await service.close()
+
+    asyncio.run(run())
+    assert server.get_stats()["requests"]["/api/chat"] == 2
+    assert server.get_stats()["keep_alive"] == ["10m"]
+
+
+def test_stream_without_done_raises(server):
+    server.truncate_streams = True
+
+    async def run():
+        service = OllamaService(base_url=server.base_url)
+        try:
+            await ask(service, streamed=True)
+        finally:
+            await service.close()
+
+    with pytest.raises(Exception) as raised:
+        asyncio.run(run())
+    # Raised once, not wrapped again by the transport error handling
+    assert str(raised.value) == "Ollama API error: the stream ended before the answer was done"
@@ -0,0 +1,94 @@
+"""Documents ingested before a restart are searchable after it"""
+import asyncio
+
+import pytest
+from chromadb.api.client import SharedSystemClient
+
+from app.services.document_service import DocumentIngestionService
+from app.services.embedding import HASHING_MODEL, EmbeddingService
+from app.services.executor import ExecutorPools
+from app.services.lexical_index import LexicalIndex
+from app.services.vectorstore import VectorStoreService
+
+DOCUMENT = """# Tide tables
+
+Spring tides happen near new and full moon, when the sun and moon line up.
+Neap tides happen at the quarter moons and have the smallest range.
+"""
+
+
+def open_vectorstore(settings, backend: str, tmp_path) -> VectorStoreService:
+    return VectorStoreService(
+        settings.chroma_persist_directory,
+        index_backend=backend,
+        index_directory=str(tmp_path / "vector_index")
+    )
+
+
+def ingest(settings, vectorstore: VectorStoreService, tmp_path) -> str:
+    path = tmp_path / "tides.md"
+    path.write_text(DOCUMENT)
+    executors = ExecutorPools(settings)
+    try:
+        service = DocumentIngestionService(EmbeddingService(settings.embedding_model), vectorstore, executors)
+        response = asyncio.run(service.ingest_document(str(path), path.name, path.stat().st_size))
+    finally:
+        executors.shutdown()
+    assert response.chunks_created > 0
+    return response.id
+
+
+def restart(settings, backend: str, tmp_path) -> VectorStoreService:
+    # Chroma shares one system per path within a process; drop it so the
+    # store is read back from disk like a fresh process would
+    SharedSystemClient.clear_system_cache()
+    return open_vectorstore(settings, backend, tmp_path)
+
+
+def assert_searchable(vectorstore: VectorStoreService, document_id: str):
+    query = EmbeddingService(HASHING_MODEL).generate_embeddings(["when do neap tides happen"])
+    results = vectorstore.query(query, n_results=1)
+    assert results["ids"][0], "nothing found after the restart"
+    assert results["metadatas"][0][0]["document_id"] == document_id
+    assert "Neap tides" in results["documents"][0][0]
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy", "ivfpq"])
+def test_ingested_document_is_searchable_after_restart(settings, tmp_path, backend):
+    vectorstore = open_vectorstore(settings, backend, tmp_path)
+    document_id = ingest(settings, vectorstore, tmp_path)
+    vectorstore.save()
+
+    assert_searchable(restart(settings, backend, tmp_path), document_id)
+
+
+def test_local_index_recovers_chunks_written_since_its_last_save(settings, tmp_path):
+    vectorstore = open_vectorstore(settings, "numpy", tmp_path)
+    document_id = ingest(settings, vectorstore, tmp_path)
+    # No save(): the process dies before the periodic flush
+
+    reopened = restart(settings, "numpy", tmp_path)
+    assert reopened.index.unclean
+    reopened.sync_vector_index()
+    assert_searchable(reopened, document_id)
+
+
+def test_lexical_index_is_rebuilt_after_unsaved_changes_with_the_same_count(settings, tmp_path):
+    def open_with_lexical_index() -> VectorStoreService:
+        lexical_index = LexicalIndex(str(tmp_path / "lexical_index.bin"))
+        lexical_index.load()
+        return VectorStoreService(settings.chroma_persist_directory, lexical_index=lexical_index)
+
+    vectorstore = open_with_lexical_index()
+    ingest(settings, vectorstore, tmp_path)
+    vectorstore.save()
+    stored = vectorstore.collection.get(include=["embeddings", "metadatas"], limit=1)
+    # Same chunk ID, new text: the chunk count doesn't change, and nothing is saved
+    vectorstore.upsert_chunks(stored["ids"], ["Rip currents pull swimmers away from the shore."],
+                              stored["embeddings"], stored["metadatas"])
+
+    SharedSystemClient.clear_system_cache()
+    reopened = open_with_lexical_index()
+    assert reopened.lexical_index.unclean
+    reopened.sync_lexical_index()
+    assert [chunk_id for chunk_id, _ in reopened.lexical_index.search("rip currents")] == stored["ids"]
@@ -0,0 +1,94 @@
+"""Request validation, error mapping and result formatting of the search endpoints"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import search
+
+
+class StubOllama:
+    async def check_health(self):
+        return True
+
+
+class StubSearchService:
+    """Answers every batch with no hits and records the budget it was given
+
+    Questions fail the way SearchService fails a rerank request while
+    reranking is disabled.
+    """
+
+    def __init__(self):
+        self.timeouts = []
+        self.ollama_service = StubOllama()
+
+    async def search_batch(self, queries, timeout=None):
+        self.timeouts.append(timeout)
+        return [[] for _ in queries]
+
+    async def ask_question(self, query, top_k, conversation_history=None, rerank=None):
+        raise ValueError("Reranking is disabled (RERANK_ENABLED=false)")
+
+    async def ask_question_stream(self, query, top_k, conversation_history=None, rerank=None):
+        raise ValueError("Reranking is disabled (RERANK_ENABLED=false)")
+        yield
+
+
+@pytest.fixture
+def search_service():
+    return StubSearchService()
+
+
+@pytest.fixture
+def client(search_service):
+    app = FastAPI()
+    app.include_router(search.router)
+    app.dependency_overrides[search.get_search_service] = lambda: search_service
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("top_k", [0, -1, 101])
+def test_batch_rejects_out_of_range_top_k(client, top_k):
+    response = client.post("/search/semantic/batch", json={"queries": [{"query": "retries", "top_k": top_k}]})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("timeout_ms", [0, -5])
+def test_batch_rejects_non_positive_timeout(client, timeout_ms):
+    response = client.post("/search/semantic/batch", json={"queries": [{"query": "retries"}], "timeout_ms": timeout_ms})
+    assert response.status_code == 422
+
+
+def test_batch_timeout_defaults_to_the_setting(client, search_service):
+    assert client.post("/search/semantic/batch", json={"queries": [{"query": "retries"}]}).status_code == 200
+    assert client.post(
+        "/search/semantic/batch", json={"queries": [{"query": "retries"}], "timeout_ms": 250}
+    ).status_code == 200
+    assert search_service.timeouts == [search.get_settings().search_batch_timeout_ms / 1000, 0.25]
+
+
+def test_ask_answers_400_for_invalid_requests(client):
+    response = client.post("/search/ask", json={"query": "retries", "rerank": True})
+    assert response.status_code == 400
+    assert "RERANK_ENABLED" in response.json()["detail"]
+
+
+def test_ask_stream_sends_a_400_error_event(client):
+    response = client.post("/search/ask/stream", json={"query": "retries", "rerank": True})
+    assert response.status_code == 200
+    assert "event: error" in response.text
+    assert '"status": 400' in response.text
+
+
+def test_results_without_text_keep_their_location():
+    hit = {
+        "filename": "guide.md", "chunk_index": 2, "doc_type": "markdown", "distance": 0.25,
+        "text": "Run the installer.", "metadata": {"text_preview": "Run the installer."},
+        "location": {"start_line": 5, "end_line": 5, "section": "Install > Linux"}
+    }
+
+    located, = search.format_results([hit], include_text=False)
+    assert located["section"] == "Install > Linux" and located["start_line"] == 5
+    assert "text" not in located and "text_preview" not in located
+    assert search.format_results([hit], include_text=True)[0]["text"] == "Run the installer."
@@ -0,0 +1,134 @@
+"""Retrieval, fusion and answer caching of SearchService"""
+import asyncio
+
+import pytest
+
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.embedding import HASHING_MODEL, EmbeddingService
+from app.services.executor import ExecutorPools
+from app.services.ollama_service import OllamaService
+from app.services.search_service import SearchService
+from app.services.vectorstore import VectorStoreService, build_chunk_metadata
+
+CHUNKS = {
+    "retry_0": "Failed requests are retried with exponential backoff, up to five attempts.",
+    "timeout_0": "Every request has a timeout of thirty seconds unless overridden per call.",
+    "auth_0": "API keys are sent in the Authorization header as a bearer token.",
+}
+
+
+class StubOllama(OllamaService):
+    """Streams a fixed answer, optionally cut off before Ollama's done message"""
+
+    def __init__(self, complete: bool = True):
+        super().__init__()
+        self.complete = complete
+        self.calls = 0
+
+    async def stream_response(self, query, context_chunks, conversation_history=None):
+        self.calls += 1
+        for token in ("Requests ", "are ", "retried."):
+            yield {"token": token}
+        if self.complete:
+            yield {"done": True, "prompt_eval_count": 50, "eval_count": 3}
+
+
+@pytest.fixture
+def make_service(settings):
+    services = []
+
+    def make(ollama=None, vectorstore=None) -> SearchService:
+        embedding_service = EmbeddingService(HASHING_MODEL)
+        if vectorstore is None:
+            vectorstore = VectorStoreService(settings.chroma_persist_directory)
+            ids = list(CHUNKS)
+            vectorstore.upsert_chunks(
+                ids,
+                [CHUNKS[chunk_id] for chunk_id in ids],
+                embedding_service.generate_embeddings([CHUNKS[chunk_id] for chunk_id in ids]),
+                [build_chunk_metadata("doc", "api.md", "markdown", i, CHUNKS[chunk_id]) for i, chunk_id in enumerate(ids)]
+            )
+        service = SearchService(
+            vectorstore,
+            embedding_service,
+            ollama or StubOllama(),
+            executors=ExecutorPools(settings),
+            answer_cache=SemanticAnswerCache()
+        )
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.executors.shutdown()
+
+
+async def stream(service: SearchService, query: str):
+    return [event async for event in service.ask_question_stream(query, top_k=2)]
+
+
+def test_streamed_answer_is_cached(make_service):
+    service = make_service()
+    asyncio.run(stream(service, "how are failed requests retried"))
+    events = asyncio.run(stream(service, "how are failed requests retried"))
+
+    assert service.ollama_service.calls == 1
+    assert events[-1][0] == "done" and events[-1][1]["cached"]
+
+
+def test_cut_off_stream_is_not_cached(make_service):
+    service = make_service(StubOllama(complete=False))
+    asyncio.run(stream(service, "how are failed requests retried"))
+    asyncio.run(stream(service, "how are failed requests retried"))
+
+    assert service.ollama_service.calls == 2
+    assert service.answer_cache.get_stats()["entries"] == 0
+
+
+def test_cached_answer_is_dropped_when_a_source_chunk_changes(make_service):
+    service = make_service()
+    asyncio.run(stream(service, "how are failed requests retried"))
+    sources = next(iter(service.answer_cache._entries.values())).chunk_ids
+    unrelated = [chunk_id for chunk_id in CHUNKS if chunk_id not in sources]
+    vectorstore = service.vectorstore
+
+    def rewrite(chunk_id: str):
+        metadata = vectorstore.get_chunks_by_ids([chunk_id])["metadatas"][0]
+        vectorstore.update_chunk_metadata([chunk_id], [{**metadata, "section": "edited"}])
+
+    # Chunks the answer wasn't based on don't matter
+    rewrite(unrelated[0])
+    assert service.answer_cache.get_stats()["entries"] == 1
+
+    rewrite(sorted(sources)[0])
+    assert service.answer_cache.get_stats()["entries"] == 0
+    events = asyncio.run(stream(service, "how are failed requests retried"))
+    assert service.ollama_service.calls == 2
+    assert not events[-1][1].get("cached")
+
+    vectorstore.delete_chunks(sorted(sources)[:1])
+    assert service.answer_cache.get_stats()["entries"] == 0
+
+
+def hit(chunk_id: str, distance=None) -> dict:
+    return {"chunk_id": chunk_id, "text": CHUNKS[chunk_id], "distance": distance}
+
+
+def test_fuse_ranks_by_reciprocal_rank_and_fills_in_distances(make_service):
+    service = make_service()
+    query = service.embedding_service.generate_embedding("request timeout")
+    original = query.copy()
+
+    dense = [hit("retry_0", 0.4), hit("timeout_0", 0.2)]
+    sparse = [hit("timeout_0"), hit("auth_0")]
+    results = asyncio.run(service._fuse(dense, sparse, top_k=3, query_embedding=query))
+
+    k = service.rrf_k
+    assert [r["chunk_id"] for r in results] == ["timeout_0", "retry_0", "auth_0"]
+    assert results[0]["score"] == pytest.approx(1 / (k + 2) + 1 / (k + 1))
+    assert results[1]["score"] == pytest.approx(1 / (k + 1))
+    # The dense copy wins, and keyword-only hits get a distance to the query
+    assert results[0]["distance"] == 0.2
+    assert results[2]["distance"] is not None
+    # ... computed without normalizing the caller's embedding in place
+    assert (query == original).all()
@@ -0,0 +1,96 @@
+"""Incremental multipart parsing of single-file uploads"""
+import asyncio
+import hashlib
+
+import pytest
+
+from app.services.uploads import UploadFormError, UploadTooLargeError, receive_upload
+
+BOUNDARY = "----test-boundary-7MA4YWxkTrZu0gW"
+
+
+class StreamedRequest:
+    """Just enough of a Starlette Request: headers and a body arriving in reads of read_size bytes"""
+
+    def __init__(self, body: bytes, read_size: int, content_type: str = f"multipart/form-data; boundary={BOUNDARY}"):
+        self.headers = {"content-type": content_type}
+        self.body = body
+        self.read_size = read_size
+        self.bytes_read = 0
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.read_size):
+            chunk = self.body[start:start + self.read_size]
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+def form(*parts) -> bytes:
+    body = b""
+    for name, value, filename in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if filename:
+            body += b"Content-Type: application/octet-stream\r\n"
+        body += b"\r\n" + value + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+# Contains text that looks like the start of a boundary
+CONTENT = b"line one\r\n--not-the-boundary\r\n" + bytes(range(256)) * 40
+
+
+def receive(request, tmp_path, **options):
+    options.setdefault("max_size", 1024 * 1024)
+    return asyncio.run(receive_upload(request, tmp_path, "upload-1", **options))
+
+
+@pytest.mark.parametrize("read_size", [1, 7, 64, 4096, 1 << 20])
+def test_file_is_streamed_to_disk_whatever_the_read_boundaries(tmp_path, read_size):
+    body = form(("document_key", b"docs/setup.md", None), ("file", CONTENT, "../setup.bin"))
+    upload = receive(StreamedRequest(body, read_size), tmp_path)
+
+    assert upload.filename == "setup.bin"
+    assert upload.path == str(tmp_path / "upload-1.bin")
+    assert (tmp_path / "upload-1.bin").read_bytes() == CONTENT
+    assert (upload.size, upload.sha256) == (len(CONTENT), hashlib.sha256(CONTENT).hexdigest())
+    assert upload.fields == {"document_key": "docs/setup.md"}
+    assert upload.content is None
+
+
+def test_oversized_upload_is_rejected_without_reading_the_rest(tmp_path):
+    request = StreamedRequest(form(("file", CONTENT * 20, "big.bin")), 1024)
+
+    with pytest.raises(UploadTooLargeError):
+        receive(request, tmp_path, max_size=4096)
+    assert request.bytes_read < len(request.body) / 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_small_text_files_stay_in_memory_until_they_outgrow_it(tmp_path):
+    options = dict(memory_max_size=100, memory_extensions=(".md",))
+    small = receive(StreamedRequest(form(("file", b"# Notes\n", "notes.md")), 3), tmp_path, **options)
+    assert (small.content, small.path) == (b"# Notes\n", None)
+    assert list(tmp_path.iterdir()) == []
+
+    large = receive(StreamedRequest(form(("file", b"x" * 500, "notes.md")), 64), tmp_path, **options)
+    assert large.content is None
+    assert (tmp_path / "upload-1.md").read_bytes() == b"x" * 500
+
+
+def test_missing_file_part_is_a_form_error(tmp_path):
+    with pytest.raises(UploadFormError, match="No file"):
+        receive(StreamedRequest(form(("document_key", b"a.md", None)), 16), tmp_path)
+    # A file under another field name doesn't count either
+    with pytest.raises(UploadFormError, match="No file"):
+        receive(StreamedRequest(form(("attachment", b"text", "a.md")), 16), tmp_path)
+
+
+def test_second_file_and_non_multipart_bodies_are_form_errors(tmp_path):
+    body = form(("file", b"one", "a.txt"), ("file", b"two", "b.txt"))
+    with pytest.raises(UploadFormError, match="Only one file"):
+        receive(StreamedRequest(body, 16), tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(UploadFormError, match="multipart"):
+        receive(StreamedRequest(b"{}", 16, content_type="application/json"), tmp_path)
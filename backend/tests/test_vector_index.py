@@ -0,0 +1,128 @@
+"""Search results of the local vector index backends"""
+import numpy as np
+import pytest
+
+from app.services.vectorstore import IvfPqVectorIndex, NumpyVectorIndex, normalize_rows
+
+DIMENSION = 16
+
+
+def clustered_vectors(count: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors around a few centres, like embeddings of related chunks"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(8, DIMENSION))
+    vectors = centres[rng.integers(0, len(centres), count)] + 0.3 * rng.normal(size=(count, DIMENSION))
+    return normalize_rows(vectors.astype(np.float32))
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int):
+    similarities = vectors @ normalize_rows(query[None, :])[0]
+    return [f"c{row}" for row in np.argsort(-similarities)[:k]]
+
+
+def ids(hits):
+    return [chunk_id for chunk_id, _ in hits]
+
+
+def test_numpy_index_returns_the_exact_nearest_chunks(tmp_path):
+    vectors = clustered_vectors(500)
+    index = NumpyVectorIndex(str(tmp_path))
+    index.add([f"c{i}" for i in range(len(vectors))], vectors)
+
+    queries = clustered_vectors(5, seed=1)
+    for query, hits in zip(queries, index.search(queries, 10)):
+        assert ids(hits) == exact_top_k(vectors, query, 10)
+        distances = [distance for _, distance in hits]
+        assert distances == sorted(distances)
+
+
+def test_numpy_index_honours_removals_and_allowed_ids(tmp_path):
+    vectors = clustered_vectors(200)
+    index = NumpyVectorIndex(str(tmp_path))
+    index.add([f"c{i}" for i in range(len(vectors))], vectors)
+    query = vectors[:1]
+
+    index.remove(["c0"])
+    assert "c0" not in ids(index.search(query, 5)[0])
+    allowed = {"c3", "c7", "c11"}
+    assert set(ids(index.search(query, 5, allowed_ids=allowed)[0])) == allowed
+    # A removed chunk's row is reused by the next one added
+    index.add(["new"], vectors[:1])
+    assert ids(index.search(query, 1)[0]) == ["new"]
+    assert index.count() == 200
+
+
+def test_ivfpq_index_trains_and_keeps_recall(tmp_path):
+    vectors = clustered_vectors(1200)
+    index = IvfPqVectorIndex(str(tmp_path), nlist=8, nprobe=4, pq_subquantizers=4, train_size=1000)
+    index.add([f"c{i}" for i in range(len(vectors))], vectors)
+    index.wait_for_training(60)
+    assert index.trained
+
+    queries = clustered_vectors(20, seed=1)
+    recall = np.mean([
+        len(set(ids(hits)) & set(exact_top_k(vectors, query, 10))) / 10
+        for query, hits in zip(queries, index.search(queries, 10))
+    ])
+    assert recall >= 0.8
+
+
+def test_ivfpq_index_reloads_its_quantizers(tmp_path):
+    vectors = clustered_vectors(1200)
+    options = dict(nlist=8, nprobe=8, pq_subquantizers=4, train_size=1000)
+    index = IvfPqVectorIndex(str(tmp_path), **options)
+    index.add([f"c{i}" for i in range(len(vectors))], vectors)
+    index.wait_for_training(60)
+    index.save()
+    before = index.search(vectors[:3], 5)
+
+    reopened = IvfPqVectorIndex(str(tmp_path), **options)
+    assert reopened.trained
+    after = reopened.search(vectors[:3], 5)
+    assert [ids(hits) for hits in after] == [ids(hits) for hits in before]
+
+
+def test_ivfpq_rejects_subquantizers_that_do_not_divide_the_dimension(tmp_path):
+    index = IvfPqVectorIndex(str(tmp_path), nlist=8, pq_subquantizers=5, train_size=256)
+    with pytest.raises(ValueError, match="must divide"):
+        index.add([f"c{i}" for i in range(300)], clustered_vectors(300))
+
+
+def test_int8_storage_with_rescoring_matches_float32(tmp_path):
+    vectors = clustered_vectors(800)
+    chunk_ids = [f"c{i}" for i in range(len(vectors))]
+    full = NumpyVectorIndex(str(tmp_path / "float32"))
+    quantized = NumpyVectorIndex(str(tmp_path / "int8"), storage="int8", rescore_factor=4)
+    full.add(chunk_ids, vectors)
+    quantized.add(chunk_ids, vectors)
+
+    queries = clustered_vectors(10, seed=1)
+    for exact, rescored in zip(full.search(queries, 10), quantized.search(queries, 10)):
+        assert ids(rescored) == ids(exact)
+        # Rescored distances come from the full-precision rows
+        assert [distance for _, distance in rescored] == pytest.approx([distance for _, distance in exact], abs=1e-6)
+
+
+def test_int8_codes_alone_rank_close_to_exact(tmp_path):
+    vectors = clustered_vectors(800)
+    index = NumpyVectorIndex(str(tmp_path), storage="int8", rescore_factor=0)
+    index.add([f"c{i}" for i in range(len(vectors))], vectors)
+
+    queries = clustered_vectors(10, seed=1)
+    recall = np.mean([
+        len(set(ids(hits)) & set(exact_top_k(vectors, query, 10))) / 10
+        for query, hits in zip(queries, index.search(queries, 10))
+    ])
+    assert recall >= 0.9
+
+
+def test_reopening_in_int8_quantizes_rows_written_in_float32(tmp_path):
+    vectors = clustered_vectors(300)
+    index = NumpyVectorIndex(str(tmp_path))
+    index.add([f"c{i}" for i in range(len(vectors))], vectors)
+    index.save()
+
+    reopened = NumpyVectorIndex(str(tmp_path), storage="int8", rescore_factor=0)
+    query = vectors[42:43]
+    assert ids(reopened.search(query, 1)[0]) == ["c42"]
+    assert (reopened._scales[:len(vectors)] > 0).all()
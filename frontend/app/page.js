@@ -37,6 +37,18 @@ export default function DocuMind() {
     }
   };
 
+  const waitForJob = async (jobId) => {
+    // Uploads are ingested in the background; poll until the job settles
+    while (true) {
+      const response = await fetch(`${API_BASE_URL}/documents/jobs/${jobId}`);
+      const job = await response.json();
+      if (job.status === 'completed' || job.status === 'failed') {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleFileUpload = async (event) => {
     const files = Array.from(event.target.files);
     
@@ -53,19 +65,29 @@ export default function DocuMind() {
           body: formData,
         });
 
-        const result = await response.json();
+        const job = await response.json();
 
         if (response.ok) {
-          setUploadedFiles(prev => [...prev, result]);
-          setUploadStatus({ 
-            type: 'success', 
-            message: `✓ ${file.name} processed into ${result.chunks_created} chunks` 
-          });
-          fetchStats();
+          setUploadStatus({ type: 'loading', message: `Processing ${file.name}...` });
+          const finished = await waitForJob(job.job_id);
+          if (finished.status === 'completed') {
+            const result = finished.result;
+            setUploadedFiles(prev => [...prev, result]);
+            setUploadStatus({ 
+              type: 'success', 
+              message: `✓ ${file.name} processed into ${result.chunks_created} chunks` 
+            });
+            fetchStats();
+          } else {
+            setUploadStatus({ 
+              type: 'error', 
+              message: `✗ Error: ${finished.error}` 
+            });
+          }
         } else {
           setUploadStatus({ 
             type: 'error', 
-            message: `✗ Error: ${result.detail}` 
+            message: `✗ Error: ${job.detail}` 
           });
         }
       } catch (error) {